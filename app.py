@@ -1,15 +1,40 @@
+import time
+
 import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from utils.calculations import (
-    calculate_mortgage_payment, 
-    calculate_affordability,
-    get_affordability_status,
-    calculate_total_buying_cost,
-    calculate_total_renting_cost
+from utils.charts import band_figure, equity_figure, position_figure
+from utils.comparison import cached_comparison, tax_profile
+from utils.properties import MAX_PROPERTIES, compare_properties
+from utils.projection import APPRECIATION_CAP, MAINTENANCE_GROWTH_CAP, RENEWAL_TERM_YEARS, RatePath, monthly_positions
+from utils.simulation import simulate
+from utils.solver import solve, solve_by_city
+from utils.stages import staged_projection
+from utils.sensitivity import SENSITIVITY_PARAMETERS, build_sensitivity_grid
+from utils.data_handler import (
+    get_average_rent, get_available_cities, get_nearby_listings, get_nearby_rent, has_listings
+)
+from utils.reports import POLL_INTERVAL, REPORT_FORMATS, get_report_queue, report_id, smtp_settings
+from utils.result_store import cached_result
+from utils.tax import (
+    CITY_PROVINCES, DEFAULT_PROVINCE, FHSA_LIFETIME_LIMIT, HBP_WITHDRAWAL_LIMIT, PROVINCE_NAMES, PROVINCES
 )
-from utils.data_handler import get_average_rent, get_available_cities
+from utils.timing import SAMPLE_SIZE, Laps, cache_stats, enable, is_enabled, prometheus_text, snapshot
+
+# Approximate city centres, the starting point for nearby listing searches
+CITY_CENTRES = {
+    "Calgary": (51.0447, -114.0719),
+    "Edmonton": (53.5461, -113.4938),
+    "Hamilton": (43.2557, -79.8711),
+    "Montreal": (45.5019, -73.5674),
+    "Ottawa": (45.4215, -75.6972),
+    "Quebec City": (46.8139, -71.2080),
+    "Toronto": (43.6532, -79.3832),
+    "Vancouver": (49.2827, -123.1207),
+    "Victoria": (48.4284, -123.3656),
+    "Winnipeg": (49.8951, -97.1384),
+}
 
 # Page configuration
 st.set_page_config(
@@ -18,6 +43,71 @@ st.set_page_config(
     layout="wide"
 )
 
+# Hidden performance panel: ?debug=timing in the URL, or HOMEDECIDE_TIMING set,
+# turns timing on for the process and shows the panel at the bottom
+show_timing_panel = st.query_params.get("debug") == "timing" or is_enabled()
+if show_timing_panel:
+    enable()
+laps = Laps("app")
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def cached_sensitivity_grid(inputs, x_parameter, y_parameter, taxes):
+    """Sensitivity grid, recomputed only when the model inputs, taxes (arguments of tax_profile) or axes change"""
+    return cached_result(
+        "sensitivity",
+        {"inputs": inputs, "taxes": taxes, "x_parameter": x_parameter, "y_parameter": y_parameter},
+        lambda: build_sensitivity_grid(inputs, x_parameter, y_parameter, tax_profile=tax_profile(**taxes))
+    )
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_simulation(*args, taxes, **kwargs):
+    """Monte Carlo simulation, rerun only when its inputs change rather than on every widget interaction"""
+    # Yearly rates arrive as tuples, which hash cheaply; the simulation takes them as paths
+    args = [RatePath(value) if isinstance(value, tuple) else value for value in args]
+    kwargs = {name: RatePath(value) if isinstance(value, tuple) else value for name, value in kwargs.items()}
+    return simulate(*args, tax_profile=tax_profile(**taxes), **kwargs)
+
+@st.cache_data(max_entries=64, show_spinner=False)
+def cached_solve(target, taxes=None, **inputs):
+    """Reverse solver answer, recomputed only when its inputs or taxes (arguments of tax_profile) change"""
+    return solve(target, tax_profile=None if taxes is None else tax_profile(**taxes), **inputs)
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_solve_by_city(targets, bedrooms, taxes):
+    """Reverse solver answers for every city, one column per target"""
+    profile = tax_profile(**taxes)
+    tables = [solve_by_city(target, bedrooms, tax_profile=profile, **values) for target, values in targets]
+    return tables[0].join([table.drop(columns="monthly_rent") for table in tables[1:]])
+
+@st.cache_data(max_entries=16, show_spinner=False)
+def cached_property_ranking(properties, shared):
+    """Ranking of the candidate properties, recomputed only when they or the buyer's inputs change"""
+    shared = {name: RatePath(value) if isinstance(value, tuple) else value for name, value in shared.items()}
+    return compare_properties(properties, **shared)
+
+# Figures are shared rather than copied per rerun: drawing only reads them
+@st.cache_resource(max_entries=32, show_spinner=False)
+def cached_trajectory_figures(home_price, down_payment_percent, interest_rate, loan_term_years,
+                              property_tax_rate, maintenance_cost, appreciation_rate, monthly_rent,
+                              rent_increase_rate, investment_return_rate, selling_cost_percent, break_even_month,
+                              maintenance_inflation_rate, appreciation_cap, monthly_income, province=None,
+                              fhsa_amount=0.0, hbp_amount=0.0, hbp_repaid=True):
+    """Monthly position and equity figures, rebuilt only when their inputs change"""
+    projection = staged_projection(
+        home_price, down_payment_percent, interest_rate, loan_term_years,
+        property_tax_rate, maintenance_cost, appreciation_rate,
+        monthly_rent, rent_increase_rate, investment_return_rate, selling_cost_percent,
+        maintenance_inflation_rate, appreciation_cap,
+        tax_profile(monthly_income, province, fhsa_amount, hbp_amount, hbp_repaid)
+    )
+    positions = monthly_positions(projection, home_price, home_price * down_payment_percent / 100, selling_cost_percent)
+    return position_figure(positions, break_even_month), equity_figure(positions)
+
+@st.cache_resource(max_entries=16, show_spinner=False)
+def cached_band_figure(bands, percentiles):
+    """Monthly simulation bands figure, keyed by the bands themselves"""
+    return band_figure(np.arange(bands.shape[-1]), bands, percentiles)
+
 # Title and description
 st.title("🏠 HomeDecide - Rent vs. Buy Comparator")
 st.markdown("""
@@ -80,6 +170,16 @@ with buy_col:
         appreciation_rate = st.slider("Expected Home Appreciation (%/year)", min_value=0.0, max_value=8.0, value=3.0, step=0.1)
         st.caption("Historical average in Canada is around 3-4%")
         
+        cap_appreciation = st.checkbox(f"Cap appreciation at {APPRECIATION_CAP:.0f}%/year", value=True)
+        st.caption("Long-run appreciation above this is rarely sustained")
+        appreciation_cap = APPRECIATION_CAP if cap_appreciation else None
+        
+        if st.checkbox("Set maintenance inflation", value=False):
+            maintenance_inflation_rate = st.slider("Maintenance Inflation (%/year)", min_value=0.0, max_value=8.0, value=2.0, step=0.1)
+        else:
+            maintenance_inflation_rate = None
+            st.caption(f"Otherwise maintenance grows with appreciation, at most {MAINTENANCE_GROWTH_CAP:.0f}%/year")
+        
         include_selling_costs = st.checkbox("Include selling costs", value=True)
         if include_selling_costs:
             selling_cost_percent = st.slider("Selling Costs (%)", min_value=0.0, max_value=10.0, value=5.0, step=0.1)
@@ -93,10 +193,40 @@ with rent_col:
     
     bedrooms = st.slider("Number of Bedrooms", min_value=1, max_value=4, value=2, step=1)
     
+    # Median rent of comparable listings around a location, when listing data is available
+    nearby = None
+    if has_listings():
+        with st.expander("📍 Rent from Nearby Listings"):
+            centre_latitude, centre_longitude = CITY_CENTRES.get(city, (0.0, 0.0))
+            latitude = st.number_input("Latitude", min_value=-90.0, max_value=90.0,
+                                       value=centre_latitude, step=0.001, format="%.4f")
+            longitude = st.number_input("Longitude", min_value=-180.0, max_value=180.0,
+                                        value=centre_longitude, step=0.001, format="%.4f")
+            st.caption("Starts at the city centre; enter the coordinates of a home to search around it")
+            radius_km = st.slider("Search Radius (km)", min_value=0.25, max_value=5.0, value=1.0, step=0.25)
+            use_nearby = st.checkbox("Use the nearby median as the monthly rent", value=True)
+            nearby = get_nearby_rent(latitude, longitude, bedrooms, radius_km)
+            if nearby is not None:
+                st.write(
+                    f"Median of {nearby['listings']:,} {bedrooms}-bedroom listing(s) within "
+                    f"{nearby['radius_km']:.1f} km: ${nearby['median_rent']:,.0f} "
+                    f"(middle half ${nearby['p25_rent']:,.0f} - ${nearby['p75_rent']:,.0f})"
+                )
+                st.map(get_nearby_listings(latitude, longitude, bedrooms, nearby["radius_km"]), size=20)
+            else:
+                st.warning("No comparable listings near this location.")
+            if not use_nearby:
+                nearby = None
+    
     # Get average rent for the selected city and bedrooms
     avg_rent = get_average_rent(city, bedrooms)
     
-    if avg_rent is not None:
+    if nearby is not None:
+        avg_rent = int(round(nearby["median_rent"]))
+        st.write(f"Median Rent of Nearby Listings for {bedrooms} bedroom(s): ${avg_rent:,.2f}")
+        monthly_rent = st.number_input("Monthly Rent ($)", min_value=0, max_value=10000, value=min(avg_rent, 10000), step=100)
+        st.caption(f"${monthly_rent:,}")
+    elif avg_rent is not None:
         st.write(f"Average Rent in {city} for {bedrooms} bedroom(s): ${avg_rent:,.2f}")
         monthly_rent = st.number_input("Monthly Rent ($)", min_value=0, max_value=10000, value=avg_rent, step=100)
         st.caption(f"${monthly_rent:,}")
@@ -113,334 +243,648 @@ with rent_col:
         investment_return_rate = st.slider("Expected Investment Return Rate (%)", min_value=0.0, max_value=12.0, value=5.0, step=0.1)
         st.caption("This represents the opportunity cost of using money for a down payment")
 
-# Calculate button
-if st.button("📊 Calculate Comparison", type="primary"):
-    # Calculate mortgage payment
-    loan_amount = home_price - down_payment
-    monthly_mortgage = calculate_mortgage_payment(loan_amount, interest_rate, loan_term_years)
-    
-    # Calculate affordability
-    mortgage_affordability = calculate_affordability(monthly_mortgage, monthly_income)
-    rent_affordability = calculate_affordability(monthly_rent, monthly_income)
-    
-    # Get affordability status
-    mortgage_status, mortgage_color = get_affordability_status(mortgage_affordability)
-    rent_status, rent_color = get_affordability_status(rent_affordability)
-    
-    # Calculate total costs with more realistic models
-    # Monthly property tax and maintenance
-    monthly_property_tax = home_price * property_tax_rate / 100 / 12
-    monthly_maintenance = maintenance_cost / 12
-    total_monthly_buying = monthly_mortgage + monthly_property_tax + monthly_maintenance
-    
-    # BUYING COST CALCULATION - IMPROVED
-    
-    # Cap appreciation rate for realism
-    capped_appreciation_rate = min(appreciation_rate, 4.0)
-    
-    # Initial costs
-    total_buying_cost = down_payment
-    
-    # Calculate cumulative buying costs with increasing property tax and maintenance
-    cumulative_buying_cost = 0
-    current_home_value = home_price
-    current_property_tax = monthly_property_tax * 12
-    current_maintenance = maintenance_cost
-    
-    for year in range(loan_term_years):
-        # Add mortgage payments for the year
-        cumulative_buying_cost += monthly_mortgage * 12
-        
-        # Add property tax for the year (increases with property value)
-        current_property_tax = current_home_value * property_tax_rate / 100
-        cumulative_buying_cost += current_property_tax
-        
-        # Add maintenance costs (increases with inflation/property value)
-        current_maintenance = maintenance_cost * (1 + min(capped_appreciation_rate, 2.0) / 100) ** year
-        cumulative_buying_cost += current_maintenance
-        
-        # Update home value for next year
-        current_home_value *= (1 + capped_appreciation_rate / 100)
-    
-    # Total buying cost includes initial down payment
-    total_buying_cost = down_payment + cumulative_buying_cost
-    
-    # Calculate final home value with more realistic model
-    final_home_value = home_price
-    for year in range(loan_term_years):
-        final_home_value *= (1 + capped_appreciation_rate / 100)
-    
-    # Apply a modest discount factor for long-term projections
-    if loan_term_years > 20:
-        discount_factor = 0.95  # 5% discount for long-term projections
-        final_home_value *= discount_factor
-    
-    # Include selling costs if selected
-    selling_costs = 0
+# Custom inflation scenario: rates that change from year to year
+with st.expander("📈 Custom Inflation Scenario"):
+    use_rate_paths = st.checkbox("Set the rates year by year", value=False)
+    st.caption(f"Starts from the rates above. The mortgage renews every {RENEWAL_TERM_YEARS} years at the rate "
+               "of its renewal year, and its payment is reset for the rest of the amortization. The sensitivity "
+               "analysis and the reverse solvers keep using the single rates")
+    model_rates = {
+        "interest_rate": interest_rate,
+        "property_tax_rate": property_tax_rate,
+        "appreciation_rate": appreciation_rate,
+        "rent_increase_rate": rent_increase_rate,
+        "investment_return_rate": investment_return_rate,
+        "maintenance_inflation_rate": maintenance_inflation_rate,
+    }
+    if use_rate_paths:
+        default_maintenance_inflation = (
+            maintenance_inflation_rate if maintenance_inflation_rate is not None
+            else min(appreciation_rate, appreciation_cap or appreciation_rate, MAINTENANCE_GROWTH_CAP)
+        )
+        path_columns = {
+            "appreciation_rate": "Home Appreciation (%)",
+            "rent_increase_rate": "Rent Increase (%)",
+            "investment_return_rate": "Investment Return (%)",
+            "maintenance_inflation_rate": "Maintenance Inflation (%)",
+            "property_tax_rate": "Property Tax Rate (%)",
+            "interest_rate": "Mortgage Rate (%)",
+        }
+        starting_rates = dict(model_rates, maintenance_inflation_rate=default_maintenance_inflation)
+        rate_paths = st.data_editor(
+            pd.DataFrame(
+                {column: starting_rates[name] for name, column in path_columns.items()},
+                index=pd.Index(np.arange(1, loan_term_years + 1), name="Year")
+            ),
+            use_container_width=True
+        ).fillna(0.0)
+        # Tuples of yearly rates go through the same caches as single rates
+        model_rates = {name: tuple(rate_paths[column]) for name, column in path_columns.items()}
+
+# Tax inputs
+with st.expander("🧾 Taxes"):
+    apply_tax = st.checkbox("Apply Canadian income tax", value=False)
+    st.caption("Investment gains are taxed as capital gains when cashed out, while the home is tax-free as a "
+               "principal residence. Tax uses your monthly income and this year's federal and provincial brackets")
+    tax_col1, tax_col2 = st.columns(2)
+    
+    with tax_col1:
+        province_names = [PROVINCE_NAMES[code] for code in PROVINCES]
+        tax_province = PROVINCES[province_names.index(st.selectbox(
+            "Province", options=province_names, index=PROVINCES.index(CITY_PROVINCES.get(city, DEFAULT_PROVINCE))
+        ))]
+        hbp_repaid = st.checkbox("Repay the Home Buyers' Plan on schedule", value=True)
+        st.caption("Missed repayments are added to your income")
+    
+    with tax_col2:
+        fhsa_amount = st.number_input("Down Payment from an FHSA ($)", min_value=0, max_value=FHSA_LIFETIME_LIMIT,
+                                      value=0, step=1000)
+        st.caption("Contributions were deducted from your income")
+        hbp_amount = st.number_input("Down Payment from the Home Buyers' Plan ($)", min_value=0,
+                                     max_value=HBP_WITHDRAWAL_LIMIT, value=0, step=1000)
+        st.caption("Withdrawn from your RRSP tax-free")
+
+tax_inputs = {}
+if apply_tax:
+    tax_inputs = {"province": tax_province, "fhsa_amount": fhsa_amount, "hbp_amount": hbp_amount,
+                  "hbp_repaid": hbp_repaid}
+# Arguments of tax_profile, for the solvers, simulation and sensitivity analysis
+taxes = {"monthly_income": monthly_income, "province": None, **tax_inputs}
+
+# Monte Carlo inputs
+with st.expander("🎲 Monte Carlo Simulation"):
+    run_simulation = st.checkbox("Simulate uncertain appreciation, rent increases and investment returns", value=False)
+    st.caption("Draws a different rate for every year of every path around the expected rates above")
+    sim_col1, sim_col2 = st.columns(2)
+    
+    with sim_col1:
+        simulation_paths = st.select_slider("Simulated Paths", options=[1000, 10000, 50000, 100000], value=10000)
+        simulation_seed = st.number_input("Random Seed", min_value=0, value=42, step=1)
+        st.caption("The same seed always gives the same results")
+    
+    with sim_col2:
+        appreciation_volatility = st.slider("Appreciation Volatility (± %/year)", min_value=0.0, max_value=10.0, value=4.0, step=0.5)
+        rent_volatility = st.slider("Rent Increase Volatility (± %/year)", min_value=0.0, max_value=5.0, value=1.5, step=0.5)
+        return_volatility = st.slider("Investment Return Volatility (± %/year)", min_value=0.0, max_value=20.0, value=10.0, step=0.5)
+
+# Sensitivity analysis inputs
+with st.expander("🗺️ Sensitivity Analysis"):
+    show_sensitivity = st.checkbox("Show how the result changes across two inputs", value=False)
+    sensitivity_labels = {spec["label"]: name for name, spec in SENSITIVITY_PARAMETERS.items()}
+    sens_col1, sens_col2 = st.columns(2)
+    
+    with sens_col1:
+        x_options = list(sensitivity_labels)
+        sensitivity_x = sensitivity_labels[st.selectbox(
+            "Horizontal Axis",
+            options=x_options,
+            index=x_options.index(SENSITIVITY_PARAMETERS["interest_rate"]["label"])
+        )]
+    
+    with sens_col2:
+        y_options = [label for label, name in sensitivity_labels.items() if name != sensitivity_x]
+        default_y = SENSITIVITY_PARAMETERS["appreciation_rate"]["label"]
+        sensitivity_y = sensitivity_labels[st.selectbox(
+            "Vertical Axis",
+            options=y_options,
+            index=y_options.index(default_y) if default_y in y_options else 0
+        )]
+
+laps.mark("inputs")
+
+# Results update live as the inputs change. The comparison is reused when these
+# inputs were seen before, and otherwise only the stages they affect are recomputed
+comparison_inputs = dict(
+    monthly_income=monthly_income, city=city, home_price=home_price,
+    down_payment_percent=down_payment_percent, loan_term_years=loan_term_years,
+    maintenance_cost=maintenance_cost, selling_cost_percent=selling_cost_percent,
+    bedrooms=bedrooms, monthly_rent=monthly_rent, appreciation_cap=appreciation_cap, **model_rates, **tax_inputs
+)
+comparison = cached_comparison(**comparison_inputs)
+
+monthly_mortgage = comparison["monthly_mortgage"]
+mortgage_affordability = comparison["mortgage_affordability"]
+rent_affordability = comparison["rent_affordability"]
+mortgage_status, mortgage_color = comparison["mortgage_status"], comparison["mortgage_status_color"]
+rent_status, rent_color = comparison["rent_status"], comparison["rent_status_color"]
+
+monthly_property_tax = comparison["monthly_property_tax"]
+monthly_maintenance = comparison["monthly_maintenance"]
+total_monthly_buying = comparison["total_monthly_buying"]
+capped_appreciation_rate = comparison["capped_appreciation_rate"]
+
+total_buying_cost = comparison["total_buying_cost"]
+final_home_value = comparison["final_home_value"]
+selling_costs = comparison["selling_costs"]
+net_home_sale_proceeds = comparison["net_home_sale_proceeds"]
+net_buying_cost = comparison["net_buying_cost"]
+
+total_renting_cost = comparison["total_renting_cost"]
+investment_value = comparison["final_investment_value"]
+adjusted_renting_cost = comparison["adjusted_renting_cost"]
+laps.mark("comparison")
+
+# Display results
+st.header("🔍 Results")
+
+# Monthly costs
+st.subheader("Monthly Costs")
+col1, col2 = st.columns(2)
+
+with col1:
+    st.metric(
+        label="Monthly Mortgage Payment", 
+        value=f"${monthly_mortgage:.2f}",
+        delta=f"{mortgage_affordability:.1f}% of income"
+    )
+    st.markdown(f"<p style='color:{mortgage_color};font-weight:bold;'>{mortgage_status}</p>", unsafe_allow_html=True)
+    st.caption(f"Additional monthly costs: Property tax: ${monthly_property_tax:.2f}, Maintenance: ${monthly_maintenance:.2f}")
+    st.caption(f"Total monthly cost: ${total_monthly_buying:.2f}")
+
+with col2:
+    st.metric(
+        label="Monthly Rent", 
+        value=f"${monthly_rent:.2f}",
+        delta=f"{rent_affordability:.1f}% of income"
+    )
+    st.markdown(f"<p style='color:{rent_color};font-weight:bold;'>{rent_status}</p>", unsafe_allow_html=True)
+    st.caption("No additional ownership costs, but no equity building")
+laps.mark("monthly_costs")
+
+# Long-term comparison
+st.subheader(f"Long-term Comparison (Over {loan_term_years} Years)")
+
+# Create chart data for the cost comparison
+labels = [
+    'Buying (Total Cost)', 
+    'Buying (Net Cost\nafter Home Sale)', 
+    'Renting (Total)', 
+    'Renting (After\nInvestment Returns)'
+]
+values = [
+    total_buying_cost, 
+    net_buying_cost, 
+    total_renting_cost, 
+    adjusted_renting_cost
+]
+
+fig = go.Figure(data=[
+    go.Bar(
+        x=labels,
+        y=values,
+        text=[f"${val:,.0f}" for val in values],
+        textposition='auto',
+        marker_color=['#1f77b4', '#2ca02c', '#d62728', '#9467bd']
+    )
+])
+
+fig.update_layout(
+    title=f"Cost Comparison over {loan_term_years} Years",
+    xaxis_title="Option",
+    yaxis_title="Total Cost ($)",
+    height=500
+)
+laps.mark("cost_chart.figure")
+
+st.plotly_chart(fig, use_container_width=True)
+laps.mark("cost_chart.render")
+
+# Additional metrics
+col1, col2, col3 = st.columns(3)
+
+with col1:
+    st.metric("Final Home Value", f"${final_home_value:,.2f}")
+    appreciation_label = "Average appreciation" if use_rate_paths else "Appreciation"
+    st.caption(f"Initial: ${home_price:,.2f} | {appreciation_label}: {capped_appreciation_rate:.1f}%/year")
     if include_selling_costs:
-        selling_costs = final_home_value * selling_cost_percent / 100
-    
-    # Net proceeds from home sale
-    net_home_sale_proceeds = final_home_value - selling_costs
-    
-    # RENTING COST CALCULATION - IMPROVED
-    
-    # Calculate renting costs with compounding rent increases
-    total_renting_cost = 0
-    current_rent = monthly_rent
-    
-    for year in range(loan_term_years):
-        annual_rent = current_rent * 12
-        total_renting_cost += annual_rent
-        current_rent *= (1 + rent_increase_rate / 100)
-    
-    # Calculate opportunity cost/benefit of down payment investment
-    investment_value = down_payment
-    for year in range(loan_term_years):
-        investment_value *= (1 + investment_return_rate / 100)
-    
-    # Investment gain (how much extra money the renter has from investing)
-    investment_gain = investment_value - down_payment
-    
-    # Adjusted renting cost (total rent paid minus investment gains)
-    adjusted_renting_cost = total_renting_cost - investment_gain
-    
-    # Net buying cost (all costs minus what you get from selling the home)
-    net_buying_cost = total_buying_cost - net_home_sale_proceeds
-    
-    # Display results
-    st.header("🔍 Results")
+        st.caption(f"Selling costs: ${selling_costs:,.2f} ({selling_cost_percent}%)")
+        st.caption(f"Net proceeds: ${net_home_sale_proceeds:,.2f}")
+
+with col2:
+    savings = comparison["savings"]
+    percentage_saved = comparison["percentage_saved"]
+    if comparison["cheaper_option"] == "buying":
+        st.metric("Savings from Buying", f"${savings:,.2f}")
+        st.caption(f"{percentage_saved:.1f}% saved compared to renting")
+    else:
+        st.metric("Savings from Renting", f"${savings:,.2f}")
+        st.caption(f"{percentage_saved:.1f}% saved compared to buying")
+
+with col3:
+    # Break-even: first year where selling the home leaves buying ahead of renting
+    years_to_break_even = comparison["break_even_year"]
+    
+    if years_to_break_even:
+        break_even_month = comparison["break_even_month"]
+        st.metric("Break-even Year", f"Year {years_to_break_even}")
+        st.caption(f"Buying becomes more economical after {years_to_break_even} years")
+        st.caption(f"Break-even month: {break_even_month} (month {(break_even_month - 1) % 12 + 1} of year {years_to_break_even})")
+    else:
+        st.metric("Break-even Year", "Never (in this time period)")
+        st.caption("Renting remains more economical throughout the period")
+
+# Month-by-month trajectories over the whole term
+st.subheader("Year-by-Year Trajectories")
+position_fig, equity_fig = cached_trajectory_figures(
+    home_price=home_price, down_payment_percent=down_payment_percent, loan_term_years=loan_term_years,
+    maintenance_cost=maintenance_cost, monthly_rent=monthly_rent, selling_cost_percent=selling_cost_percent,
+    break_even_month=comparison["break_even_month"], appreciation_cap=appreciation_cap,
+    monthly_income=monthly_income, **model_rates, **tax_inputs
+)
+laps.mark("trajectories.figure")
+
+col1, col2 = st.columns(2)
+with col1:
+    st.plotly_chart(position_fig, use_container_width=True)
+with col2:
+    st.plotly_chart(equity_fig, use_container_width=True)
+laps.mark("trajectories.render")
+
+# Summary and detailed breakdown
+st.subheader("Summary")
+
+if net_buying_cost < adjusted_renting_cost:
+    st.success(f"""
+    **Buying appears to be more economical over {loan_term_years} years.**
     
-    # Monthly costs
-    st.subheader("Monthly Costs")
-    col1, col2 = st.columns(2)
+    After accounting for home appreciation and the opportunity cost of your down payment,
+    buying is projected to save you ${adjusted_renting_cost - net_buying_cost:,.2f} compared to renting.
+    """)
+else:
+    st.info(f"""
+    **Renting appears to be more economical over {loan_term_years} years.**
     
+    After accounting for home appreciation and the opportunity cost of your down payment,
+    renting is projected to save you ${net_buying_cost - adjusted_renting_cost:,.2f} compared to buying.
+    """)
+
+laps.mark("summary")
+
+# Reverse solvers: the inputs that would meet a goal
+with st.expander("🎯 What Would It Take?"):
+    scenario_inputs = dict(
+        property_tax_rate=property_tax_rate, maintenance_cost=maintenance_cost,
+        appreciation_rate=appreciation_rate, selling_cost_percent=selling_cost_percent,
+        rent_increase_rate=rent_increase_rate, investment_return_rate=investment_return_rate,
+        maintenance_inflation_rate=maintenance_inflation_rate, appreciation_cap=appreciation_cap,
+    )
+    target_year = st.slider("Break Even By Year", min_value=1, max_value=loan_term_years,
+                            value=min(7, loan_term_years))
+    down_payment_inputs = dict(scenario_inputs, target_year=target_year, home_price=home_price,
+                               interest_rate=interest_rate, loan_term_years=loan_term_years)
+    interest_rate_inputs = dict(scenario_inputs, home_price=home_price,
+                                down_payment_percent=down_payment_percent, loan_term_years=loan_term_years)
+
+    col1, col2, col3 = st.columns(3)
     with col1:
-        st.metric(
-            label="Monthly Mortgage Payment", 
-            value=f"${monthly_mortgage:.2f}",
-            delta=f"{mortgage_affordability:.1f}% of income"
+        max_price = cached_solve(
+            "max_price", monthly_income=monthly_income, down_payment_percent=down_payment_percent,
+            interest_rate=interest_rate, loan_term_years=loan_term_years
         )
-        st.markdown(f"<p style='color:{mortgage_color};font-weight:bold;'>{mortgage_status}</p>", unsafe_allow_html=True)
-        st.caption(f"Additional monthly costs: Property tax: ${monthly_property_tax:.2f}, Maintenance: ${monthly_maintenance:.2f}")
-        st.caption(f"Total monthly cost: ${total_monthly_buying:.2f}")
-    
+        st.metric("Highest Affordable Price", f"${max_price:,.0f}")
+        st.caption(f"Mortgage within 25% of income with {down_payment_percent}% down at {interest_rate}%")
     with col2:
-        st.metric(
-            label="Monthly Rent", 
-            value=f"${monthly_rent:.2f}",
-            delta=f"{rent_affordability:.1f}% of income"
+        min_down = cached_solve("min_down_payment", taxes, monthly_rent=monthly_rent, **down_payment_inputs)
+        st.metric("Smallest Down Payment", "Not possible" if min_down is None else f"{min_down:.1f}%")
+        st.caption(f"For buying to break even by year {target_year}"
+                   + (", even with 100% down" if min_down is None else ""))
+    with col3:
+        max_rate = cached_solve("max_interest_rate", taxes, monthly_rent=monthly_rent, **interest_rate_inputs)
+        st.metric("Highest Interest Rate", "Not possible" if max_rate is None else f"{max_rate:.2f}%")
+        st.caption(f"At which buying still costs less over {loan_term_years} years"
+                   + (", even at 0%" if max_rate is None else ""))
+
+    if st.checkbox("Compare across cities"):
+        by_city = cached_solve_by_city(
+            (("min_down_payment", down_payment_inputs), ("max_interest_rate", interest_rate_inputs)), bedrooms,
+            taxes
+        )
+        st.dataframe(
+            by_city.rename(columns={
+                "monthly_rent": "Average Rent",
+                "min_down_payment": f"Down Payment to Break Even by Year {target_year} (%)",
+                "max_interest_rate": "Highest Rate Where Buying Wins (%)",
+            }).style.format({"Average Rent": "${:,.0f}"}, precision=2, na_rep="Not possible"),
+            use_container_width=True
         )
-        st.markdown(f"<p style='color:{rent_color};font-weight:bold;'>{rent_status}</p>", unsafe_allow_html=True)
-        st.caption("No additional ownership costs, but no equity building")
+    laps.mark("solvers")
+
+# Candidate properties share the buyer's inputs and are ranked together in one vectorized pass
+with st.expander("🏘️ Compare Several Properties"):
+    st.caption(f"Up to {MAX_PROPERTIES} homes, each with its own city, price, bedrooms and optionally property tax "
+               "rate and rent; blank cells take your inputs above, and a blank rent the city's average. Edits "
+               "apply when you press Compare Properties")
+    property_columns = {
+        "name": "Name", "city": "City", "home_price": "Home Price ($)", "bedrooms": "Bedrooms",
+        "property_tax_rate": "Property Tax Rate (%)", "monthly_rent": "Monthly Rent ($)",
+    }
+    # The editor starts from the home above; later edits live in the editor's own state
+    starting_properties = st.session_state.setdefault("starting_properties", pd.DataFrame({
+        "Name": ["Home 1"], "City": [city], "Home Price ($)": [float(home_price)], "Bedrooms": [bedrooms],
+        "Property Tax Rate (%)": [np.nan], "Monthly Rent ($)": [np.nan],
+    }))
+    with st.form("compare_properties"):
+        edited_properties = st.data_editor(
+            starting_properties,
+            num_rows="dynamic",
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                "City": st.column_config.SelectboxColumn(options=get_available_cities()),
+                "Home Price ($)": st.column_config.NumberColumn(min_value=0, step=1000, format="$%d"),
+                "Bedrooms": st.column_config.NumberColumn(min_value=0, max_value=4, step=1),
+                "Property Tax Rate (%)": st.column_config.NumberColumn(min_value=0.0, max_value=5.0, step=0.1),
+                "Monthly Rent ($)": st.column_config.NumberColumn(min_value=0, step=50, format="$%d"),
+            },
+        )
+        st.form_submit_button("Compare Properties")
+
+    # Rows without a price are still being filled in
+    candidates = edited_properties.rename(columns={column: name for name, column in property_columns.items()})
+    candidates = candidates.dropna(subset=["home_price"]).head(MAX_PROPERTIES)
+    if not candidates.empty:
+        ranking = cached_property_ranking(candidates, dict(
+            monthly_income=monthly_income, down_payment_percent=down_payment_percent,
+            loan_term_years=loan_term_years, maintenance_cost=maintenance_cost,
+            selling_cost_percent=selling_cost_percent, appreciation_cap=appreciation_cap,
+            **model_rates, **tax_inputs
+        ))
+        st.dataframe(
+            ranking.drop(columns=["total_monthly_buying"]).rename(columns={
+                **property_columns,
+                "rank": "Rank",
+                "monthly_rent": "Monthly Rent ($)",
+                "monthly_mortgage": "Monthly Mortgage ($)",
+                "mortgage_affordability": "Mortgage (% of Income)",
+                "net_buying_cost": "Net Buying Cost ($)",
+                "adjusted_renting_cost": "Net Renting Cost ($)",
+                "buying_advantage": "Buying Saves ($)",
+                "break_even_year": "Break-even Year",
+                "cheaper_option": "Cheaper Option",
+            }),
+            hide_index=True,
+            use_container_width=True,
+            column_config={
+                **{column: st.column_config.NumberColumn(format="$%.0f")
+                   for column in ("Home Price ($)", "Monthly Rent ($)", "Monthly Mortgage ($)",
+                                  "Net Buying Cost ($)", "Net Renting Cost ($)", "Buying Saves ($)")},
+                "Mortgage (% of Income)": st.column_config.NumberColumn(format="%.1f%%"),
+            },
+        )
+        st.caption(f"Ranked by how much buying saves over {loan_term_years} years; click a column to sort by it. "
+                   "Homes without rent data for their city and bedrooms are not ranked.")
+    laps.mark("properties")
+
+# Monte Carlo simulation
+if run_simulation:
+    st.subheader("🎲 Monte Carlo Simulation")
+    
+    simulation = cached_simulation(
+        home_price=home_price, down_payment=down_payment, loan_term_years=loan_term_years,
+        maintenance_cost=maintenance_cost, monthly_rent=monthly_rent,
+        selling_cost_percent=selling_cost_percent, appreciation_cap=appreciation_cap,
+        **model_rates,
+        taxes=taxes,
+        paths=simulation_paths,
+        seed=int(simulation_seed),
+        distributions={
+            "appreciation_rate": {"kind": "normal", "std": appreciation_volatility},
+            "rent_increase_rate": {"kind": "normal", "std": rent_volatility},
+            "investment_return_rate": {"kind": "normal", "std": return_volatility},
+        }
+    )
+    laps.mark("simulation.compute")
     
-    # Long-term comparison
-    st.subheader(f"Long-term Comparison (Over {loan_term_years} Years)")
+    col1, col2 = st.columns(2)
     
-    # Create chart data for the cost comparison
-    labels = [
-        'Buying (Total Cost)', 
-        'Buying (Net Cost\nafter Home Sale)', 
-        'Renting (Total)', 
-        'Renting (After\nInvestment Returns)'
-    ]
-    values = [
-        total_buying_cost, 
-        net_buying_cost, 
-        total_renting_cost, 
-        adjusted_renting_cost
-    ]
+    with col1:
+        st.metric("Chance Buying Is Cheaper", f"{simulation['buying_cheaper_probability'] * 100:.1f}%")
+        st.caption(f"Share of {simulation_paths:,} simulated paths where buying costs less over {loan_term_years} years")
+        
+        bands = pd.DataFrame({
+            "Net Buying Cost": simulation["net_buying_cost"],
+            "Adjusted Renting Cost": simulation["adjusted_renting_cost"],
+        }, index=[f"P{p}" for p in simulation["percentiles"]])
+        st.dataframe(bands.style.format("${:,.0f}"), use_container_width=True)
     
-    fig = go.Figure(data=[
-        go.Bar(
-            x=labels,
-            y=values,
-            text=[f"${val:,.0f}" for val in values],
-            textposition='auto',
-            marker_color=['#1f77b4', '#2ca02c', '#d62728', '#9467bd']
+    with col2:
+        years = np.arange(1, loan_term_years + 1)
+        probability_fig = go.Figure(data=[
+            go.Scatter(
+                x=years,
+                y=simulation["break_even_probability"] * 100,
+                mode="lines+markers",
+                line_color="#2ca02c"
+            )
+        ])
+        probability_fig.update_layout(
+            title="Probability Buying Has Broken Even",
+            xaxis_title="Year",
+            yaxis_title="Paths (%)",
+            yaxis_range=[0, 100],
+            height=350
         )
-    ])
+        st.plotly_chart(probability_fig, use_container_width=True)
     
-    fig.update_layout(
-        title=f"Cost Comparison over {loan_term_years} Years",
-        xaxis_title="Option",
-        yaxis_title="Total Cost ($)",
-        height=500
+    st.plotly_chart(
+        cached_band_figure(simulation["monthly_buying_advantage"], tuple(simulation["percentiles"])),
+        use_container_width=True
+    )
+    st.caption(f"Monthly bands from the first {simulation['monthly_paths']:,} simulated paths")
+    laps.mark("simulation.display")
+
+# Sensitivity heatmaps around the current inputs
+if show_sensitivity:
+    st.subheader("🗺️ Sensitivity Analysis")
+    
+    sensitivity_inputs = {
+        "home_price": home_price,
+        "down_payment_percent": down_payment_percent,
+        "interest_rate": interest_rate,
+        "loan_term_years": loan_term_years,
+        "property_tax_rate": property_tax_rate,
+        "maintenance_cost": maintenance_cost,
+        "appreciation_rate": appreciation_rate,
+        "selling_cost_percent": selling_cost_percent,
+        "monthly_rent": monthly_rent,
+        "rent_increase_rate": rent_increase_rate,
+        "investment_return_rate": investment_return_rate,
+        "maintenance_inflation_rate": maintenance_inflation_rate,
+        "appreciation_cap": appreciation_cap,
+    }
+    grid = cached_sensitivity_grid(sensitivity_inputs, sensitivity_x, sensitivity_y, taxes)
+    laps.mark("sensitivity.compute")
+    x_label = SENSITIVITY_PARAMETERS[sensitivity_x]["label"]
+    y_label = SENSITIVITY_PARAMETERS[sensitivity_y]["label"]
+    current_point = go.Scatter(
+        x=[sensitivity_inputs[sensitivity_x]],
+        y=[sensitivity_inputs[sensitivity_y]],
+        mode="markers",
+        marker=dict(symbol="x", size=12, color="black"),
+        name="Your inputs",
+        showlegend=False
     )
     
-    st.plotly_chart(fig, use_container_width=True)
-    
-    # Additional metrics
-    col1, col2, col3 = st.columns(3)
+    col1, col2 = st.columns(2)
     
     with col1:
-        st.metric("Final Home Value", f"${final_home_value:,.2f}")
-        st.caption(f"Initial: ${home_price:,.2f} | Appreciation: {capped_appreciation_rate:.1f}%/year")
-        if include_selling_costs:
-            st.caption(f"Selling costs: ${selling_costs:,.2f} ({selling_cost_percent}%)")
-            st.caption(f"Net proceeds: ${net_home_sale_proceeds:,.2f}")
+        advantage_fig = go.Figure(data=[
+            go.Heatmap(
+                x=grid["x"],
+                y=grid["y"],
+                z=grid["buying_advantage"],
+                colorscale="RdBu",
+                zmid=0,
+                colorbar_title="$",
+                hovertemplate=f"{x_label}: %{{x:.2f}}<br>{y_label}: %{{y:.2f}}<br>Buying advantage: $%{{z:,.0f}}<extra></extra>"
+            ),
+            current_point
+        ])
+        advantage_fig.update_layout(
+            title="Buying Advantage over Renting ($)",
+            xaxis_title=x_label,
+            yaxis_title=y_label,
+            height=450
+        )
+        st.plotly_chart(advantage_fig, use_container_width=True)
+        st.caption("Blue: buying comes out ahead. Red: renting comes out ahead.")
     
     with col2:
-        if net_buying_cost < adjusted_renting_cost:
-            savings = adjusted_renting_cost - net_buying_cost
-            percentage_saved = (savings / adjusted_renting_cost) * 100 if adjusted_renting_cost > 0 else 0
-            st.metric("Savings from Buying", f"${savings:,.2f}")
-            st.caption(f"{percentage_saved:.1f}% saved compared to renting")
-        else:
-            savings = net_buying_cost - adjusted_renting_cost
-            percentage_saved = (savings / net_buying_cost) * 100 if net_buying_cost > 0 else 0
-            st.metric("Savings from Renting", f"${savings:,.2f}")
-            st.caption(f"{percentage_saved:.1f}% saved compared to buying")
-    
-    with col3:
-        # CORRECTED BREAK-EVEN CALCULATION
-        years_to_break_even = None
-        
-        # Initialize tracking variables
-        current_home_value = home_price
-        current_loan_balance = home_price - down_payment
-        current_rent = monthly_rent
-        
-        # Track cumulative costs (out of pocket)
-        out_of_pocket_buying = down_payment  # Initial costs include down payment
-        out_of_pocket_renting = 0
-        investment_value = down_payment  # Initial investment value equals down payment
-        
-        # Calculate variables for mortgage amortization
-        monthly_rate = interest_rate / 100 / 12
-        
-        # Track for detailed breakdown
-        cumulative_mortgage = 0
-        cumulative_property_tax = 0
-        cumulative_maintenance = 0
-        
-        # Year-by-year comparison
-        for year in range(1, loan_term_years + 1):
-            # BUYING: Calculate annual costs
-            annual_mortgage = monthly_mortgage * 12
-            annual_property_tax = current_home_value * property_tax_rate / 100
-            annual_maintenance = maintenance_cost * (1 + min(capped_appreciation_rate, 2.0) / 100) ** (year - 1)
-            
-            # Track component costs for detailed breakdown
-            cumulative_mortgage += annual_mortgage
-            cumulative_property_tax += annual_property_tax
-            cumulative_maintenance += annual_maintenance
-            
-            # Update out-of-pocket costs for buying
-            out_of_pocket_buying += annual_mortgage + annual_property_tax + annual_maintenance
-            
-            # Calculate approximate principal and interest for the year
-            annual_interest = 0
-            annual_principal = 0
-            
-            # For each month in the year, calculate principal and interest properly
-            for month in range(12):
-                if current_loan_balance > 0:
-                    interest_payment = current_loan_balance * monthly_rate
-                    principal_payment = min(monthly_mortgage - interest_payment, current_loan_balance)
-                    
-                    annual_interest += interest_payment
-                    annual_principal += principal_payment
-                    
-                    current_loan_balance = max(0, current_loan_balance - principal_payment)
-            
-            # Update home value with appreciation
-            current_home_value *= (1 + capped_appreciation_rate / 100)
-            
-            # RENTING: Calculate annual costs
-            annual_rent = current_rent * 12
-            out_of_pocket_renting += annual_rent
-            
-            # Update rent for next year
-            current_rent *= (1 + rent_increase_rate / 100)
-            
-            # Update investment value
-            investment_value *= (1 + investment_return_rate / 100)
-            
-            # Calculate net economic positions
-            home_equity = current_home_value - current_loan_balance
-            
-            # If selling at this point
-            selling_costs = current_home_value * selling_cost_percent / 100 if include_selling_costs else 0
-            net_proceeds_from_sale = home_equity - selling_costs
-            
-            # Real economic positions - what you've paid minus what you'd get back
-            buying_position = out_of_pocket_buying - net_proceeds_from_sale
-            renting_position = out_of_pocket_renting - (investment_value - down_payment)
-            
-            # Check if buying becomes better than renting
-            # A lower position is better (less net cost)
-            if buying_position < renting_position and years_to_break_even is None:
-                years_to_break_even = year
-        
-        if years_to_break_even:
-            st.metric("Break-even Year", f"Year {years_to_break_even}")
-            st.caption(f"Buying becomes more economical after {years_to_break_even} years")
-        else:
-            st.metric("Break-even Year", "Never (in this time period)")
-            st.caption("Renting remains more economical throughout the period")
-    
-    # Summary and detailed breakdown
-    st.subheader("Summary")
-    
-    if net_buying_cost < adjusted_renting_cost:
-        st.success(f"""
-        **Buying appears to be more economical over {loan_term_years} years.**
-        
-        After accounting for home appreciation and the opportunity cost of your down payment,
-        buying is projected to save you ${adjusted_renting_cost - net_buying_cost:,.2f} compared to renting.
-        """)
+        break_even_grid = np.where(grid["break_even_year"] > 0, grid["break_even_year"], np.nan)
+        break_even_fig = go.Figure(data=[
+            go.Heatmap(
+                x=grid["x"],
+                y=grid["y"],
+                z=break_even_grid,
+                colorscale="Viridis",
+                colorbar_title="Year",
+                hovertemplate=f"{x_label}: %{{x:.2f}}<br>{y_label}: %{{y:.2f}}<br>Break-even: year %{{z}}<extra></extra>"
+            ),
+            current_point
+        ])
+        break_even_fig.update_layout(
+            title="Break-even Year",
+            xaxis_title=x_label,
+            yaxis_title=y_label,
+            height=450
+        )
+        st.plotly_chart(break_even_fig, use_container_width=True)
+        st.caption("Blank areas never break even within the loan term.")
+    laps.mark("sensitivity.display")
+
+# Detailed breakdown
+with st.expander("See Detailed Breakdown"):
+    st.markdown("### Buying Costs")
+    st.markdown(f"- **Down Payment:** ${down_payment:,.2f}")
+    st.markdown(f"- **Mortgage Payments (over {loan_term_years} years):** ${comparison['cumulative_mortgage']:,.2f}")
+    st.markdown(f"- **Property Taxes (over {loan_term_years} years, increasing with property value):** ${comparison['cumulative_property_tax']:,.2f}")
+    st.markdown(f"- **Maintenance (over {loan_term_years} years, increasing with inflation):** ${comparison['cumulative_maintenance']:,.2f}")
+    if apply_tax:
+        st.markdown(f"- **Income Tax (Home Buyers' Plan income less the FHSA refund):** ${comparison['buying_tax']:,.2f}")
+    st.markdown(f"- **Total Buying Costs:** ${total_buying_cost:,.2f}")
+    st.markdown(f"- **Home Value After {loan_term_years} years:** ${final_home_value:,.2f}")
+    if include_selling_costs:
+        st.markdown(f"- **Selling Costs ({selling_cost_percent}%):** ${selling_costs:,.2f}")
+        st.markdown(f"- **Net Proceeds from Home Sale:** ${net_home_sale_proceeds:,.2f}")
+    st.markdown(f"- **Net Buying Cost:** ${net_buying_cost:,.2f}")
+    
+    st.markdown("### Renting Costs")
+    if use_rate_paths:
+        st.markdown(f"- **Total Rent Payments (over {loan_term_years} years, with your yearly increases):** ${total_renting_cost:,.2f}")
+        st.markdown(f"- **Investment Value of Down Payment After {loan_term_years} years (your yearly returns):** ${investment_value:,.2f}")
     else:
-        st.info(f"""
-        **Renting appears to be more economical over {loan_term_years} years.**
-        
-        After accounting for home appreciation and the opportunity cost of your down payment,
-        renting is projected to save you ${net_buying_cost - adjusted_renting_cost:,.2f} compared to buying.
-        """)
-    
-    # Detailed breakdown
-    with st.expander("See Detailed Breakdown"):
-        st.markdown("### Buying Costs")
-        st.markdown(f"- **Down Payment:** ${down_payment:,.2f}")
-        st.markdown(f"- **Mortgage Payments (over {loan_term_years} years):** ${cumulative_mortgage:,.2f}")
-        st.markdown(f"- **Property Taxes (over {loan_term_years} years, increasing with property value):** ${cumulative_property_tax:,.2f}")
-        st.markdown(f"- **Maintenance (over {loan_term_years} years, increasing with inflation):** ${cumulative_maintenance:,.2f}")
-        st.markdown(f"- **Total Buying Costs:** ${total_buying_cost:,.2f}")
-        st.markdown(f"- **Home Value After {loan_term_years} years:** ${final_home_value:,.2f}")
-        if include_selling_costs:
-            st.markdown(f"- **Selling Costs ({selling_cost_percent}%):** ${selling_costs:,.2f}")
-            st.markdown(f"- **Net Proceeds from Home Sale:** ${net_home_sale_proceeds:,.2f}")
-        st.markdown(f"- **Net Buying Cost:** ${net_buying_cost:,.2f}")
-        
-        st.markdown("### Renting Costs")
         st.markdown(f"- **Total Rent Payments (over {loan_term_years} years, with {rent_increase_rate}% annual increases):** ${total_renting_cost:,.2f}")
         st.markdown(f"- **Investment Value of Down Payment After {loan_term_years} years ({investment_return_rate}% return):** ${investment_value:,.2f}")
-        st.markdown(f"- **Investment Gain:** ${investment_value - down_payment:,.2f}")
-        st.markdown(f"- **Net Renting Cost (after investment returns):** ${adjusted_renting_cost:,.2f}")
-    
-    # Email results button (placeholder for future functionality)
-    st.button("📧 Email These Results", disabled=True)
-    st.info("Email functionality will be available in the next version.")
+    if apply_tax:
+        st.markdown(f"- **Capital Gains Tax (deducted from the investment value):** ${comparison['capital_gains_tax']:,.2f}")
+    st.markdown(f"- **Investment Gain:** ${investment_value - down_payment:,.2f}")
+    st.markdown(f"- **Net Renting Cost (after investment returns):** ${adjusted_renting_cost:,.2f}")
+
+# Reports are rendered in the background; the script polls them by rerunning until they are ready
+st.subheader("📄 Reports")
+report_queue = get_report_queue()
+report_jobs = st.session_state.setdefault("report_jobs", {})
+reports_pending = False
+
+# Buttons act through callbacks, which run once per click and get the inputs shown when clicked
+def prepare_reports(inputs):
+    for report_format in REPORT_FORMATS:
+        report_jobs[report_format] = report_queue.submit(inputs, report_format)
+
+def email_reports(inputs):
+    address = st.session_state.get("email_address", "")
+    try:
+        st.session_state["email_job"] = {"job_id": report_queue.email(inputs, address), "address": address}
+    except ValueError as error:
+        st.session_state["email_job"] = {"error": str(error)}
 
-# Future features
-st.markdown("---")
-st.subheader("Coming Soon in V2:")
 col1, col2 = st.columns(2)
 
 with col1:
-    st.markdown("""
-    - Interactive neighborhood map
-    - Tax savings calculator
-    - Custom inflation scenarios
-    """)
+    st.button("Prepare Reports", on_click=prepare_reports, args=(comparison_inputs,))
+    st.caption("A PDF with this breakdown, the charts and the amortization schedule, and the monthly schedule as CSV")
+    for report_format, label in (("pdf", "PDF Report"), ("csv", "CSV Schedule")):
+        job_id = report_jobs.get(report_format)
+        # Reports prepared for earlier inputs are not offered
+        if job_id is None or job_id != report_id(comparison_inputs, report_format):
+            continue
+        status = report_queue.status(job_id)
+        content = report_queue.read(job_id) if status["status"] == "done" else None
+        if content is not None:
+            file_name, mime = REPORT_FORMATS[report_format]
+            st.download_button(f"⬇️ Download {label}", content, file_name=file_name, mime=mime)
+        elif status["status"] == "failed":
+            st.error(f"The {label} could not be prepared: {status['error']}")
+        elif status["status"] in ("queued", "running"):
+            st.caption(f"Preparing the {label}...")
+            reports_pending = True
 
 with col2:
-    st.markdown("""
-    - Downloadable PDF reports
-    - Multiple property comparison
-    - Investment return calculator
-    """)
+    email_enabled = smtp_settings() is not None
+    st.text_input("Email Address", placeholder="you@example.com", key="email_address", disabled=not email_enabled)
+    st.button("📧 Email These Results", disabled=not email_enabled, on_click=email_reports, args=(comparison_inputs,))
+    if not email_enabled:
+        st.caption("Email is not set up on this server.")
+    email_job = st.session_state.get("email_job")
+    if email_job is not None and "error" in email_job:
+        st.error(email_job["error"])
+    elif email_job is not None:
+        status = report_queue.status(email_job["job_id"])
+        if status["status"] == "done":
+            st.success(f"Reports sent to {email_job['address']}")
+        elif status["status"] == "failed":
+            st.error(f"The email could not be sent: {status['error']}")
+        elif status["status"] in ("queued", "running"):
+            st.caption(f"Sending the reports to {email_job['address']}...")
+            reports_pending = True
+laps.mark("reports")
+
+# Future features
+st.markdown("---")
+st.subheader("Coming Soon in V2:")
+st.markdown("""
+- Investment return calculator
+""")
 
 # Footer
 st.markdown("---")
-st.caption("HomeDecide - Rent vs. Buy Comparator | Not Financial Advice")
\ No newline at end of file
+st.caption("HomeDecide - Rent vs. Buy Comparator | Not Financial Advice")
+laps.mark("details")
+laps.finish()
+
+if show_timing_panel:
+    with st.expander("⏱️ Performance", expanded=True):
+        st.caption(
+            "Timings of this server process since timing was turned on. app.* are sections of this script, "
+            "including sending their output to the browser but not the browser's drawing; "
+            f"the rest are the utils functions they call. Percentiles cover the latest {SAMPLE_SIZE:,} calls."
+        )
+        timings = pd.DataFrame(snapshot())
+        if not timings.empty:
+            st.dataframe(timings.round(3), hide_index=True, use_container_width=True)
+        st.dataframe(pd.DataFrame(cache_stats()).T, use_container_width=True)
+        st.code(prometheus_text(), language=None)
+
+if reports_pending:
+    time.sleep(POLL_INTERVAL)
+    st.rerun()
@@ -0,0 +1,52 @@
+import pandas as pd
+import pytest
+
+from utils.batch import run_batch
+from utils.scenarios import RESULT_COLUMNS, evaluate_scenarios
+
+SCENARIO = dict(home_price=750000, down_payment_percent=20, interest_rate=5.5, loan_term_years=25, monthly_rent=2800)
+
+def _read(path):
+    return pd.read_parquet(path) if path.suffix == ".parquet" else pd.read_csv(path)
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_chunks_match_evaluate_scenarios(tmp_path, suffix):
+    scenarios = pd.DataFrame([dict(SCENARIO, home_price=price) for price in range(400000, 1300000, 100000)])
+    scenarios.to_csv(tmp_path / "leads.csv", index=False)
+    output = tmp_path / f"scores{suffix}"
+    written = []
+
+    rows = run_batch([str(tmp_path / "leads.csv")], str(output), chunk_size=4, progress=written.append)
+
+    assert rows == len(scenarios)
+    assert written == [4, 8, 9]
+    scores = _read(output)
+    expected = evaluate_scenarios(scenarios)
+    pd.testing.assert_frame_equal(scores[list(scenarios.columns)], scenarios, check_dtype=False)
+    pd.testing.assert_frame_equal(scores[RESULT_COLUMNS], expected, check_dtype=False)
+
+@pytest.mark.parametrize("suffix", [".csv", ".parquet"])
+def test_files_with_fewer_optional_columns_stay_aligned(tmp_path, suffix):
+    # The first file sets the output columns; the second lacks property_tax_rate and orders its columns differently
+    first = pd.DataFrame([dict(SCENARIO, property_tax_rate=1.2)])
+    second = pd.DataFrame([dict(reversed(list(SCENARIO.items())), home_price=500000)])
+    first.to_csv(tmp_path / "first.csv", index=False)
+    second.to_csv(tmp_path / "second.csv", index=False)
+    output = tmp_path / f"scores{suffix}"
+
+    run_batch([str(tmp_path / "first.csv"), str(tmp_path / "second.csv")], str(output))
+
+    scores = _read(output)
+    assert list(scores.columns) == list(first.columns) + RESULT_COLUMNS
+    assert scores["home_price"].tolist() == [750000, 500000]
+    assert scores["property_tax_rate"].iloc[0] == 1.2
+    assert pd.isna(scores["property_tax_rate"].iloc[1])
+    expected = pd.concat([evaluate_scenarios(first), evaluate_scenarios(second)], ignore_index=True)
+    pd.testing.assert_frame_equal(scores[RESULT_COLUMNS], expected, check_dtype=False)
+
+def test_files_with_new_columns_are_rejected(tmp_path):
+    pd.DataFrame([SCENARIO]).to_csv(tmp_path / "first.csv", index=False)
+    pd.DataFrame([dict(SCENARIO, property_tax_rate=1.2)]).to_csv(tmp_path / "second.csv", index=False)
+
+    with pytest.raises(ValueError, match="property_tax_rate"):
+        run_batch([str(tmp_path / "first.csv"), str(tmp_path / "second.csv")], str(tmp_path / "scores.csv"))
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+from utils.calculations import find_break_even
+from utils.projection import build_projection, monthly_positions
+
+INPUTS = dict(
+    home_price=750000, down_payment=150000, interest_rate=5.5, loan_term_years=25, property_tax_rate=0.7,
+    maintenance_cost=5000, appreciation_rate=3.0, monthly_rent=2800, rent_increase_rate=3.0,
+    investment_return_rate=5.0, selling_cost_percent=5.0,
+)
+
+def test_month_is_the_first_with_buying_ahead():
+    month = find_break_even(**INPUTS)
+    projection = build_projection(**INPUTS)
+    assert (projection.break_even_year - 1) * 12 < month <= projection.break_even_year * 12
+
+    positions = monthly_positions(projection, 750000, 150000, 5.0)
+    buying_ahead = positions["buying_position"] < positions["renting_position"]
+    assert buying_ahead[month]
+    assert not buying_ahead[month - 1]
+
+def test_never_breaking_even_gives_none():
+    assert find_break_even(**dict(INPUTS, monthly_rent=500)) is None
+
+@pytest.mark.parametrize("monthly_rent", [500, 2800, 4000])
+def test_batch_matches_single_scenarios(monthly_rent):
+    rents = np.array([500, 2800, 4000])
+    months = find_break_even(**dict(INPUTS, monthly_rent=rents))
+    single = find_break_even(**dict(INPUTS, monthly_rent=monthly_rent))
+    assert months[list(rents).index(monthly_rent)] == (single or 0)
+
+def test_reuses_a_given_projection():
+    projection = build_projection(**INPUTS)
+    assert find_break_even(**INPUTS, projection=projection) == find_break_even(**INPUTS)
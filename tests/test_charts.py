@@ -0,0 +1,48 @@
+import numpy as np
+import pytest
+
+from utils.charts import MIN_POINTS, POINT_BUDGET, downsample, lttb
+
+MONTHS = np.arange(361)
+
+@pytest.mark.parametrize("threshold", [3, 10, 60, 200])
+def test_lttb_keeps_the_ends_and_threshold_points_in_order(threshold):
+    y = np.random.default_rng(1).normal(size=len(MONTHS)).cumsum()
+    kept = lttb(MONTHS, y, threshold)
+
+    assert kept[0] == 0
+    assert kept[-1] == len(MONTHS) - 1
+    assert len(kept) == threshold
+    assert (np.diff(kept) > 0).all()
+
+def test_lttb_keeps_a_peak():
+    y = np.zeros(len(MONTHS))
+    y[123] = 100.0
+    assert 123 in lttb(MONTHS, y, 20)
+
+@pytest.mark.parametrize("threshold", [2, 361, 400])
+def test_lttb_keeps_every_point_when_it_cannot_drop_any(threshold):
+    np.testing.assert_array_equal(lttb(MONTHS, MONTHS ** 0.5, threshold), MONTHS)
+
+def test_downsample_shares_the_budget_between_series():
+    rng = np.random.default_rng(2)
+    series = [rng.normal(size=len(MONTHS)).cumsum() for _ in range(3)]
+    kept = downsample(MONTHS, series)
+
+    assert kept[0] == 0
+    assert kept[-1] == len(MONTHS) - 1
+    assert len(kept) <= POINT_BUDGET
+    assert (np.diff(kept) > 0).all()
+    # Every series' own points are kept, so lines drawn from the shared indices keep their shape
+    for y in series:
+        assert np.isin(lttb(MONTHS, y, POINT_BUDGET // 3), kept).all()
+
+def test_downsample_never_cuts_a_series_below_min_points():
+    series = [np.random.default_rng(seed).normal(size=len(MONTHS)).cumsum() for seed in range(10)]
+    for y in series:
+        assert np.isin(lttb(MONTHS, y, MIN_POINTS), downsample(MONTHS, series)).all()
+
+@pytest.mark.parametrize("size", [1, MIN_POINTS // 2, MIN_POINTS])
+def test_short_series_pass_through(size):
+    x = np.arange(size)
+    np.testing.assert_array_equal(downsample(x, [x * 2.0, x ** 2.0]), x)
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from utils.comparison import ComparisonCache, cached_comparison, comparison_key, get_comparison_cache, run_comparison
+
+INPUTS = dict(
+    monthly_income=9000, city="Toronto", home_price=750000, down_payment_percent=20, interest_rate=5.5,
+    loan_term_years=25, property_tax_rate=0.7, maintenance_cost=5000, appreciation_rate=3.0,
+    selling_cost_percent=5.0, bedrooms=2, monthly_rent=2800, rent_increase_rate=3.0, investment_return_rate=5.0,
+)
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.delenv("HOMEDECIDE_RESULT_STORE", raising=False)
+    cache = get_comparison_cache()
+    cache.clear()
+    yield cache
+    cache.clear()
+
+def test_least_recently_used_entry_is_evicted():
+    cache = ComparisonCache(maxsize=2)
+    cache.put("a", {"value": 1})
+    cache.put("b", {"value": 2})
+    cache.get("a")
+    cache.put("c", {"value": 3})
+
+    assert cache.get("b") is None
+    assert cache.get("a") == {"value": 1}
+    assert cache.get("c") == {"value": 3}
+    assert cache.stats() == {"hits": 3, "misses": 1, "size": 2, "maxsize": 2}
+
+def test_cached_results_are_copies():
+    cache = ComparisonCache()
+    cache.put("a", {"value": 1})
+    cache.get("a")["value"] = 2
+    assert cache.get("a") == {"value": 1}
+
+def test_equal_numbers_give_the_same_key():
+    assert comparison_key(**INPUTS) == comparison_key(
+        **dict(INPUTS, home_price=750000.0, interest_rate=np.float64(5.5), bedrooms=2.0)
+    )
+    assert comparison_key(**INPUTS) != comparison_key(**dict(INPUTS, home_price=750001))
+
+def test_second_comparison_is_a_hit(cache):
+    first = cached_comparison(**INPUTS)
+    second = cached_comparison(**dict(INPUTS, home_price=750000.0))
+
+    expected = run_comparison(**{name: value for name, value in INPUTS.items() if name not in ("city", "bedrooms")})
+    assert first["net_buying_cost"] == pytest.approx(expected["net_buying_cost"])
+    assert second == first
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 1
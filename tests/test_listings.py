@@ -0,0 +1,69 @@
+import numpy as np
+import pytest
+
+from utils.listings import ListingIndex, haversine_km, load_listings
+
+CENTRE = (43.6532, -79.3832)
+
+@pytest.fixture(scope="module")
+def listings():
+    rng = np.random.default_rng(0)
+    size = 5000
+    return {
+        "latitudes": CENTRE[0] + rng.uniform(-0.2, 0.2, size),
+        "longitudes": CENTRE[1] + rng.uniform(-0.3, 0.3, size),
+        "bedrooms": rng.integers(0, 4, size),
+        "rents": rng.uniform(1200, 4000, size),
+    }
+
+@pytest.fixture(scope="module")
+def index(listings):
+    return ListingIndex(listings["latitudes"], listings["longitudes"], listings["bedrooms"], listings["rents"])
+
+def _distances(listings):
+    return haversine_km(*CENTRE, listings["latitudes"], listings["longitudes"])
+
+def test_haversine_distance():
+    montreal = haversine_km(*CENTRE, np.array([45.5019]), np.array([-73.5674]))
+    assert montreal[0] == pytest.approx(504, abs=2)
+
+@pytest.mark.parametrize("radius_km", [0.3, 1.0, 5.0])
+def test_within_matches_a_full_scan(listings, index, radius_km):
+    positions, distances = index.within(*CENTRE, radius_km, bedrooms=2)
+
+    expected = (_distances(listings) <= radius_km) & (listings["bedrooms"] == 2)
+    assert sorted(index.rents[positions]) == sorted(listings["rents"][expected])
+    assert (distances <= radius_km).all()
+    assert (index.bedrooms[positions] == 2).all()
+
+def test_nearest_matches_a_full_scan(listings, index):
+    positions, distances = index.nearest(*CENTRE, 25)
+
+    expected = np.sort(_distances(listings))[:25]
+    np.testing.assert_allclose(distances, expected)
+
+def test_comparables_widen_to_the_nearest_listings(listings, index):
+    summary = index.comparables(*CENTRE, 1, radius_km=0.1, min_listings=10)
+    ones = listings["bedrooms"] == 1
+    nearest = np.argsort(_distances(listings)[ones])[:10]
+
+    assert summary["listings"] == 10
+    assert summary["median_rent"] == pytest.approx(np.median(listings["rents"][ones][nearest]))
+    assert summary["radius_km"] > 0.1
+
+def test_empty_index_has_no_comparables():
+    index = ListingIndex([], [], [], [])
+    assert len(index) == 0
+    assert index.comparables(*CENTRE, 2) is None
+
+def test_unusable_rows_are_skipped(tmp_path):
+    path = tmp_path / "listings.csv"
+    path.write_text(
+        "latitude,longitude,bedrooms,rent\n"
+        "43.65,-79.38,2,2500\n"
+        "95.0,-79.38,2,2500\n"
+        "43.65,-79.38,x,2500\n"
+        "43.65,-79.38,2,0\n"
+    )
+    assert len(load_listings(str(path))) == 1
+    assert len(load_listings(str(tmp_path / "missing.csv"))) == 0
@@ -0,0 +1,88 @@
+import numpy as np
+import pytest
+
+from utils.calculations import (
+    RatePath,
+    calculate_mortgage_payment,
+    calculate_total_buying_cost,
+    calculate_total_renting_cost
+)
+from utils.comparison import tax_profile
+from utils.projection import APPRECIATION_CAP, build_projection
+
+INPUTS = dict(
+    home_price=600000, down_payment=120000, interest_rate=5.0, loan_term_years=20, property_tax_rate=0.8,
+    maintenance_cost=4000, appreciation_rate=2.5, monthly_rent=2200, rent_increase_rate=3.0,
+    investment_return_rate=5.0,
+)
+
+@pytest.mark.parametrize("interest_rate", [0.0, 5.0])
+def test_payment_and_rent_match_the_scalar_calculations(interest_rate):
+    projection = build_projection(**dict(INPUTS, interest_rate=interest_rate))
+
+    assert projection.monthly_mortgage == pytest.approx(calculate_mortgage_payment(480000, interest_rate, 20))
+    assert projection.total_renting_cost == pytest.approx(calculate_total_renting_cost(2200, 20, 3.0))
+    assert projection.loan_balance[-1] == pytest.approx(0.0, abs=1e-6)
+
+def test_flat_costs_match_the_scalar_buying_cost():
+    # With no appreciation or maintenance inflation, property tax and maintenance stay flat
+    inputs = dict(INPUTS, appreciation_rate=0.0, maintenance_inflation_rate=0.0)
+    projection = build_projection(**inputs)
+
+    total_cost, final_home_value = calculate_total_buying_cost(
+        600000, 120000, projection.monthly_mortgage, 0.8, 4000, 20, 0.0
+    )
+    assert projection.total_buying_cost == pytest.approx(total_cost)
+    assert projection.final_home_value == pytest.approx(final_home_value)
+
+def test_buying_cost_leaves_array_inputs_unchanged():
+    down_payments = np.array([60000, 120000])
+    total_cost, _ = calculate_total_buying_cost(600000, down_payments, 2500.0, 0.8, 4000, 20, 2.5)
+
+    np.testing.assert_array_equal(down_payments, [60000, 120000])
+    expected = [calculate_total_buying_cost(600000, down, 2500.0, 0.8, 4000, 20, 2.5)[0] for down in (60000, 120000)]
+    np.testing.assert_allclose(total_cost, expected)
+
+def test_home_value_grows_at_the_capped_rate():
+    _, expected = calculate_total_buying_cost(600000, 120000, 0, 0, 0, 20, APPRECIATION_CAP)
+    assert build_projection(**dict(INPUTS, appreciation_rate=7.0)).final_home_value == pytest.approx(expected)
+
+    _, uncapped = calculate_total_buying_cost(600000, 120000, 0, 0, 0, 20, 7.0)
+    projection = build_projection(**dict(INPUTS, appreciation_rate=7.0), appreciation_cap=None)
+    assert projection.final_home_value == pytest.approx(uncapped)
+
+def test_batch_matches_single_scenarios():
+    prices = np.array([300000, 600000, 900000])
+    terms = np.array([10, 20, 25])
+    batch = build_projection(**dict(INPUTS, home_price=prices[:, None], down_payment=prices[:, None] * 0.2,
+                                    loan_term_years=terms[None, :]))
+
+    for i, price in enumerate(prices):
+        for j, term in enumerate(terms):
+            single = build_projection(**dict(INPUTS, home_price=price, down_payment=price * 0.2, loan_term_years=term))
+            assert batch.net_buying_cost[i, j] == pytest.approx(single.net_buying_cost)
+            assert batch.adjusted_renting_cost[i, j] == pytest.approx(single.adjusted_renting_cost)
+            assert batch.break_even_year[i, j] == (single.break_even_year or 0)
+
+def test_hbp_repayments_stop_at_each_scenarios_own_term():
+    # A 10-year scenario batched with a 30-year one must not be charged HBP repayments past year 10
+    profile = tax_profile(9000, "ON", hbp_amount=50000, hbp_repaid=False)
+    terms = np.array([10, 30])
+    batch = build_projection(**dict(INPUTS, loan_term_years=terms), tax_profile=profile)
+
+    for i, term in enumerate(terms):
+        single = build_projection(**dict(INPUTS, loan_term_years=term), tax_profile=profile)
+        assert batch.buying_tax[i] == pytest.approx(single.buying_tax)
+        assert batch.net_buying_cost[i] == pytest.approx(single.net_buying_cost)
+
+def test_constant_rate_paths_match_the_scalar_rates():
+    rates = dict(interest_rate=5.0, appreciation_rate=2.5, rent_increase_rate=3.0, investment_return_rate=5.0)
+    paths = {name: RatePath(np.full(20, rate)) for name, rate in rates.items()}
+    scalar = build_projection(**INPUTS)
+    path = build_projection(**dict(INPUTS, **paths))
+
+    for name in ("monthly_mortgage", "total_buying_cost", "final_home_value", "net_buying_cost",
+                 "adjusted_renting_cost", "break_even_year"):
+        assert getattr(path, name) == pytest.approx(getattr(scalar, name)), name
+    np.testing.assert_allclose(path.loan_balance, scalar.loan_balance, atol=1e-6)
+    np.testing.assert_allclose(path.balance, scalar.balance, atol=1e-6)
@@ -0,0 +1,99 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.calculations import RatePath
+from utils.comparison import run_comparison
+from utils.properties import MAX_PROPERTIES, RANKING_COLUMNS, compare_properties
+
+SHARED = dict(
+    monthly_income=9000, down_payment_percent=20, interest_rate=5.5, loan_term_years=25, property_tax_rate=0.7,
+    maintenance_cost=5000.0, appreciation_rate=3.0, selling_cost_percent=5.0, rent_increase_rate=3.0,
+    investment_return_rate=5.0,
+)
+
+PROPERTIES = pd.DataFrame({
+    "name": ["Condo", "Semi", "Detached", "Bungalow"],
+    "home_price": [450000, 800000, 1300000, 650000],
+    "monthly_rent": [2400, 3100, 3600, 2900],
+    "property_tax_rate": [np.nan, 0.9, np.nan, 1.1],
+    "loan_term_years": [25, 30, np.nan, 20],
+})
+
+def _own_inputs(row, shared):
+    """The run_comparison inputs of one candidate alone"""
+    own = {name: value for name, value in row.items() if name != "name" and not pd.isna(value)}
+    if "loan_term_years" in own:
+        own["loan_term_years"] = int(own["loan_term_years"])
+    return {**shared, **own}
+
+def _assert_rows_match_single_comparisons(ranking, properties, shared):
+    for _, candidate in properties.iterrows():
+        row = ranking[ranking["name"] == candidate["name"]].iloc[0]
+        expected = run_comparison(**_own_inputs(candidate, shared))
+        for name in ["monthly_mortgage", "net_buying_cost", "adjusted_renting_cost"]:
+            assert row[name] == pytest.approx(expected[name]), (candidate["name"], name)
+        assert row["buying_advantage"] == pytest.approx(
+            expected["adjusted_renting_cost"] - expected["net_buying_cost"]
+        )
+        assert row["cheaper_option"] == expected["cheaper_option"]
+        if expected["break_even_year"] is None:
+            assert pd.isna(row["break_even_year"])
+        else:
+            assert row["break_even_year"] == expected["break_even_year"]
+
+def test_rows_match_single_comparisons():
+    ranking = compare_properties(PROPERTIES, **SHARED)
+    assert list(ranking.columns) == ["rank", "name"] + RANKING_COLUMNS
+    _assert_rows_match_single_comparisons(ranking, PROPERTIES, SHARED)
+
+def test_candidates_are_ranked_by_buying_advantage():
+    ranking = compare_properties(PROPERTIES, **SHARED)
+
+    assert ranking["rank"].tolist() == [1, 2, 3, 4]
+    assert (np.diff(ranking["buying_advantage"]) <= 0).all()
+
+def test_candidates_without_a_rent_come_last_unranked():
+    properties = pd.concat([
+        pd.DataFrame({"name": ["Nowhere"], "home_price": [500000], "city": ["Atlantis"], "bedrooms": [2]}),
+        PROPERTIES,
+    ], ignore_index=True)
+    ranking = compare_properties(properties, **SHARED)
+
+    assert ranking["rank"].tolist()[:4] == [1, 2, 3, 4]
+    last = ranking.iloc[-1]
+    assert last["name"] == "Nowhere"
+    assert pd.isna(last["rank"])
+    assert np.isnan(last["monthly_rent"]) and np.isnan(last["net_buying_cost"])
+    assert last["cheaper_option"] is None
+    _assert_rows_match_single_comparisons(ranking, PROPERTIES, SHARED)
+
+def test_own_rates_replace_the_shared_rate_path_every_year():
+    path = RatePath(np.linspace(4.0, 7.0, 30))
+    properties = PROPERTIES.assign(interest_rate=[np.nan, 4.5, np.nan, 6.0])
+    ranking = compare_properties(properties, **dict(SHARED, interest_rate=path))
+
+    # Candidates with a rate of their own keep it, the others follow the path
+    _assert_rows_match_single_comparisons(ranking, properties.iloc[[1, 3]], SHARED)
+    for _, candidate in properties.iloc[[0, 2]].iterrows():
+        row = ranking[ranking["name"] == candidate["name"]].iloc[0]
+        expected = run_comparison(**_own_inputs(candidate.drop("interest_rate"), dict(SHARED, interest_rate=path)))
+        assert row["net_buying_cost"] == pytest.approx(expected["net_buying_cost"])
+        assert row["adjusted_renting_cost"] == pytest.approx(expected["adjusted_renting_cost"])
+
+def test_candidates_are_limited():
+    properties = pd.DataFrame({"home_price": np.full(MAX_PROPERTIES + 1, 500000), "monthly_rent": 2500})
+    with pytest.raises(ValueError, match=str(MAX_PROPERTIES)):
+        compare_properties(properties, **SHARED)
+
+    assert len(compare_properties(properties.iloc[:MAX_PROPERTIES], **SHARED)) == MAX_PROPERTIES
+
+def test_candidates_need_a_price():
+    with pytest.raises(ValueError, match="home_price"):
+        compare_properties(PROPERTIES.drop(columns="home_price"), **SHARED)
+
+def test_taxed_rows_with_other_terms_match_single_comparisons():
+    # HBP repayments stop at each candidate's own term, whatever the longest term in the batch
+    shared = dict(SHARED, province="ON", hbp_amount=30000, hbp_repaid=False)
+    properties = PROPERTIES.assign(loan_term_years=[10, 30, 15, 25])
+    _assert_rows_match_single_comparisons(compare_properties(properties, **shared), properties, shared)
@@ -0,0 +1,65 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.data_handler import RentStore
+from utils.rent_bundle import bundle_path, convert_rent_csv, encode_rent_table, load_rent_bundle
+
+RENT_TABLE = """city,bedrooms,average_rent
+Toronto,2,2600
+Calgary,1,1400
+Toronto,1,2000
+Halifax,3,2100
+Toronto,2,9999
+,2,1800
+Calgary,3,2200
+"""
+
+@pytest.fixture
+def csv_path(tmp_path):
+    path = tmp_path / "rent_data.csv"
+    path.write_text(RENT_TABLE)
+    return str(path)
+
+def test_bundle_holds_the_encoded_csv(csv_path):
+    directory = convert_rent_csv(csv_path)
+    assert directory == bundle_path(csv_path)
+
+    bundle = load_rent_bundle(directory, source_path=csv_path)
+    expected = encode_rent_table(pd.read_csv(csv_path))
+    assert bundle.keys() == expected.keys()
+    for name, values in expected.items():
+        np.testing.assert_array_equal(bundle[name], values, err_msg=name)
+
+def test_bundle_rows_decode_to_the_csv_rows(csv_path):
+    bundle = load_rent_bundle(convert_rent_csv(csv_path))
+    rows = list(zip(bundle["city_names"][bundle["city_codes"]].tolist(), bundle["bedrooms"].tolist(),
+                    bundle["average_rent"].tolist()))
+
+    # Sorted by city and bedrooms, the first of duplicated pairs kept, rows without a city dropped
+    assert rows == [
+        ("Calgary", 1, 1400), ("Calgary", 3, 2200), ("Halifax", 3, 2100), ("Toronto", 1, 2000), ("Toronto", 2, 2600),
+    ]
+
+def test_store_answers_the_same_from_the_bundle_and_the_csv(csv_path, tmp_path):
+    plain_path = tmp_path / "plain" / "rent_data.csv"
+    plain_path.parent.mkdir()
+    plain_path.write_text(RENT_TABLE)
+    convert_rent_csv(csv_path)
+
+    from_bundle = RentStore(csv_path, check_interval=0)
+    from_csv = RentStore(str(plain_path), check_interval=0)
+    for city in ["Toronto", "Calgary", "Halifax", "Atlantis"]:
+        for bedrooms in range(5):
+            assert from_bundle.get_rent(city, bedrooms) == from_csv.get_rent(city, bedrooms), (city, bedrooms)
+
+def test_bundle_is_stale_once_the_csv_changes(csv_path):
+    directory = convert_rent_csv(csv_path)
+    with open(csv_path, "a") as csv_file:
+        csv_file.write("Regina,2,1300\n")
+    os.utime(csv_path, ns=(0, 0))
+
+    assert load_rent_bundle(directory, source_path=csv_path) is None
+    assert RentStore(csv_path, check_interval=0).get_rent("Regina", 2) == 1300
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from utils.data_handler import RentStore
+
+RENT_TABLE = """province,city,neighbourhood,postal_prefix,bedrooms,average_rent
+ON,,,,1,1500
+ON,,,,3,2500
+ON,Toronto,,,1,2000
+ON,Toronto,,,2,2600
+ON,Toronto,Annex,,1,2300
+ON,Toronto,Annex,M5V,2,3000
+BC,Vancouver,,,2,3100
+"""
+
+@pytest.fixture
+def store(tmp_path):
+    path = tmp_path / "rent_data.csv"
+    path.write_text(RENT_TABLE)
+    return RentStore(str(path), check_interval=0)
+
+@pytest.mark.parametrize("bedrooms, area, expected", [
+    (2, {"city": "Toronto"}, {"rent": 2600, "bedrooms": 2, "level": "city", "area": "Toronto"}),
+    # The exact bedroom count from the closest enclosing area that has it
+    (3, {"city": "Toronto"}, {"rent": 2500, "bedrooms": 3, "level": "province", "area": "ON"}),
+    (2, {"city": "Toronto", "neighbourhood": "Annex"},
+     {"rent": 2600, "bedrooms": 2, "level": "city", "area": "Toronto"}),
+    (1, {"city": "Toronto", "neighbourhood": "Annex"},
+     {"rent": 2300, "bedrooms": 1, "level": "neighbourhood", "area": "Annex, Toronto"}),
+    (2, {"postal_code": "m5v 2t6"}, {"rent": 3000, "bedrooms": 2, "level": "postal_prefix", "area": "M5V"}),
+    # Otherwise the nearest bedroom count in the most specific area
+    (4, {"city": "Vancouver"}, {"rent": 3100, "bedrooms": 2, "level": "city", "area": "Vancouver"}),
+    (2, {"province": "ON"}, {"rent": 1500, "bedrooms": 1, "level": "province", "area": "ON"}),
+])
+def test_estimates_fall_back_through_the_areas(store, bedrooms, area, expected):
+    assert store.get_rent_estimate(bedrooms, **area) == expected
+
+def test_unknown_areas_have_no_rent(store):
+    assert store.get_rent_estimate(2, city="Atlantis") is None
+    assert store.get_rent("Atlantis", 2) is None
+
+def test_get_rent_is_the_city_estimate(store):
+    assert store.get_rent("Toronto", 1) == 2000
+    assert store.get_rent("Toronto", 3) == 2500
+    assert store.get_cities() == ["Toronto", "Vancouver"]
+
+def test_get_rents_matches_single_lookups(store):
+    cities = np.array(["Toronto", "Toronto", "Atlantis", None, "Toronto"], dtype=object)
+    bedrooms = np.array([1, 2, 2, 2, 1])
+    neighbourhoods = np.array([None, "Annex", None, None, "Annex"], dtype=object)
+    postal_codes = np.array([None, None, None, "M5V 1A1", None], dtype=object)
+
+    rents = store.get_rents(cities, bedrooms, neighbourhoods, postal_codes)
+    np.testing.assert_array_equal(rents, [2000, 2600, np.nan, 3000, 2300])
+
+def test_changed_table_is_reloaded(store, tmp_path):
+    assert store.get_rent("Toronto", 2) == 2600
+    (tmp_path / "rent_data.csv").write_text(RENT_TABLE.replace("2600", "2700"))
+    store.refresh(force=True)
+    assert store.get_rent("Toronto", 2) == 2700
@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import utils.rent_ingest
+from utils.rent_ingest import RENT_BIN_WIDTH, ingest
+
+def _listings(path, seed, rows=400):
+    rng = np.random.default_rng(seed)
+    listings = pd.DataFrame({
+        "city": rng.choice(["Toronto", "Calgary", "Halifax"], rows),
+        "bedrooms": rng.integers(1, 4, rows),
+        "rent": rng.normal(2200, 400, rows).round(),
+    })
+    listings.to_csv(path, index=False)
+    return listings
+
+def _ingest(paths, output, **options):
+    seen = {}
+    table = ingest([str(path) for path in paths], str(output), outlier_iqr=None, min_listings=1, chunk_size=150,
+                   progress=lambda path, counts: seen.__setitem__(path, counts), **options)
+    return table, seen
+
+def test_medians_match_the_listings(tmp_path):
+    listings = pd.concat([_listings(tmp_path / "a.csv", 1), _listings(tmp_path / "b.csv", 2)])
+    table, seen = _ingest([tmp_path / "a.csv", tmp_path / "b.csv"], tmp_path / "rent_data.csv")
+
+    assert seen == {str(tmp_path / "a.csv"): (400, 400), str(tmp_path / "b.csv"): (400, 400)}
+    # The histogram median falls in the bin of the first rent reaching half the listings
+    medians = listings.groupby(["city", "bedrooms"])["rent"].quantile(0.5, interpolation="lower")
+    assert len(table) == len(medians)
+    for row in table.itertuples():
+        assert abs(row.average_rent - medians[row.city, row.bedrooms]) <= RENT_BIN_WIDTH
+    pd.testing.assert_frame_equal(pd.read_csv(tmp_path / "rent_data.csv"), table, check_dtype=False)
+
+def test_rerun_reads_only_new_and_changed_files(tmp_path):
+    for seed, name in enumerate(["a.csv", "b.csv", "c.csv"]):
+        _listings(tmp_path / name, seed)
+    paths = [tmp_path / "a.csv", tmp_path / "b.csv", tmp_path / "c.csv"]
+    _ingest(paths[:2], tmp_path / "rent_data.csv")
+
+    _listings(tmp_path / "b.csv", 10)
+    table, seen = _ingest(paths, tmp_path / "rent_data.csv")
+
+    assert seen == {str(paths[0]): None, str(paths[1]): (400, 400), str(paths[2]): (400, 400)}
+    fresh, _ = _ingest(paths, tmp_path / "fresh.csv")
+    pd.testing.assert_frame_equal(table, fresh)
+
+def test_interrupted_run_resumes_where_it_stopped(tmp_path, monkeypatch):
+    paths = [tmp_path / "a.csv", tmp_path / "b.csv"]
+    for seed, path in enumerate(paths):
+        _listings(path, seed)
+
+    ingest_file = utils.rent_ingest._ingest_file
+    def interrupted(path, *args):
+        if path == str(paths[1]):
+            raise KeyboardInterrupt
+        return ingest_file(path, *args)
+
+    monkeypatch.setattr(utils.rent_ingest, "_ingest_file", interrupted)
+    with pytest.raises(KeyboardInterrupt):
+        _ingest(paths, tmp_path / "rent_data.csv")
+    assert not (tmp_path / "rent_data.csv").exists()
+
+    monkeypatch.setattr(utils.rent_ingest, "_ingest_file", ingest_file)
+    table, seen = _ingest(paths, tmp_path / "rent_data.csv")
+
+    assert seen == {str(paths[0]): None, str(paths[1]): (400, 400)}
+    fresh, _ = _ingest(paths, tmp_path / "fresh.csv")
+    pd.testing.assert_frame_equal(table, fresh)
@@ -0,0 +1,156 @@
+import email
+import email.policy
+import os
+import socketserver
+import threading
+import time
+
+import pytest
+
+import utils.reports
+from utils.reports import REPORT_FORMATS, ArtifactCache, ReportQueue, render_csv, report_id, valid_email
+
+INPUTS = dict(
+    monthly_income=9000, city="Toronto", home_price=750000, down_payment_percent=20, interest_rate=5.5,
+    loan_term_years=25, property_tax_rate=0.7, maintenance_cost=5000, appreciation_rate=3.0,
+    selling_cost_percent=5.0, bedrooms=2, monthly_rent=2800, rent_increase_rate=3.0, investment_return_rate=5.0,
+)
+
+class _SMTPHandler(socketserver.StreamRequestHandler):
+    """Just enough of SMTP for smtplib to deliver a message"""
+
+    def reply(self, line):
+        self.wfile.write(line.encode() + b"\r\n")
+
+    def handle(self):
+        self.reply("220 stub")
+        while True:
+            command = self.rfile.readline().decode().strip().upper()
+            if not command or command.startswith("QUIT"):
+                self.reply("221 bye")
+                return
+            if command.startswith("DATA"):
+                self.reply("354 go ahead")
+                lines = []
+                for line in iter(self.rfile.readline, b".\r\n"):
+                    lines.append(line[1:] if line.startswith(b"..") else line)
+                self.server.received.append(email.message_from_bytes(b"".join(lines), policy=email.policy.default))
+            self.reply("250 ok")
+
+@pytest.fixture
+def smtp_server(monkeypatch):
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), _SMTPHandler)
+    server.daemon_threads = True
+    server.received = []
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setenv("HOMEDECIDE_SMTP_HOST", "127.0.0.1")
+    monkeypatch.setenv("HOMEDECIDE_SMTP_PORT", str(server.server_address[1]))
+    yield server
+    server.shutdown()
+    server.server_close()
+
+@pytest.fixture
+def queue(tmp_path, monkeypatch):
+    monkeypatch.delenv("HOMEDECIDE_RESULT_STORE", raising=False)
+    return ReportQueue(str(tmp_path / "reports"), workers=2)
+
+def _finished(queue, job_id, timeout=30.0):
+    deadline = time.monotonic() + timeout
+    while queue.status(job_id)["status"] in ("queued", "running"):
+        assert time.monotonic() < deadline, "job did not finish"
+        time.sleep(0.01)
+    return queue.status(job_id)
+
+def test_cache_evicts_the_least_recently_used_files(tmp_path):
+    cache = ArtifactCache(str(tmp_path), max_bytes=25)
+    cache.write("a", b"a" * 10)
+    cache.write("b", b"b" * 10)
+    os.utime(cache.path("a"), ns=(1, 1))
+    os.utime(cache.path("b"), ns=(2, 2))
+
+    assert cache.read("a") == b"a" * 10
+    cache.write("c", b"c" * 10)
+
+    assert cache.read("b") is None
+    assert not cache.contains("b")
+    assert cache.read("a") == b"a" * 10
+    assert cache.read("c") == b"c" * 10
+    assert sorted(os.listdir(tmp_path)) == ["a", "c"]
+
+@pytest.mark.parametrize("address, expected", [
+    ("buyer@example.com", True),
+    ("Buyer <buyer@example.com>", True),
+    ("buyer@localhost", False),
+    ("@example.com", False),
+    ("buyer", False),
+    ("", False),
+    (None, False),
+])
+def test_valid_email(address, expected):
+    assert valid_email(address) == expected
+
+def test_identical_reports_are_rendered_once(queue, monkeypatch):
+    release = threading.Event()
+    calls = []
+    build_report = utils.reports.build_report
+
+    def blocked(inputs):
+        calls.append(inputs)
+        release.wait(10)
+        return build_report(inputs)
+
+    monkeypatch.setattr(utils.reports, "build_report", blocked)
+    job_id = queue.submit(INPUTS, "csv")
+    assert queue.submit(dict(INPUTS), "csv") == job_id
+    assert queue.status(job_id)["status"] in ("queued", "running")
+    release.set()
+
+    assert _finished(queue, job_id) == {"status": "done"}
+    assert queue.submit(INPUTS, "csv") == job_id
+    assert len(calls) == 1
+    assert job_id == report_id(INPUTS, "csv")
+    assert queue.read(job_id) == render_csv(build_report(INPUTS))
+    assert report_id(dict(INPUTS, home_price=800000), "csv") != job_id
+    assert report_id(INPUTS, "pdf") != job_id
+
+def test_failed_jobs_are_retried(queue, monkeypatch):
+    build_report = utils.reports.build_report
+    failures = [RuntimeError("renderer crashed")]
+
+    def flaky(inputs):
+        if failures:
+            raise failures.pop()
+        return build_report(inputs)
+
+    monkeypatch.setattr(utils.reports, "build_report", flaky)
+    job_id = queue.submit(INPUTS, "csv")
+    assert _finished(queue, job_id) == {"status": "failed", "error": "renderer crashed"}
+    assert queue.read(job_id) is None
+
+    assert queue.submit(INPUTS, "csv") == job_id
+    assert _finished(queue, job_id) == {"status": "done"}
+    assert queue.read(job_id) is not None
+
+def test_unknown_jobs(queue):
+    assert queue.status("0" * 64) == {"status": "unknown"}
+
+def test_reports_are_emailed(queue, smtp_server):
+    job_id = queue.email(INPUTS, "buyer@example.com")
+    assert _finished(queue, job_id) == {"status": "done"}
+
+    [message] = smtp_server.received
+    assert message["To"] == "buyer@example.com"
+    attachments = {part.get_filename(): part.get_payload(decode=True) for part in message.iter_attachments()}
+    assert attachments == {
+        REPORT_FORMATS[report_format][0]: queue.read(report_id(INPUTS, report_format))
+        for report_format in REPORT_FORMATS
+    }
+
+def test_email_needs_a_server_and_a_valid_address(queue, smtp_server, monkeypatch):
+    with pytest.raises(ValueError, match="address"):
+        queue.email(INPUTS, "buyer")
+
+    monkeypatch.delenv("HOMEDECIDE_SMTP_HOST")
+    with pytest.raises(ValueError, match="HOMEDECIDE_SMTP_HOST"):
+        queue.email(INPUTS, "buyer@example.com")
+    assert smtp_server.received == []
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from utils.result_store import ResultStore, cached_result, get_result_store, result_key
+
+def test_round_trip(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    value = {"x": np.arange(3.0), "break_even_year": 14}
+    store.put("sensitivity", {"home_price": 750000}, value)
+
+    stored = store.get("sensitivity", {"home_price": 750000})
+    assert list(stored["x"]) == [0.0, 1.0, 2.0]
+    assert stored["break_even_year"] == 14
+    assert store.get("sensitivity", {"home_price": 750001}) is None
+    assert store.get("comparison", {"home_price": 750000}) is None
+
+def test_results_are_shared_between_stores_on_one_file(tmp_path):
+    path = str(tmp_path / "results.db")
+    ResultStore(path).put("comparison", [1, 2], "stored")
+    assert ResultStore(path).get("comparison", [1, 2]) == "stored"
+
+def test_keys_ignore_the_order_of_inputs():
+    assert result_key("comparison", {"a": 1, "b": 2}) == result_key("comparison", {"b": 2, "a": 1})
+    assert result_key("comparison", {"a": np.float64(1.5)}) == result_key("comparison", {"a": 1.5})
+
+def test_expired_results_are_missing(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"), ttl=-1)
+    store.put("comparison", [1], "stored")
+    assert store.get("comparison", [1]) is None
+
+def test_prune_keeps_the_most_recent_entries(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"), max_entries=2)
+    for index in range(4):
+        store.put("comparison", [index], index)
+    store.prune()
+    assert [store.get("comparison", [index]) for index in range(4)] == [None, None, 2, 3]
+
+def test_cached_computes_once(tmp_path):
+    store = ResultStore(str(tmp_path / "results.db"))
+    calls = []
+    def compute():
+        calls.append(1)
+        return "computed"
+
+    assert store.cached("comparison", [1], compute) == "computed"
+    assert store.cached("comparison", [1], compute) == "computed"
+    assert len(calls) == 1
+
+def test_store_is_enabled_by_the_environment(tmp_path, monkeypatch):
+    monkeypatch.delenv("HOMEDECIDE_RESULT_STORE", raising=False)
+    assert get_result_store() is None
+    assert cached_result("comparison", [1], lambda: "computed") == "computed"
+
+    path = str(tmp_path / "results.db")
+    monkeypatch.setenv("HOMEDECIDE_RESULT_STORE", path)
+    assert get_result_store().path == path
+    cached_result("comparison", [1], lambda: "computed")
+    assert cached_result("comparison", [1], lambda: pytest.fail("recomputed")) == "computed"
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from utils.comparison import run_comparison
+from utils.scenarios import evaluate_scenarios
+
+SCENARIO = dict(
+    home_price=750000, down_payment_percent=20, interest_rate=5.5, loan_term_years=25, monthly_rent=2800,
+    monthly_income=9000,
+)
+
+def test_rows_match_single_comparisons():
+    prices = [400000, 750000, 1200000]
+    results = evaluate_scenarios(pd.DataFrame([dict(SCENARIO, home_price=price) for price in prices]))
+
+    for price, (_, row) in zip(prices, results.iterrows()):
+        expected = run_comparison(
+            SCENARIO["monthly_income"], price, 20, 5.5, 25, 0.7, 5000.0, 3.0, 5.0, 2800, 3.0, 5.0
+        )
+        assert row["monthly_payment"] == pytest.approx(expected["monthly_mortgage"])
+        assert row["net_buying_cost"] == pytest.approx(expected["net_buying_cost"])
+        assert row["adjusted_renting_cost"] == pytest.approx(expected["adjusted_renting_cost"])
+
+def test_missing_required_columns_are_reported():
+    with pytest.raises(ValueError, match="monthly_rent"):
+        evaluate_scenarios(pd.DataFrame([{k: v for k, v in SCENARIO.items() if k != "monthly_rent"}]))
+
+@pytest.mark.parametrize("blank", [None, np.nan, ""])
+def test_rows_without_a_tax_province_are_untaxed(blank):
+    scenarios = pd.DataFrame([dict(SCENARIO, tax_province="ON"), dict(SCENARIO, tax_province=blank)])
+    taxed, untaxed = (row for _, row in evaluate_scenarios(scenarios).iterrows())
+    plain = evaluate_scenarios(pd.DataFrame([SCENARIO])).iloc[0]
+
+    assert taxed["capital_gains_tax"] > 0
+    assert untaxed["capital_gains_tax"] == 0
+    assert untaxed["buying_tax"] == 0
+    assert untaxed["adjusted_renting_cost"] == pytest.approx(plain["adjusted_renting_cost"])
+    assert untaxed["net_buying_cost"] == pytest.approx(plain["net_buying_cost"])
+
+def test_unknown_tax_province_is_rejected():
+    with pytest.raises(ValueError, match="Unknown province"):
+        evaluate_scenarios(pd.DataFrame([dict(SCENARIO, tax_province="Atlantis")]))
+
+def test_taxed_rows_with_other_terms_match_single_comparisons():
+    # HBP repayments stop at each row's own term, whatever the longest term in the chunk
+    taxes = dict(hbp_amount=30000, hbp_repaid=False)
+    rows = [dict(SCENARIO, tax_province="ON", loan_term_years=term, **taxes) for term in (10, 30)]
+
+    for row, (_, result) in zip(rows, evaluate_scenarios(pd.DataFrame(rows)).iterrows()):
+        expected = run_comparison(
+            9000, 750000, 20, 5.5, row["loan_term_years"], 0.7, 5000.0, 3.0, 5.0, 2800, 3.0, 5.0, province="ON", **taxes
+        )
+        assert result["buying_tax"] == pytest.approx(expected["buying_tax"])
+        assert result["net_buying_cost"] == pytest.approx(expected["net_buying_cost"])
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+from utils.projection import build_projection
+from utils.sensitivity import build_sensitivity_grid, sensitivity_axis
+
+INPUTS = dict(
+    home_price=750000, down_payment_percent=20, interest_rate=5.5, loan_term_years=25, property_tax_rate=0.7,
+    maintenance_cost=5000.0, appreciation_rate=3.0, selling_cost_percent=5.0, monthly_rent=2800,
+    rent_increase_rate=3.0, investment_return_rate=5.0,
+)
+
+def _single(inputs):
+    return build_projection(
+        inputs["home_price"], inputs["home_price"] * inputs["down_payment_percent"] / 100, inputs["interest_rate"],
+        inputs["loan_term_years"], inputs["property_tax_rate"], inputs["maintenance_cost"],
+        inputs["appreciation_rate"], inputs["monthly_rent"], inputs["rent_increase_rate"],
+        inputs["investment_return_rate"], inputs["selling_cost_percent"],
+    )
+
+def test_axes_sweep_around_the_current_value_within_bounds():
+    np.testing.assert_allclose(sensitivity_axis("interest_rate", 5.5, 7), np.linspace(2.5, 8.5, 7))
+    np.testing.assert_allclose(sensitivity_axis("interest_rate", 1.0, 3), [0.0, 2.0, 4.0])
+    np.testing.assert_allclose(sensitivity_axis("home_price", 600000, 3), [300000, 600000, 900000])
+
+def test_every_cell_matches_a_single_projection():
+    grid = build_sensitivity_grid(INPUTS, "interest_rate", "home_price", size=5)
+
+    assert grid["buying_advantage"].shape == grid["break_even_year"].shape == (5, 5)
+    for i, home_price in enumerate(grid["y"]):
+        for j, interest_rate in enumerate(grid["x"]):
+            single = _single(dict(INPUTS, home_price=home_price, interest_rate=interest_rate))
+            assert grid["buying_advantage"][i, j] == pytest.approx(
+                single.adjusted_renting_cost - single.net_buying_cost
+            )
+            assert grid["break_even_year"][i, j] == (single.break_even_year or 0)
+
+def test_buying_advantage_falls_as_the_interest_rate_rises():
+    grid = build_sensitivity_grid(INPUTS, "interest_rate", "monthly_rent", size=5)
+    assert (np.diff(grid["buying_advantage"], axis=1) < 0).all()
+    assert (np.diff(grid["buying_advantage"], axis=0) > 0).all()
+
+def test_axes_must_differ():
+    with pytest.raises(ValueError):
+        build_sensitivity_grid(INPUTS, "interest_rate", "interest_rate")
@@ -0,0 +1,131 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from unittest.mock import patch
+
+import pandas as pd
+import pytest
+
+from utils.comparison import get_comparison_cache, run_comparison
+from utils.data_handler import get_average_rent
+from utils.scenarios import SCENARIO_DEFAULTS, evaluate_scenarios
+from utils.server import ComparisonBatcher, RequestError, handle_request, parse_scenario, parse_tax
+from utils.solver import solve
+
+SCENARIO = {
+    "monthly_income": 9000, "home_price": 750000, "down_payment_percent": 20, "interest_rate": 5.5,
+    "loan_term_years": 25, "monthly_rent": 2800,
+}
+
+def _batched(scenarios):
+    """Submit the scenarios in one pass of the loop so they share a flush"""
+    async def submit_all():
+        batcher = ComparisonBatcher()
+        return await asyncio.gather(*(batcher.submit(scenario) for scenario in scenarios))
+    return asyncio.run(submit_all())
+
+def test_batcher_matches_single_comparisons():
+    scenarios = [
+        parse_scenario(dict(SCENARIO, home_price=price)) for price in (500000, 750000, 1000000)
+    ]
+    for scenario, result in zip(scenarios, _batched(scenarios)):
+        expected = run_comparison(**scenario)
+        assert result["net_buying_cost"] == pytest.approx(expected["net_buying_cost"])
+        assert result["break_even_year"] == expected["break_even_year"]
+
+def test_batcher_keeps_taxed_and_untaxed_scenarios_apart():
+    taxed_payload = dict(SCENARIO, tax_province="ON", fhsa_amount=20000)
+    taxed = {**parse_scenario(taxed_payload), **parse_tax(taxed_payload)}
+    untaxed = parse_scenario(SCENARIO)
+
+    untaxed_result, taxed_result, other_taxed_result = _batched([untaxed, taxed, dict(taxed, home_price=600000)])
+
+    expected = run_comparison(**taxed)
+    assert expected["capital_gains_tax"] > 0
+    assert taxed_result["net_buying_cost"] == pytest.approx(expected["net_buying_cost"])
+    assert taxed_result["capital_gains_tax"] == pytest.approx(expected["capital_gains_tax"])
+    assert other_taxed_result["capital_gains_tax"] > 0
+    assert untaxed_result["net_buying_cost"] == pytest.approx(run_comparison(**untaxed)["net_buying_cost"])
+    assert untaxed_result["capital_gains_tax"] == 0
+
+def test_batcher_stops_hbp_repayments_at_each_scenarios_own_term():
+    payloads = [dict(SCENARIO, loan_term_years=term, tax_province="ON", hbp_amount=30000, hbp_repaid=False)
+                for term in (10, 30)]
+    scenarios = [{**parse_scenario(payload), **parse_tax(payload)} for payload in payloads]
+
+    for scenario, result in zip(scenarios, _batched(scenarios)):
+        expected = run_comparison(**scenario)
+        assert result["buying_tax"] == pytest.approx(expected["buying_tax"])
+        assert result["net_buying_cost"] == pytest.approx(expected["net_buying_cost"])
+
+def test_solve_runs_on_the_executor():
+    payload = {
+        "target": "max_interest_rate", "home_price": 750000, "down_payment_percent": 20,
+        "loan_term_years": 25, "monthly_rent": 2800,
+    }
+    with ThreadPoolExecutor(1, thread_name_prefix="solver") as executor:
+        threads = []
+        def solve_on_thread(*args, **kwargs):
+            threads.append(threading.current_thread().name)
+            return solve(*args, **kwargs)
+        with patch("utils.server.solve", solve_on_thread):
+            status, body = asyncio.run(handle_request("POST", "/solve", json.dumps(payload).encode(), executor, None))
+
+    assert status == HTTPStatus.OK
+    assert threads[0].startswith("solver")
+    assert json.loads(body)["value"] == pytest.approx(solve(**{**payload, **SCENARIO_DEFAULTS}))
+
+@pytest.mark.parametrize("field, value", [("bedrooms", "x"), ("bedrooms", True), ("city", 5)])
+def test_compare_rejects_invalid_rent_area_fields(field, value):
+    body = json.dumps(dict(SCENARIO, **{field: value})).encode()
+    with pytest.raises(RequestError) as error:
+        asyncio.run(handle_request("POST", "/compare", body, None, ComparisonBatcher()))
+    assert error.value.status == HTTPStatus.BAD_REQUEST
+
+def _request(method, path, payload=None, executor=None):
+    body = b"" if payload is None else json.dumps(payload).encode()
+    return asyncio.run(handle_request(method, path, body, executor, ComparisonBatcher()))
+
+def test_batcher_compares_one_flush_in_one_call():
+    calls = []
+    def counted(**scenario):
+        calls.append(scenario)
+        return run_comparison(**scenario)
+
+    with patch("utils.server.run_comparison", counted):
+        _batched([parse_scenario(dict(SCENARIO, home_price=price)) for price in range(400000, 900000, 100000)])
+    assert len(calls) == 1
+
+def test_compare_looks_up_the_city_rent(monkeypatch):
+    monkeypatch.delenv("HOMEDECIDE_RESULT_STORE", raising=False)
+    get_comparison_cache().clear()
+    payload = {name: value for name, value in SCENARIO.items() if name != "monthly_rent"}
+    status, body = _request("POST", "/compare", dict(payload, city="Toronto", bedrooms=2))
+
+    expected = run_comparison(**parse_scenario(dict(SCENARIO, monthly_rent=get_average_rent("Toronto", 2))))
+    assert status == HTTPStatus.OK
+    assert json.loads(body)["net_buying_cost"] == pytest.approx(expected["net_buying_cost"])
+
+@pytest.mark.parametrize("method, path, payload, status", [
+    ("GET", "/nowhere", None, HTTPStatus.NOT_FOUND),
+    ("GET", "/compare", None, HTTPStatus.METHOD_NOT_ALLOWED),
+    ("POST", "/compare", {"home_price": 750000}, HTTPStatus.BAD_REQUEST),
+    ("POST", "/compare", dict(SCENARIO, interest_rate="high"), HTTPStatus.BAD_REQUEST),
+    ("POST", "/compare/bulk", {"scenarios": "all"}, HTTPStatus.BAD_REQUEST),
+])
+def test_invalid_requests_are_rejected(method, path, payload, status):
+    with pytest.raises(RequestError) as error:
+        _request(method, path, payload)
+    assert error.value.status == status
+
+def test_bulk_matches_the_batch_evaluation():
+    scenarios = [dict(SCENARIO, home_price=price) for price in (500000, 750000)]
+    with ThreadPoolExecutor(1) as executor:
+        status, body = _request("POST", "/compare/bulk", {"scenarios": scenarios}, executor)
+
+    expected = evaluate_scenarios(pd.DataFrame(scenarios))
+    assert status == HTTPStatus.OK
+    results = json.loads(body)["results"]
+    assert [result["net_buying_cost"] for result in results] == pytest.approx(list(expected["net_buying_cost"]))
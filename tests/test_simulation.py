@@ -0,0 +1,50 @@
+import pytest
+
+from utils.comparison import tax_profile
+from utils.projection import APPRECIATION_CAP, build_projection
+from utils.simulation import STOCHASTIC_RATES, simulate
+
+INPUTS = dict(
+    home_price=750000, down_payment=150000, interest_rate=5.5, loan_term_years=25, property_tax_rate=0.7,
+    maintenance_cost=5000, appreciation_rate=3.0, monthly_rent=1860, rent_increase_rate=3.0,
+    investment_return_rate=5.0, selling_cost_percent=5.0,
+)
+
+# Nearly deterministic draws
+SMALL_VOLATILITY = {name: {"kind": "normal", "std": 0.05} for name in STOCHASTIC_RATES}
+
+@pytest.mark.parametrize("appreciation_rate", [3.0, APPRECIATION_CAP, 6.0])
+def test_median_stays_close_to_deterministic_result_with_small_volatility(appreciation_rate):
+    inputs = dict(INPUTS, appreciation_rate=appreciation_rate)
+    deterministic = build_projection(**inputs)
+    result = simulate(**inputs, paths=2000, seed=1, workers=1, distributions=SMALL_VOLATILITY)
+
+    median = result["percentiles"].index(50)
+    assert result["net_buying_cost"][median] == pytest.approx(float(deterministic.net_buying_cost), rel=0.005)
+    assert result["adjusted_renting_cost"][median] == pytest.approx(
+        float(deterministic.adjusted_renting_cost), rel=0.005
+    )
+
+def test_taxed_median_stays_close_to_the_taxed_deterministic_result():
+    profile = tax_profile(9000, "ON", hbp_amount=35000, hbp_repaid=False)
+    deterministic = build_projection(**INPUTS, tax_profile=profile)
+    assert deterministic.capital_gains_tax > 0
+
+    result = simulate(**INPUTS, paths=2000, seed=1, workers=1, distributions=SMALL_VOLATILITY, tax_profile=profile)
+    median = result["percentiles"].index(50)
+    assert result["net_buying_cost"][median] == pytest.approx(float(deterministic.net_buying_cost), rel=0.005)
+    assert result["adjusted_renting_cost"][median] == pytest.approx(
+        float(deterministic.adjusted_renting_cost), rel=0.005
+    )
+
+def test_volatility_does_not_reverse_a_clear_deterministic_result():
+    deterministic = build_projection(**INPUTS)
+    assert deterministic.net_buying_cost < deterministic.adjusted_renting_cost
+
+    result = simulate(**INPUTS, paths=5000, seed=1, workers=1)
+    assert result["buying_cheaper_probability"] > 0.7
+
+def test_results_depend_only_on_the_seed():
+    first = simulate(**INPUTS, paths=500, seed=7, workers=1, chunk_size=200)
+    second = simulate(**INPUTS, paths=500, seed=7, workers=1, chunk_size=200)
+    assert list(first["net_buying_cost"]) == list(second["net_buying_cost"])
@@ -0,0 +1,70 @@
+import pytest
+
+from utils.comparison import run_comparison, tax_profile
+from utils.sensitivity import build_sensitivity_grid
+from utils.solver import solve, solve_by_city
+
+SCENARIO = dict(
+    home_price=750000, loan_term_years=25, property_tax_rate=0.7, maintenance_cost=5000.0,
+    appreciation_rate=5.0, selling_cost_percent=5.0, monthly_rent=2000, rent_increase_rate=3.0,
+    investment_return_rate=5.0,
+)
+
+@pytest.mark.parametrize("options", [
+    {},
+    {"appreciation_cap": None},
+    {"appreciation_cap": None, "maintenance_inflation_rate": 4.0},
+])
+def test_max_interest_rate_is_where_buying_stops_winning(options):
+    rate = solve("max_interest_rate", down_payment_percent=20, **SCENARIO, **options)
+    comparison = run_comparison(9000, interest_rate=rate, down_payment_percent=20, **SCENARIO, **options)
+    assert comparison["net_buying_cost"] == pytest.approx(comparison["adjusted_renting_cost"], rel=1e-4)
+
+def test_uncapped_appreciation_breaks_even_sooner():
+    inputs = dict(SCENARIO, target_year=5, interest_rate=7.0)
+    assert solve("min_down_payment", **inputs) is None
+
+    down_payment = solve("min_down_payment", **inputs, appreciation_cap=None)
+    comparison = run_comparison(
+        9000, down_payment_percent=down_payment + 0.01, appreciation_cap=None,
+        **{name: value for name, value in inputs.items() if name != "target_year"}
+    )
+    assert 0 < comparison["break_even_year"] <= 5
+
+def test_by_city_passes_the_options_on():
+    inputs = {name: value for name, value in SCENARIO.items() if name != "monthly_rent"}
+    capped = solve_by_city("max_interest_rate", 2, ["Toronto"], down_payment_percent=20, **inputs)
+    uncapped = solve_by_city(
+        "max_interest_rate", 2, ["Toronto"], down_payment_percent=20, appreciation_cap=None, **inputs
+    )
+    assert uncapped.loc["Toronto", "max_interest_rate"] > capped.loc["Toronto", "max_interest_rate"]
+
+@pytest.mark.parametrize("options", [{}, {"appreciation_cap": None, "maintenance_inflation_rate": 4.0}])
+def test_sensitivity_grid_matches_the_comparison_at_the_current_inputs(options):
+    inputs = dict(SCENARIO, down_payment_percent=20, interest_rate=5.5, **options)
+    grid = build_sensitivity_grid(inputs, "interest_rate", "monthly_rent", size=3)
+
+    comparison = run_comparison(9000, **inputs)
+    assert grid["buying_advantage"][1, 1] == pytest.approx(
+        comparison["adjusted_renting_cost"] - comparison["net_buying_cost"]
+    )
+
+def test_taxed_max_interest_rate_is_where_taxed_buying_stops_winning():
+    profile = tax_profile(9000, "ON", fhsa_amount=20000)
+    taxed = solve("max_interest_rate", down_payment_percent=20, tax_profile=profile, **SCENARIO)
+    assert taxed != pytest.approx(solve("max_interest_rate", down_payment_percent=20, **SCENARIO))
+
+    comparison = run_comparison(
+        9000, interest_rate=taxed, down_payment_percent=20, province="ON", fhsa_amount=20000, **SCENARIO
+    )
+    assert comparison["net_buying_cost"] == pytest.approx(comparison["adjusted_renting_cost"], rel=1e-4)
+
+def test_taxed_sensitivity_grid_matches_the_taxed_comparison():
+    inputs = dict(SCENARIO, down_payment_percent=20, interest_rate=5.5)
+    grid = build_sensitivity_grid(inputs, "interest_rate", "monthly_rent", size=3, tax_profile=tax_profile(9000, "ON"))
+
+    comparison = run_comparison(9000, province="ON", **inputs)
+    assert comparison["capital_gains_tax"] > 0
+    assert grid["buying_advantage"][1, 1] == pytest.approx(
+        comparison["adjusted_renting_cost"] - comparison["net_buying_cost"]
+    )
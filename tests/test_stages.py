@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from utils.calculations import RatePath
+from utils.comparison import tax_profile
+from utils.projection import build_projection
+from utils.stages import stage_cache_info, staged_projection
+
+SCENARIO = dict(
+    home_price=750000, down_payment_percent=20, interest_rate=5.5, loan_term_years=25, property_tax_rate=0.7,
+    maintenance_cost=5000.0, appreciation_rate=3.0, monthly_rent=2800, rent_increase_rate=3.0,
+    investment_return_rate=5.0, selling_cost_percent=5.0,
+)
+
+def _unstaged(scenario, **options):
+    inputs = dict(scenario, **options)
+    inputs["down_payment"] = inputs["home_price"] * inputs.pop("down_payment_percent") / 100
+    return build_projection(**inputs)
+
+def _assert_same_projection(staged, unstaged):
+    assert staged.__dict__.keys() == unstaged.__dict__.keys()
+    for name, expected in unstaged.__dict__.items():
+        if expected is None:
+            assert staged.__dict__[name] is None, name
+        else:
+            np.testing.assert_allclose(staged.__dict__[name], expected, err_msg=name)
+    np.testing.assert_allclose(staged.balance, unstaged.balance)
+
+@pytest.mark.parametrize("changes", [
+    {},
+    {"interest_rate": 0.0},
+    {"loan_term_years": 10, "home_price": 400000},
+    {"appreciation_rate": 8.0, "monthly_rent": 1500},
+])
+def test_staged_matches_unstaged_projection(changes):
+    scenario = dict(SCENARIO, **changes)
+    _assert_same_projection(staged_projection(**scenario), _unstaged(scenario))
+
+def test_changing_one_input_reruns_only_its_stages():
+    staged_projection(**SCENARIO)
+    before = stage_cache_info()
+    staged_projection(**dict(SCENARIO, monthly_rent=3100, selling_cost_percent=4.0))
+    after = stage_cache_info()
+
+    for name in before:
+        expected_misses = 1 if name == "rent" else 0
+        assert after[name]["misses"] - before[name]["misses"] == expected_misses, name
+
+def test_staged_matches_unstaged_projection_with_rate_paths():
+    rates = dict(interest_rate=tuple(np.linspace(4.0, 7.0, 25)), rent_increase_rate=tuple(np.linspace(2.0, 5.0, 25)))
+    unstaged = _unstaged(SCENARIO, **{name: RatePath(path) for name, path in rates.items()})
+    _assert_same_projection(staged_projection(**dict(SCENARIO, **rates)), unstaged)
+
+def test_staged_rate_paths_must_cover_the_term():
+    with pytest.raises(ValueError):
+        staged_projection(**dict(SCENARIO, interest_rate=(5.0,) * 10))
+
+def test_staged_matches_unstaged_projection_with_tax():
+    profile = tax_profile(9000, "ON", fhsa_amount=20000, hbp_amount=30000, hbp_repaid=False)
+    _assert_same_projection(staged_projection(**SCENARIO, tax_profile=profile), _unstaged(SCENARIO, tax_profile=profile))
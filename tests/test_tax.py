@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from utils.tax import (
+    FEDERAL_ABATEMENT,
+    FEDERAL_BRACKETS,
+    PROVINCES,
+    PROVINCIAL_BRACKETS,
+    TaxProfile,
+    capital_gains_tax,
+    income_tax,
+    marginal_tax_rate
+)
+
+INCOMES = [0, 10000, 40000, 80000, 120000, 200000, 400000]
+
+def _bracket_tax(income, brackets):
+    """Tax summed bracket by bracket"""
+    bounds = [lower for lower, _ in brackets[1:]] + [np.inf]
+    return sum(max(min(income, upper) - lower, 0) * rate / 100 for (lower, rate), upper in zip(brackets, bounds))
+
+@pytest.mark.parametrize("province", PROVINCES)
+def test_tax_is_federal_plus_provincial_brackets(province):
+    federal_share = 1 - FEDERAL_ABATEMENT.get(province, 0.0) / 100
+    expected = [
+        _bracket_tax(income, FEDERAL_BRACKETS) * federal_share + _bracket_tax(income, PROVINCIAL_BRACKETS[province])
+        for income in INCOMES
+    ]
+    np.testing.assert_allclose(income_tax(np.array(INCOMES, dtype=float), province), expected, atol=1e-6)
+
+def test_known_ontario_tax():
+    # Federal 6,024.30 + 4,947.27, Ontario 1,971.87 + 2,612.69
+    assert income_tax(80000, "ON") == pytest.approx(15556.13, abs=0.01)
+    assert marginal_tax_rate(80000, "ON") == pytest.approx(0.205 + 0.0915)
+    assert income_tax(-5000, "ON") == 0
+
+def test_mixed_provinces_and_cities_in_one_call():
+    incomes = np.array([50000.0, 90000.0, 150000.0])
+    taxes = income_tax(incomes, ["ON", "Montreal", "Vancouver"])
+    assert list(taxes) == [income_tax(50000.0, "ON"), income_tax(90000.0, "QC"), income_tax(150000.0, "BC")]
+
+def test_unknown_province_is_rejected():
+    with pytest.raises(ValueError, match="Unknown province: Atlantis"):
+        income_tax(50000, "Atlantis")
+
+def test_half_of_a_capital_gain_is_taxed():
+    assert capital_gains_tax(40000, 80000, "ON") == pytest.approx(income_tax(100000, "ON") - income_tax(80000, "ON"))
+    assert capital_gains_tax(-40000, 80000, "ON") == 0
+
+def test_fhsa_refund_and_missed_hbp_repayments():
+    profile = TaxProfile(80000, "ON", hbp_repaid=False)
+    rate = marginal_tax_rate(80000, "ON")
+
+    # Two years of 8,000 contributions, each deducted at the marginal rate
+    assert profile.fhsa_refund(np.array(16000.0)) == pytest.approx(16000 * rate)
+    assert profile.hbp_yearly_tax(np.array(15000.0)) == pytest.approx(1000 * rate)
+    assert TaxProfile(80000, "ON").hbp_yearly_tax(np.array(15000.0)) == 0
@@ -0,0 +1,188 @@
+"""
+Headless batch runner: score scenario files without the Streamlit UI
+
+Usage:
+    python -m utils.batch leads.csv [more.parquet ...] -o scores.csv --workers 4
+
+Input files are CSV or Parquet with the columns described in
+utils.scenarios. Rows with a blank monthly_rent get the average rent for
+their city and bedrooms. Files are read and scored chunk by chunk, and
+results are appended to the output as each chunk completes, so memory use
+does not grow with the size of the input.
+"""
+import argparse
+import os
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from utils.data_handler import get_average_rents
+from utils.scenarios import evaluate_scenarios
+
+DEFAULT_CHUNK_SIZE = 100000
+
+def _is_parquet(path):
+    return os.path.splitext(path)[1].lower() in (".parquet", ".pq")
+
+def read_chunks(path, chunk_size):
+    """
+    Read a scenario file in chunks
+
+    Parameters:
+    path (str): CSV or Parquet file
+    chunk_size (int): Rows per chunk
+
+    Returns:
+    iterator: pandas.DataFrame chunks
+    """
+    if _is_parquet(path):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_size)
+
+def fill_missing_rents(scenarios):
+    """
+    Fill blank monthly rents from the rent data by area and bedrooms
+
+    The area is the city, optionally narrowed down by neighbourhood and
+    postal_code columns; the most specific rent available is used.
+
+    Parameters:
+    scenarios (pandas.DataFrame): Scenarios, optionally with monthly_rent
+
+    Returns:
+    pandas.DataFrame: The scenarios with monthly_rent filled where possible
+    """
+    if "monthly_rent" not in scenarios:
+        scenarios = scenarios.assign(monthly_rent=np.nan)
+
+    missing = scenarios["monthly_rent"].isna().to_numpy()
+    areas = [name for name in ("city", "neighbourhood", "postal_code") if name in scenarios.columns]
+    if missing.any() and areas and "bedrooms" in scenarios.columns:
+        def column(name):
+            return scenarios.loc[missing, name].to_numpy() if name in scenarios.columns else None
+
+        scenarios = scenarios.copy()
+        scenarios.loc[missing, "monthly_rent"] = get_average_rents(
+            column("city"), column("bedrooms"), column("neighbourhood"), column("postal_code")
+        )
+
+    return scenarios
+
+def score_chunk(scenarios):
+    """Fill rents and evaluate one chunk, returning inputs and results side by side"""
+    scenarios = fill_missing_rents(scenarios)
+    results = evaluate_scenarios(scenarios)
+    return pd.concat([scenarios, results], axis=1)
+
+class _Writer:
+    """
+    Append scored chunks to a CSV or Parquet file
+
+    The first chunk fixes the output columns. Later chunks, possibly from
+    files with other optional columns, are aligned to them, with blanks for
+    the columns they lack; a chunk with columns the output does not have is
+    an error, since the header is already written.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = _is_parquet(path)
+        self._parquet_writer = None
+        self._started = False
+        self._columns = None
+
+    def write(self, chunk):
+        if self._columns is None:
+            self._columns = list(chunk.columns)
+        else:
+            extra = [name for name in chunk.columns if name not in self._columns]
+            if extra:
+                raise ValueError(f"Columns {extra} are not in the output written so far: {self._columns}")
+            chunk = chunk.reindex(columns=self._columns)
+
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet_writer is None:
+                self._parquet_writer = pq.ParquetWriter(self.path, table.schema)
+            self._parquet_writer.write_table(table.cast(self._parquet_writer.schema))
+        else:
+            chunk.to_csv(self.path, mode="a" if self._started else "w", header=not self._started, index=False)
+        self._started = True
+
+    def close(self):
+        if self._parquet_writer is not None:
+            self._parquet_writer.close()
+
+def run_batch(input_paths, output_path, chunk_size=DEFAULT_CHUNK_SIZE, workers=1, progress=None):
+    """
+    Score scenario files chunk by chunk into one output file
+
+    With several workers, chunks are scored in a process pool. At most two
+    chunks per worker are in flight, and results are written in input order.
+
+    Parameters:
+    input_paths (list): CSV or Parquet scenario files
+    output_path (str): CSV or Parquet output file
+    chunk_size (int): Rows per chunk
+    workers (int): Worker processes, 1 scores in this process
+    progress (callable): Called with the number of rows written so far
+
+    Returns:
+    int: Number of rows scored
+    """
+    chunks = (chunk for path in input_paths for chunk in read_chunks(path, chunk_size))
+    writer = _Writer(output_path)
+    rows = 0
+
+    def written(scored):
+        nonlocal rows
+        writer.write(scored)
+        rows += len(scored)
+        if progress:
+            progress(rows)
+
+    try:
+        if workers <= 1:
+            for chunk in chunks:
+                written(score_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                pending = deque()
+                for chunk in chunks:
+                    pending.append(executor.submit(score_chunk, chunk))
+                    if len(pending) >= 2 * workers:
+                        written(pending.popleft().result())
+                while pending:
+                    written(pending.popleft().result())
+    finally:
+        writer.close()
+
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score rent-vs-buy scenario files in batch")
+    parser.add_argument("inputs", nargs="+", help="Scenario files (.csv or .parquet)")
+    parser.add_argument("-o", "--output", required=True, help="Output file (.csv or .parquet)")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=1, help="Worker processes")
+    args = parser.parse_args(argv)
+
+    def progress(rows):
+        print(f"\rScored {rows:,} rows", end="", file=sys.stderr, flush=True)
+
+    rows = run_batch(args.inputs, args.output, args.chunk_size, args.workers, progress)
+    print(f"\rScored {rows:,} rows into {args.output}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
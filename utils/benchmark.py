@@ -0,0 +1,452 @@
+"""
+Benchmarks for the calculation kernels, rent lookups and full comparisons
+
+Usage:
+    python -m utils.benchmark -o benchmark.json
+    python -m utils.benchmark --sizes 1 1000 --baseline benchmark.json --threshold 0.25
+    python -m utils.benchmark --startup -o startup.json
+
+Each benchmark is timed for every batch size: 1 is a single scalar scenario,
+larger sizes are arrays of random scenarios priced in one call. Every size
+is run in enough loops to take about MIN_SAMPLE_SECONDS, several times over,
+and the best time per call is kept, as timeit does, since slower samples
+only measure interference from the rest of the machine.
+
+--startup instead starts the Streamlit server several times, plainly and
+through utils.warmup, and times how long each takes to answer and how long
+its first session takes to show its first element and to finish its run.
+
+Results are written as JSON. Given a baseline written the same way, the run
+fails (exit status 1) when any benchmark is slower than its baseline by more
+than the threshold. Baselines are only comparable on the same machine.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from utils.calculations import (
+    calculate_mortgage_payment,
+    calculate_total_buying_cost,
+    calculate_total_renting_cost
+)
+from utils.comparison import run_comparison
+from utils.data_handler import get_available_cities, get_average_rent, get_average_rents
+from utils.projection import RatePath
+from utils.properties import MAX_PROPERTIES, compare_properties
+from utils.scenarios import CHUNK_SIZE, SCENARIO_DEFAULTS
+
+DEFAULT_SIZES = [1, 100, 10000, 1000000]
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.25
+
+# Loops of a benchmark are added until one sample takes at least this long
+MIN_SAMPLE_SECONDS = 0.2
+
+APP_PATH = "app.py"
+
+def sample_scenarios(size, seed=0):
+    """
+    Random scenarios around the Streamlit defaults
+
+    Parameters:
+    size (int): Number of scenarios; 1 gives plain Python numbers
+    seed (int): Random seed
+
+    Returns:
+    dict: Keyword arguments for run_comparison, one value or array per input
+    """
+    rng = np.random.default_rng(seed)
+    scenarios = {
+        "monthly_income": rng.uniform(3000, 15000, size),
+        "home_price": rng.uniform(300000, 1500000, size),
+        "down_payment_percent": rng.uniform(5, 35, size),
+        "interest_rate": rng.uniform(2, 8, size),
+        "loan_term_years": rng.choice([15, 20, 25, 30], size),
+        "monthly_rent": rng.uniform(1200, 4500, size),
+        **{name: np.full(size, value) for name, value in SCENARIO_DEFAULTS.items()},
+    }
+    if size == 1:
+        return {name: values[0].item() for name, values in scenarios.items()}
+    return scenarios
+
+def _mortgage_payment(size):
+    scenarios = sample_scenarios(size)
+    loan_amount = np.asarray(scenarios["home_price"]) * (1 - np.asarray(scenarios["down_payment_percent"]) / 100)
+    return lambda: calculate_mortgage_payment(loan_amount, scenarios["interest_rate"], scenarios["loan_term_years"])
+
+def _total_buying_cost(size):
+    scenarios = sample_scenarios(size)
+    home_price = np.asarray(scenarios["home_price"])
+    down_payment = home_price * np.asarray(scenarios["down_payment_percent"]) / 100
+    monthly_mortgage = calculate_mortgage_payment(
+        home_price - down_payment, scenarios["interest_rate"], scenarios["loan_term_years"]
+    )
+    return lambda: calculate_total_buying_cost(
+        home_price, down_payment, monthly_mortgage, scenarios["property_tax_rate"],
+        scenarios["maintenance_cost"], scenarios["loan_term_years"], scenarios["appreciation_rate"]
+    )
+
+def _total_renting_cost(size):
+    scenarios = sample_scenarios(size)
+    return lambda: calculate_total_renting_cost(
+        scenarios["monthly_rent"], scenarios["loan_term_years"], scenarios["rent_increase_rate"]
+    )
+
+def _rent_lookup(size):
+    rng = np.random.default_rng(0)
+    cities = np.array(get_available_cities())
+    if size == 1:
+        city = str(cities[0])
+        return lambda: get_average_rent(city, 2)
+    city_array = cities[rng.integers(0, len(cities), size)]
+    bedrooms = rng.integers(1, 5, size)
+    return lambda: get_average_rents(city_array, bedrooms)
+
+def _comparison(size):
+    scenarios = sample_scenarios(size)
+    if size == 1:
+        return lambda: run_comparison(**scenarios)
+
+    # Large batches are compared in chunks, as utils.scenarios does, to bound memory
+    chunks = [
+        {name: values[start:start + CHUNK_SIZE] for name, values in scenarios.items()}
+        for start in range(0, size, CHUNK_SIZE)
+    ]
+    return lambda: [run_comparison(**chunk) for chunk in chunks]
+
+def _comparison_paths(size):
+    # The comparison with every rate given per year, for custom inflation scenarios
+    scenarios = sample_scenarios(size)
+    rng = np.random.default_rng(1)
+    path_shape = np.shape(scenarios["home_price"]) + (30,)
+    paths = {
+        name: rng.normal(np.asarray(scenarios[name])[..., None], 1.0, path_shape)
+        for name in ("interest_rate", "property_tax_rate", "appreciation_rate",
+                     "rent_increase_rate", "investment_return_rate")
+    }
+    if size == 1:
+        return lambda: run_comparison(**{**scenarios, **{name: RatePath(rates) for name, rates in paths.items()}})
+
+    chunks = [
+        {
+            **{name: values[start:start + CHUNK_SIZE] for name, values in scenarios.items()},
+            **{name: RatePath(rates[start:start + CHUNK_SIZE]) for name, rates in paths.items()},
+        }
+        for start in range(0, size, CHUNK_SIZE)
+    ]
+    return lambda: [run_comparison(**chunk) for chunk in chunks]
+
+def _properties(size):
+    # Candidate properties ranked for one buyer, rents looked up by city and bedrooms;
+    # sizes above MAX_PROPERTIES are ranked as several comparisons of that many
+    rng = np.random.default_rng(0)
+    cities = np.array(get_available_cities())
+    shared = {name: value for name, value in sample_scenarios(1).items() if name not in ("home_price", "monthly_rent")}
+    chunks = [
+        pd.DataFrame({
+            "city": cities[rng.integers(0, len(cities), count)],
+            "bedrooms": rng.integers(1, 5, count),
+            "home_price": rng.uniform(300000, 1500000, count),
+            "property_tax_rate": rng.uniform(0.4, 1.2, count),
+        })
+        for count in [MAX_PROPERTIES] * (size // MAX_PROPERTIES) + [size % MAX_PROPERTIES] if count
+    ]
+    return lambda: [compare_properties(chunk, **shared) for chunk in chunks]
+
+# Benchmarks by name; each builds its inputs for a batch size and returns the call to time
+BENCHMARKS = {
+    "mortgage_payment": _mortgage_payment,
+    "total_buying_cost": _total_buying_cost,
+    "total_renting_cost": _total_renting_cost,
+    "rent_lookup": _rent_lookup,
+    "comparison": _comparison,
+    "comparison_paths": _comparison_paths,
+    "properties": _properties,
+}
+
+def _environment():
+    return {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+def time_call(call, repeat=DEFAULT_REPEAT, min_sample_seconds=MIN_SAMPLE_SECONDS):
+    """
+    Time a call the way timeit does
+
+    Parameters:
+    call (callable): Call to time, without arguments
+    repeat (int): Number of samples
+    min_sample_seconds (float): Loops per sample are doubled until one sample takes this long
+
+    Returns:
+    dict: loops per sample, and best_seconds and median_seconds per call
+    """
+    loops = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(loops):
+            call()
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_sample_seconds:
+            break
+        loops *= 2
+
+    samples = [elapsed / loops]
+    for _ in range(repeat - 1):
+        start = time.perf_counter()
+        for _ in range(loops):
+            call()
+        samples.append((time.perf_counter() - start) / loops)
+    return {"loops": loops, "best_seconds": min(samples), "median_seconds": float(np.median(samples))}
+
+def run_benchmarks(names=None, sizes=DEFAULT_SIZES, repeat=DEFAULT_REPEAT, progress=None):
+    """
+    Run benchmarks at several batch sizes
+
+    Parameters:
+    names (list): Benchmarks to run, by default all of BENCHMARKS
+    sizes (list): Batch sizes
+    repeat (int): Samples per benchmark and size
+    progress (callable): Called with each result as it is measured
+
+    Returns:
+    dict: Environment details and the list of results, one per benchmark
+        and size with loops, best_seconds, median_seconds and ns_per_scenario
+    """
+    results = []
+    for name in names or list(BENCHMARKS):
+        for size in sizes:
+            timing = time_call(BENCHMARKS[name](size), repeat)
+            result = {
+                "name": name,
+                "size": size,
+                **timing,
+                "ns_per_scenario": timing["best_seconds"] / size * 1e9,
+            }
+            results.append(result)
+            if progress:
+                progress(result)
+
+    return {**_environment(), "results": results}
+
+def compare_results(report, baseline, threshold=DEFAULT_THRESHOLD):
+    """
+    Compare benchmark results with a baseline
+
+    Parameters:
+    report (dict): Results from run_benchmarks
+    baseline (dict): Earlier results from run_benchmarks
+    threshold (float): Allowed slowdown, e.g. 0.25 for 25% slower
+
+    Returns:
+    list: One dict per benchmark and size found in both, with name, size,
+        baseline_seconds, seconds, ratio (current / baseline) and regressed
+    """
+    previous = {(result["name"], result["size"]): result for result in baseline["results"]}
+    comparisons = []
+    for result in report["results"]:
+        before = previous.get((result["name"], result["size"]))
+        if before is None:
+            continue
+        ratio = result["best_seconds"] / before["best_seconds"]
+        comparisons.append({
+            "name": result["name"],
+            "size": result["size"],
+            "baseline_seconds": before["best_seconds"],
+            "seconds": result["best_seconds"],
+            "ratio": ratio,
+            "regressed": ratio > 1 + threshold,
+        })
+    return comparisons
+
+# Ways of starting the Streamlit server compared by the startup benchmark
+STARTUP_COMMANDS = {
+    "cold": [sys.executable, "-m", "streamlit", "run"],
+    "warm": [sys.executable, "-m", "utils.warmup", "--run"],
+}
+
+# Seconds to wait for the server or the first session before giving up
+STARTUP_TIMEOUT = 300.0
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+def _wait_until_ready(port, server, deadline):
+    while time.perf_counter() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"Streamlit server exited with status {server.returncode}")
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/_stcore/health", timeout=1) as response:
+                if response.status == 200:
+                    return
+        except OSError:
+            time.sleep(0.02)
+    raise TimeoutError("Streamlit server did not become ready")
+
+async def _first_session(port):
+    """Open a session like a browser does; returns seconds to its first element and to the end of the run"""
+    from streamlit.proto.BackMsg_pb2 import BackMsg
+    from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+    from tornado.websocket import websocket_connect
+
+    start = time.perf_counter()
+    connection = await websocket_connect(f"ws://127.0.0.1:{port}/_stcore/stream")
+    try:
+        request = BackMsg()
+        request.rerun_script.query_string = ""
+        await connection.write_message(request.SerializeToString(), binary=True)
+
+        first_paint = None
+        while True:
+            data = await connection.read_message()
+            if data is None:
+                raise RuntimeError("Streamlit closed the session before the script finished")
+            message = ForwardMsg()
+            message.ParseFromString(data)
+            kind = message.WhichOneof("type")
+            if kind == "delta" and first_paint is None:
+                first_paint = time.perf_counter() - start
+            elif kind == "script_finished":
+                return first_paint, time.perf_counter() - start
+    finally:
+        connection.close()
+
+def time_startup(command, app_path=APP_PATH):
+    """
+    Start a Streamlit server and time it until its first session has run
+
+    Parameters:
+    command (list): Command starting the server, completed with the script and options
+    app_path (str): Streamlit script
+
+    Returns:
+    dict: Seconds from launch until the server answers (ready), and from
+        opening the first session to its first element (first_paint) and to
+        the end of its run (first_run)
+    """
+    port = _free_port()
+    options = [f"--server.port={port}", "--server.address=127.0.0.1", "--server.headless=true",
+               "--browser.gatherUsageStats=false"]
+    directory = os.path.dirname(os.path.abspath(app_path))
+    start = time.perf_counter()
+    server = subprocess.Popen(command + [os.path.basename(app_path)] + options, cwd=directory,
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        _wait_until_ready(port, server, start + STARTUP_TIMEOUT)
+        ready = time.perf_counter() - start
+        first_paint, first_run = asyncio.run(asyncio.wait_for(_first_session(port), STARTUP_TIMEOUT))
+    finally:
+        server.terminate()
+        server.wait()
+    return {"ready": ready, "first_paint": first_paint, "first_run": first_run}
+
+def run_startup_benchmarks(repeat=DEFAULT_REPEAT, app_path=APP_PATH, progress=None):
+    """
+    Time cold starts of the app, with and without utils.warmup
+
+    Each sample starts a new server and opens one session, so every session
+    is the first one of its process.
+
+    Parameters:
+    repeat (int): Servers started per way of starting
+    app_path (str): Streamlit script
+    progress (callable): Called with each result as it is measured
+
+    Returns:
+    dict: As from run_benchmarks, with results named
+        startup.<cold or warm>.<ready, first_paint or first_run>, of size 1
+    """
+    results = []
+    for mode, command in STARTUP_COMMANDS.items():
+        samples = [time_startup(command, app_path) for _ in range(repeat)]
+        for measure in samples[0]:
+            seconds = [sample[measure] for sample in samples]
+            result = {
+                "name": f"startup.{mode}.{measure}",
+                "size": 1,
+                "loops": 1,
+                "best_seconds": min(seconds),
+                "median_seconds": float(np.median(seconds)),
+                "ns_per_scenario": min(seconds) * 1e9,
+            }
+            results.append(result)
+            if progress:
+                progress(result)
+    return {**_environment(), "results": results}
+
+def _format_seconds(seconds):
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f} {unit}"
+    return f"{seconds / 1e-9:.0f} ns"
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the rent-vs-buy calculations")
+    parser.add_argument("-o", "--output", help="Write the results as JSON to this file")
+    parser.add_argument("--benchmarks", nargs="+", choices=list(BENCHMARKS), help="Benchmarks to run (default: all)")
+    parser.add_argument("--sizes", nargs="+", type=int, default=DEFAULT_SIZES, help="Batch sizes")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT, help="Samples per benchmark and size")
+    parser.add_argument("--startup", action="store_true",
+                        help="Time cold starts of the Streamlit app instead, in fresh processes")
+    parser.add_argument("--baseline", help="Earlier JSON results to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown against the baseline (default: 0.25, i.e. 25%%)")
+    args = parser.parse_args(argv)
+    if any(size < 1 for size in args.sizes) or args.repeat < 1:
+        parser.error("sizes and --repeat must be at least 1")
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as baseline_file:
+            baseline = json.load(baseline_file)
+
+    def progress(result):
+        if args.startup:
+            print(f"{result['name']:<28} best {_format_seconds(result['best_seconds']):>10}, "
+                  f"median {_format_seconds(result['median_seconds']):>10}", file=sys.stderr)
+            return
+        print(f"{result['name']:<20} {result['size']:>9,} {_format_seconds(result['best_seconds']):>10}/call "
+              f"{result['ns_per_scenario']:>12,.1f} ns/scenario", file=sys.stderr)
+
+    if args.startup:
+        report = run_startup_benchmarks(args.repeat, progress=progress)
+    else:
+        report = run_benchmarks(args.benchmarks, args.sizes, args.repeat, progress)
+    if args.output:
+        with open(args.output, "w") as output_file:
+            json.dump(report, output_file, indent=2)
+
+    if baseline is None:
+        return 0
+
+    comparisons = compare_results(report, baseline, args.threshold)
+    for comparison in comparisons:
+        flag = "SLOWER" if comparison["regressed"] else ""
+        print(f"{comparison['name']:<20} {comparison['size']:>9,} {_format_seconds(comparison['baseline_seconds']):>10}"
+              f" -> {_format_seconds(comparison['seconds']):>10} ({comparison['ratio']:.2f}x) {flag}")
+    regressions = [comparison for comparison in comparisons if comparison["regressed"]]
+    if regressions:
+        print(f"{len(regressions)} benchmark(s) slower than the baseline by more than {args.threshold:.0%}",
+              file=sys.stderr)
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
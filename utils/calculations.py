@@ -1,56 +1,133 @@
+import numpy as np
+
+from utils.timing import timed
+
+# Upper limits (percentage of income) of the "Affordable" and "Borderline" statuses
+AFFORDABILITY_LIMITS = [25, 35]
+
+class RatePath:
+    """
+    Annual rates that change from year to year
+
+    Wraps an array whose last axis is the year: entry y applies during year
+    y + 1 and there must be at least one entry per year of the horizon. Any
+    leading axes are batch axes and broadcast with the other inputs, so a
+    (paths, years) array describes one scenario per path.
+    """
+
+    def __init__(self, rates):
+        self.rates = np.asarray(rates, dtype=float)
+
+    def years(self, years):
+        """The rates of the first `years` years, checking the path covers them"""
+        if self.rates.shape[-1] < years:
+            raise ValueError(f"Rate path covers {self.rates.shape[-1]} years, {years} are needed")
+        return self.rates[..., :years]
+
+def growth_factors(rate, years):
+    """
+    Calculate compounded growth factors for each year
+    
+    A path of rates is compounded with one cumulative product, so it costs
+    no more than a single rate.
+    
+    Parameters:
+    rate (float, numpy.ndarray or RatePath): Annual growth rate(s) (in percentage)
+    years (int): Number of years
+    
+    Returns:
+    numpy.ndarray: years + 1 factors per rate, entry y is the growth over the first y years
+    """
+    if isinstance(rate, RatePath):
+        yearly_rates = rate.years(years)
+        factors = np.ones(yearly_rates.shape[:-1] + (years + 1,))
+        np.cumprod(1 + yearly_rates / 100, axis=-1, out=factors[..., 1:])
+        return factors
+    return (1 + np.asarray(rate)[..., None] / 100) ** np.arange(years + 1)
+
+def _growth_over(rate, years):
+    """Growth over each scenario's number of years, from a rate or a RatePath"""
+    years = np.asarray(years)
+    if isinstance(rate, RatePath):
+        factors = growth_factors(rate, int(years.max()))
+        shape = np.broadcast_shapes(factors.shape[:-1], years.shape)
+        index = np.broadcast_to(years, shape)[..., None]
+        return np.take_along_axis(np.broadcast_to(factors, shape + factors.shape[-1:]), index, axis=-1)[..., 0]
+    return (1 + np.asarray(rate) / 100) ** years
+
+def _unwrap(result):
+    """Return a NumPy scalar for 0-d results, the array otherwise"""
+    return result[()]
+
 def calculate_mortgage_payment(loan_amount, interest_rate, loan_term_years):
     """
     Calculate monthly mortgage payment using the PMT formula
     
+    All parameters broadcast, so arrays of scenarios are priced in one call.
+    
     Parameters:
-    loan_amount (float): The total loan amount
-    interest_rate (float): Annual interest rate (in percentage)
-    loan_term_years (int): Loan term in years
+    loan_amount (float or numpy.ndarray): The total loan amount
+    interest_rate (float or numpy.ndarray): Annual interest rate (in percentage)
+    loan_term_years (int or numpy.ndarray): Loan term in years
     
     Returns:
-    float: Monthly mortgage payment
+    float or numpy.ndarray: Monthly mortgage payment
     """
-    if interest_rate == 0:
-        return loan_amount / (loan_term_years * 12)
+    monthly_rate = np.asarray(interest_rate) / 100 / 12
+    months = np.asarray(loan_term_years) * 12
     
-    monthly_rate = interest_rate / 100 / 12
-    months = loan_term_years * 12
+    # Interest-free loans are repaid in equal instalments; masking keeps the
+    # PMT formula away from a division by zero for those scenarios
+    interest_free = monthly_rate == 0
+    monthly_rate = np.where(interest_free, 1.0, monthly_rate)
+    compounded = (1 + monthly_rate) ** months
     
-    monthly_payment = loan_amount * (monthly_rate * (1 + monthly_rate)**months) / ((1 + monthly_rate)**months - 1)
-    return monthly_payment
+    monthly_payment = np.where(
+        interest_free,
+        loan_amount / months,
+        loan_amount * (monthly_rate * compounded) / (compounded - 1)
+    )
+    return _unwrap(monthly_payment)
 
 def calculate_affordability(monthly_payment, monthly_income):
     """
     Calculate affordability as percentage of income
     
     Parameters:
-    monthly_payment (float): Monthly payment (rent or mortgage)
-    monthly_income (float): Monthly income
+    monthly_payment (float or numpy.ndarray): Monthly payment (rent or mortgage)
+    monthly_income (float or numpy.ndarray): Monthly income
     
     Returns:
-    float: Affordability percentage
+    float or numpy.ndarray: Affordability percentage, inf where there is no income
     """
-    if monthly_income == 0:
-        return float('inf')
+    monthly_income = np.asarray(monthly_income, dtype=float)
+    no_income = monthly_income == 0
     
-    return (monthly_payment / monthly_income) * 100
+    affordability = np.where(
+        no_income,
+        np.inf,
+        np.asarray(monthly_payment) / np.where(no_income, 1.0, monthly_income) * 100
+    )
+    return _unwrap(affordability)
 
 def get_affordability_status(affordability_percentage):
     """
     Get affordability status based on percentage
     
     Parameters:
-    affordability_percentage (float): Affordability percentage
+    affordability_percentage (float or numpy.ndarray): Affordability percentage
     
     Returns:
-    tuple: (status, color)
+    tuple: (status, color), as arrays of strings for an array of percentages
     """
-    if affordability_percentage <= 25:
-        return "Affordable", "green"
-    elif affordability_percentage <= 35:
-        return "Borderline", "orange"
-    else:
-        return "Unaffordable", "red"
+    # Up to 25% of income is affordable and up to 35% borderline
+    level = np.searchsorted(AFFORDABILITY_LIMITS, affordability_percentage)
+    status = np.array(["Affordable", "Borderline", "Unaffordable"])[level]
+    color = np.array(["green", "orange", "red"])[level]
+    
+    if status.ndim == 0:
+        return str(status), str(color)
+    return status, color
 
 def calculate_total_buying_cost(home_price, down_payment, monthly_mortgage, property_tax_rate, 
                                 maintenance_cost, loan_term_years, appreciation_rate):
@@ -58,20 +135,17 @@ def calculate_total_buying_cost(home_price, down_payment, monthly_mortgage, prop
     Calculate total cost of buying over the loan term
     
     Parameters:
-    home_price (float): Home price
-    down_payment (float): Down payment amount
-    monthly_mortgage (float): Monthly mortgage payment
-    property_tax_rate (float): Annual property tax rate (percentage)
-    maintenance_cost (float): Annual maintenance cost
-    loan_term_years (int): Loan term in years
-    appreciation_rate (float): Annual home appreciation rate (percentage)
+    home_price (float or numpy.ndarray): Home price
+    down_payment (float or numpy.ndarray): Down payment amount
+    monthly_mortgage (float or numpy.ndarray): Monthly mortgage payment
+    property_tax_rate (float or numpy.ndarray): Annual property tax rate (percentage)
+    maintenance_cost (float or numpy.ndarray): Annual maintenance cost
+    loan_term_years (int or numpy.ndarray): Loan term in years
+    appreciation_rate (float, numpy.ndarray or RatePath): Annual home appreciation rate (percentage)
     
     Returns:
     tuple: (total_cost, final_home_value)
     """
-    # Initial costs
-    total_cost = down_payment
-    
     # Monthly costs over loan term
     monthly_property_tax = home_price * property_tax_rate / 100 / 12
     monthly_maintenance = maintenance_cost / 12
@@ -79,11 +153,11 @@ def calculate_total_buying_cost(home_price, down_payment, monthly_mortgage, prop
     # Total monthly payment including property tax and maintenance
     total_monthly_payment = monthly_mortgage + monthly_property_tax + monthly_maintenance
     
-    # Total cost over loan term
-    total_cost += total_monthly_payment * loan_term_years * 12
+    # Initial costs plus the total cost over loan term, without touching the caller's arrays
+    total_cost = down_payment + total_monthly_payment * loan_term_years * 12
     
     # Final home value after appreciation
-    final_home_value = home_price * (1 + appreciation_rate / 100) ** loan_term_years
+    final_home_value = home_price * _growth_over(appreciation_rate, loan_term_years)
     
     return total_cost, final_home_value
 
@@ -92,19 +166,117 @@ def calculate_total_renting_cost(monthly_rent, loan_term_years, rent_increase_ra
     Calculate total cost of renting over the loan term
     
     Parameters:
-    monthly_rent (float): Initial monthly rent
-    loan_term_years (int): Time period in years (same as loan term for comparison)
-    rent_increase_rate (float): Annual rent increase rate (percentage)
+    monthly_rent (float or numpy.ndarray): Initial monthly rent
+    loan_term_years (int or numpy.ndarray): Time period in years (same as loan term for comparison)
+    rent_increase_rate (float, numpy.ndarray or RatePath): Annual rent increase rate (percentage)
     
     Returns:
-    float: Total cost of renting
+    float or numpy.ndarray: Total cost of renting
+    """
+    if isinstance(rent_increase_rate, RatePath):
+        # Sum of the yearly rents, each the first year's times its growth factor
+        loan_term_years = np.asarray(loan_term_years)
+        horizon = int(loan_term_years.max())
+        factors = growth_factors(rent_increase_rate, horizon)[..., :-1]
+        in_term = np.arange(horizon) < loan_term_years[..., None]
+        return _unwrap(np.asarray(monthly_rent) * 12 * (factors * in_term).sum(axis=-1))
+    
+    # Sum of the compounded yearly rents, 12 * rent * ((1 + g)^T - 1) / g
+    growth = np.asarray(rent_increase_rate) / 100
+    no_growth = growth == 0
+    growth = np.where(no_growth, 1.0, growth)
+    years_of_rent = np.where(
+        no_growth,
+        loan_term_years,
+        ((1 + growth) ** loan_term_years - 1) / growth
+    )
+    
+    return _unwrap(np.asarray(monthly_rent) * 12 * years_of_rent)
+
+def _year_start_and_end(values, initial, year_index):
+    """Pick each scenario's values at the start and end of a year along the last axis"""
+    with_initial = np.concatenate((np.broadcast_to(initial, values.shape[:-1])[..., None], values), axis=-1)
+    index = np.broadcast_to(year_index[..., None] + np.arange(2), values.shape[:-1] + (2,))
+    picked = np.take_along_axis(with_initial, index, axis=-1)
+    return picked[..., :1], picked[..., 1:]
+
+@timed
+def find_break_even(home_price, down_payment, interest_rate, loan_term_years,
+                    property_tax_rate, maintenance_cost, appreciation_rate,
+                    monthly_rent, rent_increase_rate, investment_return_rate,
+                    selling_cost_percent=0.0, projection=None):
     """
-    total_cost = 0
-    current_rent = monthly_rent
+    Find the month in which buying first becomes more economical than renting
+    
+    The yearly net positions bracket the crossing: the first year that ends with
+    buying ahead. Within that year payments accrue monthly, the loan follows its
+    amortization, and home and investment values grow geometrically, so the 12
+    candidate months are checked in one vectorized step. All parameters
+    broadcast, so e.g. prices[:, None] and rates[None, :] give a break-even
+    surface over a price x interest-rate grid in one call.
+    
+    Parameters:
+    home_price ... selling_cost_percent: Scenario inputs, as for utils.projection.build_projection
+    projection (Projection): Projection already built from these inputs, to avoid rebuilding it
+    
+    Returns:
+    int or numpy.ndarray: Break-even month (1 = first month of ownership); None,
+        or 0 in arrays, where buying never breaks even within the loan term
+    """
+    # Imported here because the projection engine builds on this module
+    from utils.projection import build_projection
+    
+    if projection is None:
+        projection = build_projection(
+            home_price, down_payment, interest_rate, loan_term_years,
+            property_tax_rate, maintenance_cost, appreciation_rate,
+            monthly_rent, rent_increase_rate, investment_return_rate,
+            selling_cost_percent
+        )
+    break_even_year = np.asarray(0 if projection.break_even_year is None else projection.break_even_year)
+    shape = break_even_year.shape
+    home_price, down_payment, selling_cost_percent = (
+        np.broadcast_to(np.asarray(value, dtype=float), shape)
+        for value in (home_price, down_payment, selling_cost_percent)
+    )
+    
+    # Bracket: the year that ends with buying ahead (year 1 where there is none)
+    year_index = np.maximum(break_even_year - 1, 0)
+    months_into_year = np.arange(1, 13) / 12
+    
+    # All four series are picked in one pass, stacked along a leading axis
+    series = np.array([projection.buying_out_of_pocket, projection.renting_out_of_pocket,
+                       projection.home_value, projection.investment_value])
+    initial = np.array([down_payment, np.zeros(shape), home_price, down_payment])
+    starts, ends = _year_start_and_end(series, initial, year_index)
+    buying_start, renting_start, home_start, investment_start = starts
+    buying_end, renting_end, home_end, investment_end = ends
+    
+    def grow(start, end):
+        # Geometric growth within the year, exact at both ends
+        ratio = np.divide(end, start, out=np.ones_like(end), where=start != 0)
+        return start * ratio ** months_into_year
+    
+    home_value = grow(home_start, home_end)
+    investment_value = grow(investment_start, investment_end)
+    months = 12 * year_index[..., None] + np.arange(1, 13)
+    balance = projection.balance_after(months)
+    
+    buying_position = (
+        buying_start + (buying_end - buying_start) * months_into_year
+        - home_value * (1 - selling_cost_percent[..., None] / 100) + balance
+    )
+    renting_position = (
+        renting_start + (renting_end - renting_start) * months_into_year
+        - investment_value + down_payment[..., None]
+    )
     
-    for year in range(loan_term_years):
-        annual_rent = current_rent * 12
-        total_cost += annual_rent
-        current_rent *= (1 + rent_increase_rate / 100)
+    # The year-end month always qualifies, rounding aside
+    buying_wins = buying_position < renting_position
+    buying_wins[..., -1] = True
+    month = 12 * year_index + buying_wins.argmax(axis=-1) + 1
+    month = np.where(break_even_year > 0, month, 0)
     
-    return total_cost
\ No newline at end of file
+    if month.ndim == 0:
+        return int(month) or None
+    return month
@@ -0,0 +1,188 @@
+"""
+Trajectory charts with compact payloads
+
+The trajectory charts follow monthly series across the whole term: up to 360
+points per series and several series per figure, all serialized to JSON and
+sent to the browser on every rerun. Before drawing, each figure's series are
+downsampled with Largest-Triangle-Three-Buckets (LTTB), which keeps the
+points that shape a line (its turns, peaks and crossings) and drops those in
+between. A figure's series share their x positions, at most POINT_BUDGET
+(or MIN_POINTS per series if more), so a 30-year term drops from 361 months
+to a few hundred points at most; series that already fit are left whole.
+Amounts are rounded to whole dollars, and the traces are WebGL (Scattergl),
+which draw faster than SVG lines.
+"""
+import numpy as np
+import plotly.graph_objects as go
+
+# x positions kept per figure, shared evenly by its series
+POINT_BUDGET = 240
+
+# No series is cut below this many points
+MIN_POINTS = 60
+
+BUYING_COLOR = "#1f77b4"
+RENTING_COLOR = "#d62728"
+EQUITY_COLOR = "#2ca02c"
+BAND_COLOR = "31, 119, 180"
+
+def lttb(x, y, threshold):
+    """
+    Pick the points that best preserve a line's shape (Largest-Triangle-Three-Buckets)
+
+    The first and last points are kept. The points in between are split into
+    threshold - 2 buckets, and from each bucket the point forming the largest
+    triangle with the previously kept point and the average of the next
+    bucket is kept.
+
+    Parameters:
+    x (numpy.ndarray): Increasing x values
+    y (numpy.ndarray): y values
+    threshold (int): Number of points to keep
+
+    Returns:
+    numpy.ndarray: Indices of the kept points, in order
+    """
+    size = len(x)
+    if threshold >= size or threshold < 3:
+        return np.arange(size)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    # Bucket b spans edges[b]:edges[b + 1]; the last point is a bucket of its own
+    edges = np.append((np.arange(threshold - 1) * ((size - 2) / (threshold - 2))).astype(int) + 1, size)
+
+    kept = np.empty(threshold, dtype=int)
+    kept[0], kept[-1] = 0, size - 1
+    previous = 0
+    for bucket in range(threshold - 2):
+        start, end, next_end = edges[bucket], edges[bucket + 1], edges[bucket + 2]
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        # Twice the triangle areas; the factor does not change the largest
+        areas = np.abs(
+            (x[previous] - next_x) * (y[start:end] - y[previous])
+            - (x[previous] - x[start:end]) * (next_y - y[previous])
+        )
+        previous = start + int(areas.argmax())
+        kept[bucket + 1] = previous
+    return kept
+
+def downsample(x, series, budget=POINT_BUDGET):
+    """
+    Pick the points to draw for series sharing an x axis
+
+    Each series gets an even share of the budget (at least MIN_POINTS) and
+    the points LTTB keeps for any of them are kept for all, so bands and
+    lines stay aligned.
+
+    Parameters:
+    x (numpy.ndarray): Shared x values
+    series (list): y arrays, one per series
+    budget (int): x positions to keep
+
+    Returns:
+    numpy.ndarray: Indices of the kept points, in order
+    """
+    threshold = max(MIN_POINTS, budget // len(series))
+    if threshold >= len(x):
+        return np.arange(len(x))
+    return np.unique(np.concatenate([lttb(x, y, threshold) for y in series]))
+
+def _years(months):
+    """Months as fractional years for the x axis"""
+    return np.round(np.asarray(months) / 12, 3)
+
+def _line(x, y, name, color, **kwargs):
+    return go.Scattergl(
+        x=x, y=np.round(y), name=name, mode="lines", line_color=color,
+        hovertemplate="Year %{x:.2f}: $%{y:,.0f}<extra>" + name + "</extra>", **kwargs
+    )
+
+def _layout(figure, title, yaxis_title, height=400):
+    figure.update_layout(
+        title=title, xaxis_title="Year", yaxis_title=yaxis_title, height=height,
+        hovermode="x unified", legend=dict(orientation="h", y=-0.2)
+    )
+    return figure
+
+def position_figure(positions, break_even_month=None, budget=POINT_BUDGET):
+    """
+    Net cost of buying and of renting, month by month
+
+    Parameters:
+    positions (dict): Output of utils.projection.monthly_positions
+    break_even_month (int): Month to mark, None for none
+    budget (int): x positions to draw
+
+    Returns:
+    plotly.graph_objects.Figure: Figure with both position curves
+    """
+    buying, renting = positions["buying_position"], positions["renting_position"]
+    keep = downsample(positions["months"], [buying, renting], budget)
+    years = _years(positions["months"][keep])
+
+    figure = go.Figure(data=[
+        _line(years, buying[keep], "Buying", BUYING_COLOR),
+        _line(years, renting[keep], "Renting", RENTING_COLOR),
+    ])
+    if break_even_month:
+        figure.add_vline(x=round(break_even_month / 12, 3), line_dash="dot", line_color="gray",
+                         annotation_text="Break-even")
+    return _layout(figure, "Net Cost if You Left That Month (Lower Is Better)", "Net Cost ($)")
+
+def equity_figure(positions, budget=POINT_BUDGET):
+    """
+    Home equity against the outstanding loan balance, month by month
+
+    Parameters:
+    positions (dict): Output of utils.projection.monthly_positions
+    budget (int): x positions to draw
+
+    Returns:
+    plotly.graph_objects.Figure: Figure with the equity and balance curves
+    """
+    equity, balance = positions["equity"], positions["loan_balance"]
+    keep = downsample(positions["months"], [equity, balance], budget)
+    years = _years(positions["months"][keep])
+
+    figure = go.Figure(data=[
+        _line(years, equity[keep], "Home Equity", EQUITY_COLOR, fill="tozeroy"),
+        _line(years, balance[keep], "Loan Balance", BUYING_COLOR),
+    ])
+    return _layout(figure, "Home Equity vs. Loan Balance", "Amount ($)")
+
+def band_figure(months, bands, percentiles, budget=POINT_BUDGET):
+    """
+    Percentile bands of a simulated series, month by month
+
+    Percentiles are paired from the outside in (e.g. P5-P95, then P25-P75)
+    into shaded bands, darker towards the middle, with the median as a line.
+
+    Parameters:
+    months (numpy.ndarray): Month of each column
+    bands (numpy.ndarray): Values per percentile (rows) and month (columns)
+    percentiles (list): Percentile of each row, increasing
+    budget (int): x positions to draw
+
+    Returns:
+    plotly.graph_objects.Figure: Figure with the bands and the median
+    """
+    keep = downsample(months, list(bands), budget)
+    years = _years(np.asarray(months)[keep])
+
+    traces = []
+    pairs = len(percentiles) // 2
+    for index in range(pairs):
+        lower, upper = index, len(percentiles) - 1 - index
+        name = f"P{percentiles[lower]}-P{percentiles[upper]}"
+        fill = f"rgba({BAND_COLOR}, {0.15 * (index + 1):.2f})"
+        traces.append(_line(years, bands[lower][keep], name, "rgba(0, 0, 0, 0)",
+                            legendgroup=name, showlegend=False))
+        traces.append(_line(years, bands[upper][keep], name, "rgba(0, 0, 0, 0)",
+                            legendgroup=name, fill="tonexty", fillcolor=fill))
+    if len(percentiles) % 2:
+        traces.append(_line(years, bands[pairs][keep], f"Median (P{percentiles[pairs]})", f"rgb({BAND_COLOR})"))
+
+    figure = go.Figure(data=traces)
+    figure.add_hline(y=0, line_dash="dot", line_color="gray")
+    return _layout(figure, "Buying Advantage Across Simulated Paths (Above 0: Buying Ahead)", "Advantage ($)")
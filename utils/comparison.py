@@ -0,0 +1,333 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from utils.calculations import (
+    calculate_affordability,
+    get_affordability_status,
+    find_break_even
+)
+from utils.projection import APPRECIATION_CAP, build_projection
+from utils.result_store import cached_result
+from utils.stages import staged_projection
+from utils.tax import TaxProfile
+from utils.timing import timed
+
+# Comparisons kept by the process-wide cache; each takes a few kilobytes
+COMPARISON_CACHE_SIZE = 1024
+
+@timed
+def run_comparison(monthly_income, home_price, down_payment_percent, interest_rate,
+                   loan_term_years, property_tax_rate, maintenance_cost, appreciation_rate,
+                   selling_cost_percent, monthly_rent, rent_increase_rate, investment_return_rate,
+                   maintenance_inflation_rate=None, appreciation_cap=APPRECIATION_CAP, province=None,
+                   fhsa_amount=0.0, hbp_amount=0.0, hbp_repaid=True, projection=None):
+    """
+    Compare renting and buying
+
+    This is the whole comparison shown by the Streamlit app, free of any UI
+    code so it can also be served over HTTP. All parameters broadcast, so a
+    batch of scenarios is compared in one call.
+
+    Parameters:
+    monthly_income (float or numpy.ndarray): Monthly income
+    home_price (float or numpy.ndarray): Home price
+    down_payment_percent (float or numpy.ndarray): Down payment as a percentage of the price
+    interest_rate (float, numpy.ndarray or RatePath): Annual interest rate (percentage)
+    loan_term_years (int or numpy.ndarray): Loan term in years
+    property_tax_rate (float, numpy.ndarray or RatePath): Annual property tax rate (percentage)
+    maintenance_cost (float or numpy.ndarray): Annual maintenance cost
+    appreciation_rate (float, numpy.ndarray or RatePath): Annual home appreciation rate (percentage)
+    selling_cost_percent (float or numpy.ndarray): Selling costs as a percentage of the final home value
+    monthly_rent (float or numpy.ndarray): Initial monthly rent
+    rent_increase_rate (float, numpy.ndarray or RatePath): Annual rent increase rate (percentage)
+    investment_return_rate (float, numpy.ndarray or RatePath): Annual return on the invested down payment
+        (percentage)
+    maintenance_inflation_rate (float, numpy.ndarray or RatePath): Annual growth of maintenance
+        (percentage), None to follow capped appreciation
+    appreciation_cap (float): Highest appreciation rate used (percentage), None for no cap
+    province (str or numpy.ndarray): Province code or city to apply income tax for (see utils.tax),
+        None to leave tax out; the monthly income is taken as the taxable income
+    fhsa_amount (float or numpy.ndarray): Part of the down payment saved in an FHSA
+    hbp_amount (float or numpy.ndarray): Part of the down payment withdrawn under the Home Buyers' Plan
+    hbp_repaid (bool or numpy.ndarray): Whether the Home Buyers' Plan is repaid on schedule
+    projection (Projection): Projection already built from these inputs, to avoid rebuilding it
+
+    Returns:
+    dict: Monthly costs and affordability, long-term totals for both options,
+        which option is cheaper and by how much, and the break-even year and
+        month. For a single scenario the values are plain numbers and strings,
+        with None when buying never breaks even; for a batch they are arrays,
+        with 0 when buying never breaks even.
+    """
+    down_payment = np.asarray(home_price) * down_payment_percent / 100
+
+    if projection is None:
+        projection = build_projection(
+            home_price, down_payment, interest_rate, loan_term_years,
+            property_tax_rate, maintenance_cost, appreciation_rate,
+            monthly_rent, rent_increase_rate, investment_return_rate,
+            selling_cost_percent, maintenance_inflation_rate, appreciation_cap,
+            tax_profile(monthly_income, province, fhsa_amount, hbp_amount, hbp_repaid)
+        )
+    monthly_mortgage = projection.monthly_mortgage
+
+    mortgage_affordability = calculate_affordability(monthly_mortgage, monthly_income)
+    rent_affordability = calculate_affordability(monthly_rent, monthly_income)
+    mortgage_status, mortgage_color = get_affordability_status(mortgage_affordability)
+    rent_status, rent_color = get_affordability_status(rent_affordability)
+
+    net_buying_cost = projection.net_buying_cost
+    adjusted_renting_cost = projection.adjusted_renting_cost
+
+    # Savings are relative to the more expensive option
+    buying_cheaper = np.asarray(net_buying_cost < adjusted_renting_cost)
+    savings = np.abs(np.asarray(adjusted_renting_cost - net_buying_cost))
+    costlier = np.where(buying_cheaper, adjusted_renting_cost, net_buying_cost)
+    percentage_saved = np.divide(savings * 100, costlier, out=np.zeros_like(savings), where=costlier > 0)
+
+    break_even_month = find_break_even(
+        home_price, down_payment, interest_rate, loan_term_years,
+        property_tax_rate, maintenance_cost, appreciation_rate,
+        monthly_rent, rent_increase_rate, investment_return_rate,
+        selling_cost_percent, projection=projection
+    )
+
+    comparison = {
+        "down_payment": down_payment,
+        "loan_amount": projection.loan_amount,
+        "monthly_mortgage": monthly_mortgage,
+        "monthly_property_tax": projection.monthly_property_tax,
+        "monthly_maintenance": projection.monthly_maintenance,
+        "total_monthly_buying": projection.total_monthly_buying,
+        "mortgage_affordability": mortgage_affordability,
+        "mortgage_status": mortgage_status,
+        "mortgage_status_color": mortgage_color,
+        "rent_affordability": rent_affordability,
+        "rent_status": rent_status,
+        "rent_status_color": rent_color,
+        "capped_appreciation_rate": projection.capped_appreciation_rate,
+        "cumulative_mortgage": projection.cumulative_mortgage,
+        "cumulative_property_tax": projection.cumulative_property_tax,
+        "cumulative_maintenance": projection.cumulative_maintenance,
+        "total_buying_cost": projection.total_buying_cost,
+        "final_home_value": projection.final_home_value,
+        "selling_costs": projection.selling_costs,
+        "net_home_sale_proceeds": projection.net_home_sale_proceeds,
+        "net_buying_cost": net_buying_cost,
+        "total_renting_cost": projection.total_renting_cost,
+        "final_investment_value": projection.final_investment_value,
+        "investment_gain": projection.investment_gain,
+        "adjusted_renting_cost": adjusted_renting_cost,
+        "buying_tax": projection.buying_tax,
+        "capital_gains_tax": projection.capital_gains_tax,
+        "cheaper_option": np.where(buying_cheaper, "buying", "renting"),
+        "savings": savings,
+        "percentage_saved": percentage_saved,
+        "break_even_year": projection.break_even_year,
+        "break_even_month": break_even_month,
+    }
+
+    if buying_cheaper.ndim == 0:
+        # Plain Python values for a single scenario; break-even stays None or int
+        comparison = {
+            name: value.item() if isinstance(value, (np.ndarray, np.generic)) else value
+            for name, value in comparison.items()
+        }
+    return comparison
+
+def tax_profile(monthly_income, province, fhsa_amount=0.0, hbp_amount=0.0, hbp_repaid=True):
+    """
+    Build the tax profile of a comparison
+
+    Parameters:
+    monthly_income ... hbp_repaid: As for run_comparison
+
+    Returns:
+    TaxProfile: The profile, None when province is None
+    """
+    if province is None:
+        return None
+    return TaxProfile(np.asarray(monthly_income) * 12, province, fhsa_amount, hbp_amount, hbp_repaid)
+
+def comparison_key(monthly_income, city, home_price, down_payment_percent, interest_rate,
+                   loan_term_years, property_tax_rate, maintenance_cost, appreciation_rate,
+                   selling_cost_percent, bedrooms, monthly_rent, rent_increase_rate,
+                   investment_return_rate, maintenance_inflation_rate=None,
+                   appreciation_cap=APPRECIATION_CAP, province=None, fhsa_amount=0.0,
+                   hbp_amount=0.0, hbp_repaid=True):
+    """
+    Build the cache key of a comparison from its inputs
+
+    Numbers are normalized so that e.g. 750000, 750000.0 and numpy floats
+    give the same key, and float noise below a millionth is ignored. Rates
+    may be sequences of yearly rates, which become tuples.
+
+    Parameters:
+    monthly_income ... hbp_repaid: Comparison inputs, with the city and
+        bedrooms the rent was looked up for (None if not looked up)
+
+    Returns:
+    tuple: Hashable key
+    """
+    def number(value):
+        return round(float(value), 6)
+
+    def rate(value):
+        if value is None or np.ndim(value) == 0:
+            return None if value is None else number(value)
+        return tuple(number(year) for year in value)
+
+    return (
+        number(monthly_income),
+        None if city is None else str(city),
+        number(home_price),
+        number(down_payment_percent),
+        rate(interest_rate),
+        int(loan_term_years),
+        rate(property_tax_rate),
+        number(maintenance_cost),
+        rate(appreciation_rate),
+        number(selling_cost_percent),
+        None if bedrooms is None else int(bedrooms),
+        number(monthly_rent),
+        rate(rent_increase_rate),
+        rate(investment_return_rate),
+        rate(maintenance_inflation_rate),
+        rate(appreciation_cap),
+        None if province is None else str(province),
+        number(fhsa_amount),
+        number(hbp_amount),
+        bool(hbp_repaid),
+    )
+
+class ComparisonCache:
+    """
+    Thread-safe, size-bounded LRU cache of comparison results
+
+    Shared by every session of the process, so users trying the same inputs
+    (most often the defaults) reuse each other's results.
+    """
+
+    def __init__(self, maxsize=COMPARISON_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """
+        Look up a comparison, counting a hit or a miss
+
+        Parameters:
+        key (tuple): Key from comparison_key
+
+        Returns:
+        dict: Copy of the cached comparison, or None
+        """
+        with self._lock:
+            result = self._results.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+            self._results.move_to_end(key)
+            self.hits += 1
+            return dict(result)
+
+    def put(self, key, result):
+        """
+        Store a comparison, evicting the least recently used one when full
+
+        Parameters:
+        key (tuple): Key from comparison_key
+        result (dict): Comparison of a single scenario
+        """
+        with self._lock:
+            self._results[key] = dict(result)
+            self._results.move_to_end(key)
+            while len(self._results) > self.maxsize:
+                self._results.popitem(last=False)
+
+    def clear(self):
+        """Drop all cached comparisons and reset the counters"""
+        with self._lock:
+            self._results.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Get the cache counters
+
+        Returns:
+        dict: hits, misses, size and maxsize
+        """
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses,
+                    "size": len(self._results), "maxsize": self.maxsize}
+
+_comparison_cache = ComparisonCache()
+
+def get_comparison_cache():
+    """Get the process-wide comparison cache"""
+    return _comparison_cache
+
+@timed
+def cached_comparison(monthly_income, city, home_price, down_payment_percent, interest_rate,
+                      loan_term_years, property_tax_rate, maintenance_cost, appreciation_rate,
+                      selling_cost_percent, bedrooms, monthly_rent, rent_increase_rate,
+                      investment_return_rate, maintenance_inflation_rate=None,
+                      appreciation_cap=APPRECIATION_CAP, province=None, fhsa_amount=0.0,
+                      hbp_amount=0.0, hbp_repaid=True):
+    """
+    Compare renting and buying for one scenario, reusing earlier results
+
+    Results are looked up in the process-wide cache first, then in the
+    shared result store when one is configured (see utils.result_store).
+    New results are computed from cached stages (see utils.stages), so only
+    the parts of the model that depend on changed inputs are recomputed.
+    Inputs are normalized as by comparison_key before use.
+
+    Parameters:
+    monthly_income ... hbp_repaid: As for comparison_key, with yearly
+        rates for a custom inflation scenario
+
+    Returns:
+    dict: The comparison, as from run_comparison
+    """
+    key = comparison_key(
+        monthly_income, city, home_price, down_payment_percent, interest_rate,
+        loan_term_years, property_tax_rate, maintenance_cost, appreciation_rate,
+        selling_cost_percent, bedrooms, monthly_rent, rent_increase_rate,
+        investment_return_rate, maintenance_inflation_rate, appreciation_cap, province,
+        fhsa_amount, hbp_amount, hbp_repaid
+    )
+    result = _comparison_cache.get(key)
+    if result is not None:
+        return result
+
+    (monthly_income, _, home_price, down_payment_percent, interest_rate, loan_term_years,
+     property_tax_rate, maintenance_cost, appreciation_rate, selling_cost_percent, _,
+     monthly_rent, rent_increase_rate, investment_return_rate, maintenance_inflation_rate,
+     appreciation_cap, province, fhsa_amount, hbp_amount, hbp_repaid) = key
+
+    def compute():
+        projection = staged_projection(
+            home_price, down_payment_percent, interest_rate, loan_term_years,
+            property_tax_rate, maintenance_cost, appreciation_rate,
+            monthly_rent, rent_increase_rate, investment_return_rate,
+            selling_cost_percent, maintenance_inflation_rate, appreciation_cap,
+            tax_profile(monthly_income, province, fhsa_amount, hbp_amount, hbp_repaid)
+        )
+        return run_comparison(
+            monthly_income, home_price, down_payment_percent, interest_rate,
+            loan_term_years, property_tax_rate, maintenance_cost, appreciation_rate,
+            selling_cost_percent, monthly_rent, rent_increase_rate, investment_return_rate,
+            maintenance_inflation_rate, appreciation_cap, projection=projection
+        )
+
+    result = cached_result("comparison", key, compute)
+    _comparison_cache.put(key, result)
+    return result
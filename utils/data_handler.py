@@ -1,33 +1,228 @@
-import pandas as pd
+import os
+import threading
+import time
 
-def load_rent_data():
+import numpy as np
+
+from utils.listings import DEFAULT_RADIUS_KM, MIN_COMPARABLES, get_listing_store
+from utils.rent_bundle import MANIFEST_NAME, bundle_path, encode_rent_table, load_rent_bundle
+from utils.rent_index import RentIndex
+from utils.timing import timed
+
+RENT_DATA_PATH = "data/rent_data.csv"
+
+# Minimum number of seconds between two mtime checks of the rent file
+RELOAD_CHECK_INTERVAL = 2.0
+
+# pandas is imported by the functions that need it: the rent index is built
+# from the bundle's NumPy arrays, so listing cities at startup does not load it
+
+def load_rent_data(path=RENT_DATA_PATH):
     """Load rent data from CSV file"""
+    import pandas as pd
+
     try:
-        return pd.read_csv("data/rent_data.csv")
+        return pd.read_csv(path)
     except Exception as e:
         print(f"Error loading rent data: {e}")
         return pd.DataFrame(columns=["city", "bedrooms", "average_rent"])
 
+def load_rent_columns(path=RENT_DATA_PATH):
+    """
+    Load the rent table as dictionary-encoded column arrays
+
+    The binary bundle next to the CSV is memory-mapped when it exists and is
+    up to date (see utils.rent_bundle); otherwise the CSV is parsed.
+
+    Parameters:
+    path (str): Rent table CSV
+
+    Returns:
+    dict: Columns as from utils.rent_bundle.encode_rent_table
+    """
+    columns = load_rent_bundle(bundle_path(path), source_path=path)
+    if columns is None:
+        columns = encode_rent_table(load_rent_data(path))
+    return columns
+
+class RentStore:
+    """
+    In-memory, indexed view of the rent table
+
+    The table is loaded once, memory-mapped from the binary bundle when there
+    is one, into a hierarchical RentIndex (see utils.rent_index) with every
+    fallback resolved up front. The files' mtimes are re-checked at most
+    every RELOAD_CHECK_INTERVAL seconds, so lookups are served from memory
+    and the index is rebuilt only when the CSV or the bundle actually
+    changes on disk.
+    """
+
+    def __init__(self, path=RENT_DATA_PATH, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._index = None
+
+    def _file_mtime(self):
+        mtimes = []
+        for path in (self.path, os.path.join(bundle_path(self.path), MANIFEST_NAME)):
+            try:
+                mtimes.append(os.stat(path).st_mtime_ns)
+            except OSError:
+                mtimes.append(None)
+        return tuple(mtimes)
+
+    @timed
+    def refresh(self, force=False):
+        """
+        Reload the table if the file changed since the last load
+
+        Parameters:
+        force (bool): Reload even if the mtime is unchanged
+
+        Returns:
+        bool: True if the table was (re)loaded
+        """
+        now = time.monotonic()
+        if not force and self._mtime is not None and now < self._next_check:
+            return False
+
+        with self._lock:
+            if not force and self._mtime is not None and now < self._next_check:
+                return False
+            self._next_check = now + self.check_interval
+
+            mtime = self._file_mtime()
+            if not force and self._mtime is not None and mtime == self._mtime:
+                return False
+
+            self._index = RentIndex(load_rent_columns(self.path))
+            self._mtime = mtime
+            return True
+
+    def get_rent_estimate(self, bedrooms, city=None, neighbourhood=None, postal_code=None, province=None):
+        """
+        Get the most specific rent estimate available for an area
+
+        Parameters:
+        bedrooms (int): Number of bedrooms
+        city (str): City name
+        neighbourhood (str): Neighbourhood within the city
+        postal_code (str): Postal code or prefix
+        province (str): Province
+
+        Returns:
+        dict: rent, and the bedrooms, level and area it is for, as from
+            RentIndex.estimate; None when no rent is available
+        """
+        self.refresh()
+        return self._index.estimate(bedrooms, city, neighbourhood, postal_code, province)
+
+    def get_rent(self, city, bedrooms):
+        """
+        Get the rent for a city and bedroom count, falling back to the
+        closest bedroom count available in that city
+
+        Parameters:
+        city (str): City name
+        bedrooms (int): Number of bedrooms
+
+        Returns:
+        float or None: Average rent, or None if the city is unknown
+        """
+        self.refresh()
+        return self._index.rent(bedrooms, city)
+
+    def get_rents(self, cities, bedrooms, neighbourhoods=None, postal_codes=None):
+        """
+        Get rents for many areas and bedroom counts at once
+
+        Each distinct combination is looked up once, so the cost follows the
+        number of distinct combinations rather than the number of rows.
+
+        Parameters:
+        cities (array-like): City names
+        bedrooms (array-like): Bedroom counts
+        neighbourhoods (array-like): Neighbourhoods within the cities, optional
+        postal_codes (array-like): Postal codes or prefixes, optional
+
+        Returns:
+        numpy.ndarray: Rents as floats, NaN where no rent is available
+        """
+        import pandas as pd
+
+        areas = pd.DataFrame({
+            "city": cities,
+            "neighbourhood": neighbourhoods,
+            "postal_code": postal_codes,
+        }, index=range(len(bedrooms))).astype(object)
+        bedrooms = pd.Series(bedrooms, index=areas.index)
+        rents = np.full(len(areas), np.nan)
+
+        known = (areas.notna().any(axis=1) & bedrooms.notna()).to_numpy()
+        if known.any():
+            keys = areas[known].where(areas[known].notna(), "").assign(bedrooms=bedrooms[known])
+            codes, combinations = pd.factorize(pd.MultiIndex.from_frame(keys))
+            combination_rents = []
+            for city, neighbourhood, postal_code, bedroom in combinations:
+                estimate = self.get_rent_estimate(bedroom, city or None, neighbourhood or None, postal_code or None)
+                combination_rents.append(np.nan if estimate is None else estimate["rent"])
+            rents[known] = np.array(combination_rents, dtype=float)[codes]
+
+        return rents
+
+    def get_cities(self):
+        """Get the sorted list of cities in the table"""
+        self.refresh()
+        return self._index.get_cities()
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_rent_store():
+    """Get the process-wide rent store shared by all sessions"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = RentStore()
+    return _store
+
 def get_average_rent(city, bedrooms):
     """Get average rent for a specific city and bedroom count"""
-    rent_data = load_rent_data()
-    
-    if rent_data.empty:
-        return None
-    
-    filtered_data = rent_data[(rent_data["city"] == city) & (rent_data["bedrooms"] == bedrooms)]
-    
-    if filtered_data.empty:
-        # If exact match not found, try to find closest match
-        city_data = rent_data[rent_data["city"] == city]
-        if not city_data.empty:
-            closest_bedroom = city_data.iloc[(city_data["bedrooms"] - bedrooms).abs().argsort()[0]]
-            return closest_bedroom["average_rent"]
-        return None
-    
-    return filtered_data.iloc[0]["average_rent"]
+    return get_rent_store().get_rent(city, bedrooms)
+
+def get_average_rents(cities, bedrooms, neighbourhoods=None, postal_codes=None):
+    """Get average rents for arrays of areas and bedroom counts, NaN where unknown"""
+    return get_rent_store().get_rents(cities, bedrooms, neighbourhoods, postal_codes)
+
+def get_rent_estimate(bedrooms, city=None, neighbourhood=None, postal_code=None, province=None):
+    """Get the most specific rent estimate for an area, with the level it comes from"""
+    return get_rent_store().get_rent_estimate(bedrooms, city, neighbourhood, postal_code, province)
 
 def get_available_cities():
     """Get list of available cities in the data"""
-    rent_data = load_rent_data()
-    return sorted(rent_data["city"].unique().tolist())
\ No newline at end of file
+    return get_rent_store().get_cities()
+
+def get_nearby_rent(latitude, longitude, bedrooms, radius_km=DEFAULT_RADIUS_KM, min_listings=MIN_COMPARABLES):
+    """Get the median rent of comparable listings around a point, see ListingIndex.comparables"""
+    return get_listing_store().get_index().comparables(latitude, longitude, bedrooms, radius_km, min_listings)
+
+def get_nearby_listings(latitude, longitude, bedrooms, radius_km, limit=1000):
+    """Get up to limit of the nearest listings within radius_km, as a DataFrame for st.map"""
+    import pandas as pd
+
+    index = get_listing_store().get_index()
+    positions, distances = index.nearest(latitude, longitude, limit, bedrooms, radius_km)
+    return pd.DataFrame({
+        "latitude": index.latitudes[positions],
+        "longitude": index.longitudes[positions],
+        "rent": index.rents[positions],
+        "distance_km": distances,
+    })
+
+def has_listings():
+    """Check whether any listings are loaded for nearby rent comparables"""
+    return len(get_listing_store().get_index()) > 0
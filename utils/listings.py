@@ -0,0 +1,292 @@
+"""
+Rent comparables from individual listings, with a spatial grid index
+
+The listing file (CSV or Parquet) has one row per listing with latitude,
+longitude, bedrooms and rent columns. It is loaded once into a ListingIndex:
+listings are bucketed into grid cells of about CELL_KM per side and sorted by
+bedroom count, then cell, so the listings of one grid row within a range of
+columns are a single contiguous slice found by binary search. A radius query
+reads the few slices covering its bounding box and measures exact
+great-circle distances only for those candidates; a nearest-neighbour query
+widens its radius until it holds enough listings.
+
+Longitudes are assumed not to wrap around the antimeridian, which holds for
+Canadian listings.
+"""
+import math
+import os
+import threading
+import time
+
+import numpy as np
+
+from utils.timing import timed
+
+LISTINGS_PATH = "data/listings.csv"
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Side of a grid cell
+CELL_KM = 0.5
+
+# Listings with more bedrooms are grouped with this count ("5+")
+MAX_BEDROOMS = 5
+
+# Comparables: listings within DEFAULT_RADIUS_KM, or the MIN_COMPARABLES
+# nearest ones up to MAX_RADIUS_KM away when the radius holds fewer
+DEFAULT_RADIUS_KM = 1.0
+MIN_COMPARABLES = 10
+MAX_RADIUS_KM = 25.0
+
+# Minimum number of seconds between two mtime checks of the listing file
+RELOAD_CHECK_INTERVAL = 2.0
+
+def haversine_km(latitude, longitude, latitudes, longitudes):
+    """
+    Great-circle distances from one point
+
+    Parameters:
+    latitude, longitude (float): Point in degrees
+    latitudes, longitudes (numpy.ndarray): Other points in degrees
+
+    Returns:
+    numpy.ndarray: Distances in kilometres
+    """
+    lat1 = math.radians(latitude)
+    lat2 = np.radians(latitudes)
+    half_dlat = (lat2 - lat1) / 2
+    half_dlon = np.radians(longitudes - longitude) / 2
+    a = np.sin(half_dlat) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(half_dlon) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+class ListingIndex:
+    """
+    Grid index over listings for radius and nearest-neighbour queries
+
+    Built once from the listing columns; queries never scan all listings.
+    """
+
+    def __init__(self, latitudes, longitudes, bedrooms, rents, cell_km=CELL_KM):
+        latitudes = np.asarray(latitudes, dtype=float)
+        longitudes = np.asarray(longitudes, dtype=float)
+        bedrooms = np.asarray(bedrooms, dtype=float)
+        rents = np.asarray(rents, dtype=float)
+
+        usable = (
+            np.isfinite(latitudes) & np.isfinite(longitudes) & np.isfinite(rents) & np.isfinite(bedrooms)
+            & (np.abs(latitudes) <= 90) & (np.abs(longitudes) <= 180) & (rents > 0) & (bedrooms >= 0)
+        )
+        latitudes, longitudes, rents = latitudes[usable], longitudes[usable], rents[usable]
+        groups = np.minimum(bedrooms[usable], MAX_BEDROOMS).astype(np.int64)
+
+        # Cells are cell_km tall everywhere and cell_km wide at the mean latitude
+        self._origin = (latitudes.min(), longitudes.min()) if len(rents) else (0.0, 0.0)
+        mean_latitude = latitudes.mean() if len(rents) else 0.0
+        self._cell_latitude = cell_km / KM_PER_DEGREE
+        self._cell_longitude = cell_km / (KM_PER_DEGREE * max(math.cos(math.radians(mean_latitude)), 0.01))
+
+        rows = ((latitudes - self._origin[0]) // self._cell_latitude).astype(np.int64)
+        columns = ((longitudes - self._origin[1]) // self._cell_longitude).astype(np.int64)
+        self._rows = int(rows.max()) + 1 if len(rents) else 0
+        self._columns = int(columns.max()) + 1 if len(rents) else 0
+
+        keys = (groups * self._rows + rows) * self._columns + columns
+        order = np.argsort(keys, kind="stable")
+        self._keys = keys[order]
+        self.latitudes = latitudes[order]
+        self.longitudes = longitudes[order]
+        self.rents = rents[order]
+        self.bedrooms = groups[order]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _candidates(self, latitude, longitude, radius_km, groups):
+        """Positions of the listings in the grid cells covering a circle's bounding box"""
+        if not len(self._keys):
+            return np.zeros(0, dtype=np.int64)
+
+        latitude_span = radius_km / KM_PER_DEGREE
+        widest = min(abs(latitude) + latitude_span, 90.0)
+        cosine = math.cos(math.radians(widest))
+        longitude_span = 360.0 if cosine < 1e-6 else radius_km / (KM_PER_DEGREE * cosine)
+
+        first_row = max(int((latitude - latitude_span - self._origin[0]) // self._cell_latitude), 0)
+        last_row = min(int((latitude + latitude_span - self._origin[0]) // self._cell_latitude), self._rows - 1)
+        first_column = max(int((longitude - longitude_span - self._origin[1]) // self._cell_longitude), 0)
+        last_column = min(int((longitude + longitude_span - self._origin[1]) // self._cell_longitude),
+                          self._columns - 1)
+        if first_row > last_row or first_column > last_column:
+            return np.zeros(0, dtype=np.int64)
+
+        # One contiguous slice of listings per bedroom group and grid row
+        row_starts = (
+            (np.asarray(groups)[:, None] * self._rows + np.arange(first_row, last_row + 1)) * self._columns
+        ).ravel()
+        starts = np.searchsorted(self._keys, row_starts + first_column, side="left")
+        ends = np.searchsorted(self._keys, row_starts + last_column, side="right")
+        lengths = ends - starts
+        if not lengths.any():
+            return np.zeros(0, dtype=np.int64)
+        # Concatenated ranges starts[i]:ends[i] without a Python loop
+        offsets = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        return offsets + np.arange(lengths.sum())
+
+    def _groups(self, bedrooms):
+        if bedrooms is None:
+            return np.arange(MAX_BEDROOMS + 1)
+        return np.array([min(max(int(bedrooms), 0), MAX_BEDROOMS)])
+
+    def within(self, latitude, longitude, radius_km, bedrooms=None):
+        """
+        Find the listings within a distance of a point
+
+        Parameters:
+        latitude, longitude (float): Point in degrees
+        radius_km (float): Distance in kilometres
+        bedrooms (int): Only listings with this many bedrooms (MAX_BEDROOMS
+            and up are one group), or None for all
+
+        Returns:
+        tuple: (positions, distances in km) of the listings, in no particular order
+        """
+        positions = self._candidates(latitude, longitude, radius_km, self._groups(bedrooms))
+        distances = haversine_km(latitude, longitude, self.latitudes[positions], self.longitudes[positions])
+        inside = distances <= radius_km
+        return positions[inside], distances[inside]
+
+    def nearest(self, latitude, longitude, k, bedrooms=None, max_radius_km=MAX_RADIUS_KM):
+        """
+        Find the k listings nearest to a point
+
+        Parameters:
+        latitude, longitude (float): Point in degrees
+        k (int): Number of listings
+        bedrooms (int): Only listings with this many bedrooms, or None for all
+        max_radius_km (float): Ignore listings further away than this
+
+        Returns:
+        tuple: (positions, distances in km) of up to k listings, nearest first
+        """
+        radius = CELL_KM
+        while True:
+            positions, distances = self.within(latitude, longitude, min(radius, max_radius_km), bedrooms)
+            # Every listing within the radius is found, so once it holds k they are the k nearest
+            if len(positions) >= k or radius >= max_radius_km:
+                break
+            radius *= 2
+
+        if len(positions) > k:
+            keep = np.argpartition(distances, k - 1)[:k]
+            positions, distances = positions[keep], distances[keep]
+        order = np.argsort(distances, kind="stable")
+        return positions[order], distances[order]
+
+    def comparables(self, latitude, longitude, bedrooms, radius_km=DEFAULT_RADIUS_KM,
+                    min_listings=MIN_COMPARABLES, max_radius_km=MAX_RADIUS_KM):
+        """
+        Summarize the rents of comparable listings around a point
+
+        Parameters:
+        latitude, longitude (float): Point in degrees
+        bedrooms (int): Bedroom count of the comparables
+        radius_km (float): Use every listing within this distance...
+        min_listings (int): ...or, if that gives fewer, the nearest this many
+        max_radius_km (float): Never use listings further away than this
+
+        Returns:
+        dict: median_rent, p25_rent, p75_rent, listings (count) and radius_km
+            (distance of the furthest comparable); None without any comparable
+        """
+        positions, distances = self.within(latitude, longitude, radius_km, bedrooms)
+        if len(positions) < min_listings:
+            positions, distances = self.nearest(latitude, longitude, min_listings, bedrooms, max_radius_km)
+        if not len(positions):
+            return None
+
+        p25, median, p75 = np.percentile(self.rents[positions], [25, 50, 75])
+        return {
+            "median_rent": float(median),
+            "p25_rent": float(p25),
+            "p75_rent": float(p75),
+            "listings": len(positions),
+            "radius_km": float(distances.max()),
+        }
+
+@timed
+def load_listings(path=LISTINGS_PATH):
+    """
+    Load listings into a ListingIndex
+
+    Parameters:
+    path (str): CSV or Parquet file with latitude, longitude, bedrooms and rent columns
+
+    Returns:
+    ListingIndex: The index, empty when the file is missing or unreadable
+    """
+    columns = ["latitude", "longitude", "bedrooms", "rent"]
+    if not os.path.exists(path):
+        return ListingIndex(*([] for _ in columns))
+
+    import pandas as pd
+
+    try:
+        if os.path.splitext(path)[1].lower() in (".parquet", ".pq"):
+            listings = pd.read_parquet(path, columns=columns)
+        else:
+            listings = pd.read_csv(path, usecols=columns)
+    except Exception as e:
+        if not isinstance(e, FileNotFoundError):
+            print(f"Error loading listings: {e}")
+        listings = pd.DataFrame(columns=columns)
+    return ListingIndex(*(pd.to_numeric(listings[name], errors="coerce").to_numpy(dtype=float) for name in columns))
+
+class ListingStore:
+    """
+    Process-wide listing index, rebuilt when the listing file changes
+
+    The file's mtime is re-checked at most every RELOAD_CHECK_INTERVAL
+    seconds, as for the rent table.
+    """
+
+    def __init__(self, path=LISTINGS_PATH, check_interval=RELOAD_CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._mtime = None
+        self._next_check = 0.0
+        self._index = None
+
+    def _file_mtime(self):
+        try:
+            return os.stat(self.path).st_mtime_ns
+        except OSError:
+            return 0
+
+    def get_index(self):
+        """Get the current ListingIndex, loading it on first use and after changes"""
+        now = time.monotonic()
+        if self._mtime is not None and now < self._next_check:
+            return self._index
+
+        with self._lock:
+            if self._mtime is None or now >= self._next_check:
+                self._next_check = now + self.check_interval
+                mtime = self._file_mtime()
+                if mtime != self._mtime:
+                    self._index = load_listings(self.path)
+                    self._mtime = mtime
+            return self._index
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_listing_store():
+    """Get the process-wide listing store shared by all sessions"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ListingStore()
+    return _store
@@ -0,0 +1,144 @@
+"""
+Load-test client for the JSON HTTP API (utils.server)
+
+Usage:
+    python -m utils.server --port 8000 &
+    python -m utils.loadtest --url http://127.0.0.1:8000/compare --connections 64 --requests 20000
+
+Each connection is kept alive and sends its requests back to back. Request
+bodies cycle through --distinct scenarios with different home prices; set it
+above the server's comparison cache size (1024) to measure uncached
+comparisons. Reports the throughput, the latency percentiles and any
+non-2xx responses.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from urllib.parse import urlsplit
+
+import numpy as np
+
+# Scenario posted to /compare, matching the Streamlit defaults
+SAMPLE_SCENARIO = {
+    "monthly_income": 5000.0,
+    "home_price": 750000.0,
+    "down_payment_percent": 20.0,
+    "interest_rate": 5.5,
+    "loan_term_years": 25,
+    "monthly_rent": 2500.0,
+}
+
+def sample_bodies(distinct, bulk_size=0):
+    """
+    Build request bodies around SAMPLE_SCENARIO
+
+    Parameters:
+    distinct (int): Number of different bodies, varying the home price
+    bulk_size (int): Scenarios per body for /compare/bulk, 0 for single scenarios
+
+    Returns:
+    list: JSON request bodies as bytes
+    """
+    bodies = []
+    for index in range(distinct):
+        scenario = dict(SAMPLE_SCENARIO, home_price=SAMPLE_SCENARIO["home_price"] + 1000 * index)
+        if bulk_size:
+            prices = scenario["home_price"] + 500 * np.arange(bulk_size)
+            payload = {"scenarios": [dict(scenario, home_price=float(price)) for price in prices]}
+        else:
+            payload = scenario
+        bodies.append(json.dumps(payload).encode())
+    return bodies
+
+async def _connection(host, port, method, path, bodies, remaining, latencies, statuses):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while remaining:
+            index = remaining.pop()
+            body = bodies[index % len(bodies)] if method == "POST" else b""
+            request = (
+                f"{method} {path} HTTP/1.1\r\nHost: {host}:{port}\r\n"
+                f"Content-Type: application/json\r\nContent-Length: {len(body)}\r\n\r\n"
+            ).encode("latin-1") + body
+
+            start = time.perf_counter()
+            writer.write(request)
+            head = await reader.readuntil(b"\r\n\r\n")
+            status_line, *header_lines = head.decode("latin-1").split("\r\n")
+            length = 0
+            for line in header_lines:
+                name, _, value = line.partition(":")
+                if name.strip().lower() == "content-length":
+                    length = int(value)
+            await reader.readexactly(length)
+            latencies.append(time.perf_counter() - start)
+            statuses.append(int(status_line.split(" ")[1]))
+    finally:
+        writer.close()
+
+async def run_load_test(url, connections=64, requests=20000, distinct=1000, bulk_size=0, method="POST"):
+    """
+    Send requests over concurrent keep-alive connections
+
+    Parameters:
+    url (str): Endpoint URL, e.g. http://127.0.0.1:8000/compare
+    connections (int): Concurrent connections
+    requests (int): Total number of requests
+    distinct (int): Number of different request bodies
+    bulk_size (int): Scenarios per request for /compare/bulk, 0 for single scenarios
+    method (str): POST to send the scenario bodies, GET to send no body
+
+    Returns:
+    dict: requests, errors (non-2xx responses), seconds, requests_per_second and
+        latency percentiles in milliseconds
+    """
+    parts = urlsplit(url)
+    bodies = sample_bodies(distinct, bulk_size)
+    remaining = list(range(requests))
+    latencies = []
+    statuses = []
+
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        _connection(parts.hostname, parts.port or 80, method, parts.path or "/",
+                    bodies, remaining, latencies, statuses)
+        for _ in range(connections)
+    ))
+    seconds = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    p50, p95, p99 = np.percentile(latencies_ms, [50, 95, 99])
+    return {
+        "requests": len(latencies),
+        "errors": sum(1 for status in statuses if not 200 <= status < 300),
+        "seconds": seconds,
+        "requests_per_second": len(latencies) / seconds,
+        "latency_p50_ms": p50,
+        "latency_p95_ms": p95,
+        "latency_p99_ms": p99,
+        "latency_max_ms": latencies_ms.max(),
+    }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the rent-vs-buy HTTP API")
+    parser.add_argument("--url", default="http://127.0.0.1:8000/compare", help="Endpoint to load")
+    parser.add_argument("--connections", type=int, default=64, help="Concurrent keep-alive connections")
+    parser.add_argument("--requests", type=int, default=20000, help="Total requests")
+    parser.add_argument("--distinct", type=int, default=1000, help="Different request bodies to cycle through")
+    parser.add_argument("--bulk-size", type=int, default=0, help="Scenarios per request for /compare/bulk")
+    parser.add_argument("--method", choices=["POST", "GET"], default="POST", help="GET for /health")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run_load_test(
+        args.url, args.connections, args.requests, args.distinct, args.bulk_size, args.method
+    ))
+    print(f"{report['requests']:,} requests in {report['seconds']:.2f}s: "
+          f"{report['requests_per_second']:,.0f} req/s, {report['errors']} errors")
+    print(f"Latency p50 {report['latency_p50_ms']:.2f} ms, p95 {report['latency_p95_ms']:.2f} ms, "
+          f"p99 {report['latency_p99_ms']:.2f} ms, max {report['latency_max_ms']:.2f} ms")
+    return 1 if report["errors"] else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
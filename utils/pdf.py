@@ -0,0 +1,244 @@
+"""
+Minimal PDF writer for the downloadable reports
+
+Writes text, tables and line charts with the standard Helvetica fonts and
+plain vector drawing, so reports need no plotting or PDF library. Pages are
+US Letter, measured in points (1/72 inch) from the bottom-left corner. Text
+is encoded as Latin-1; other characters are replaced.
+"""
+import math
+import zlib
+
+PAGE_WIDTH = 612
+PAGE_HEIGHT = 792
+MARGIN = 54
+
+FONTS = {"regular": "Helvetica", "bold": "Helvetica-Bold"}
+
+# Helvetica advance widths (1/1000 em) of the characters reports use most;
+# others are taken as DEFAULT_WIDTH, close enough to align columns
+CHARACTER_WIDTHS = {
+    " ": 278, ",": 278, ".": 278, ":": 278, "-": 333, "(": 333, ")": 333, "%": 889, "$": 556, "/": 278,
+    "i": 222, "j": 222, "l": 222, "f": 278, "t": 278, "r": 333, "I": 278, "m": 833, "w": 722,
+    "M": 833, "W": 944, "s": 500, "c": 500, "k": 500, "v": 500, "x": 500, "y": 500, "z": 500,
+}
+DEFAULT_WIDTH = 556
+
+def text_width(text, size):
+    """Approximate width of a line of Helvetica text in points"""
+    return sum(CHARACTER_WIDTHS.get(character, DEFAULT_WIDTH) for character in text) * size / 1000
+
+def _ticks(low, high, count=5):
+    """Round tick values covering low to high, about `count` of them"""
+    raw_step = (high - low) / max(count - 1, 1)
+    magnitude = 10 ** math.floor(math.log10(raw_step))
+    step = next(magnitude * factor for factor in (1, 2, 2.5, 5, 10) if magnitude * factor >= raw_step)
+    first = math.ceil(low / step - 1e-9)
+    return [tick * step for tick in range(first, math.floor(high / step + 1e-9) + 1)]
+
+def _escape(text):
+    text = str(text).encode("latin-1", "replace").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def _color(color):
+    """Convert a "#rrggbb" color to PDF RGB components"""
+    return " ".join(f"{int(color[i:i + 2], 16) / 255:.3f}" for i in (1, 3, 5))
+
+class PdfDocument:
+    """
+    A PDF built page by page
+
+    Drawing calls go to the current page; add_page starts a new one. The
+    cursor `y` is the top of the next block for callers that lay content out
+    top to bottom, and new_line/ensure_space move it and break pages.
+    """
+
+    def __init__(self, title=""):
+        self.title = title
+        self.pages = []
+        self.add_page()
+
+    def add_page(self):
+        self.pages.append([])
+        self.y = PAGE_HEIGHT - MARGIN
+
+    def ensure_space(self, height):
+        """Start a new page when less than `height` points are left above the bottom margin"""
+        if self.y - height < MARGIN:
+            self.add_page()
+
+    def new_line(self, height):
+        self.ensure_space(height)
+        self.y -= height
+
+    def text(self, x, y, text, size=10, font="regular", color="#000000", align="left"):
+        if align == "right":
+            x -= text_width(text, size)
+        elif align == "center":
+            x -= text_width(text, size) / 2
+        self.pages[-1].append(
+            f"BT {_color(color)} rg /{font} {size} Tf {x:.2f} {y:.2f} Td ({_escape(text)}) Tj ET"
+        )
+
+    def line(self, xs, ys, color="#000000", width=1.0):
+        """Draw a polyline through the points (xs[i], ys[i])"""
+        points = [f"{x:.2f} {y:.2f}" for x, y in zip(xs, ys)]
+        if len(points) < 2:
+            return
+        path = f"{points[0]} m " + " ".join(f"{point} l" for point in points[1:])
+        self.pages[-1].append(f"{_color(color)} RG {width:.2f} w {path} S")
+
+    def rect(self, x, y, width, height, color):
+        self.pages[-1].append(f"{_color(color)} rg {x:.2f} {y:.2f} {width:.2f} {height:.2f} re f")
+
+    def heading(self, text, size=14):
+        self.new_line(size + 8)
+        self.text(MARGIN, self.y, text, size=size, font="bold")
+        self.y -= 6
+
+    def paragraph(self, text, size=10, font="regular"):
+        """Write text at the cursor, wrapped to the page width"""
+        words, line = str(text).split(), ""
+        for word in words:
+            candidate = f"{line} {word}".strip()
+            if line and text_width(candidate, size) > PAGE_WIDTH - 2 * MARGIN:
+                self.new_line(size + 4)
+                self.text(MARGIN, self.y, line, size=size, font=font)
+                line = word
+            else:
+                line = candidate
+        if line:
+            self.new_line(size + 4)
+            self.text(MARGIN, self.y, line, size=size, font=font)
+
+    def table(self, columns, rows, widths, size=9):
+        """
+        Write a table at the cursor, repeating the header on every page it spans
+
+        The first column is left-aligned and the others right-aligned, as
+        suits a label followed by amounts.
+
+        Parameters:
+        columns (list): Header of each column
+        rows (list): Rows of already formatted cells
+        widths (list): Width of each column in points
+        size (int): Font size
+        """
+        row_height = size + 5
+        edges = [MARGIN]
+        for width in widths:
+            edges.append(edges[-1] + width)
+
+        def row(cells, font):
+            self.text(edges[0], self.y, cells[0], size=size, font=font)
+            for cell, right in zip(cells[1:], edges[2:]):
+                self.text(right, self.y, cell, size=size, font=font, align="right")
+
+        def header():
+            self.new_line(row_height)
+            row(columns, "bold")
+            self.line([edges[0], edges[-1]], [self.y - 3] * 2, width=0.5)
+            self.y -= 3
+
+        # Keep the header with at least the first rows
+        self.ensure_space(3 * row_height + 3)
+        header()
+        for cells in rows:
+            if self.y - row_height < MARGIN:
+                self.add_page()
+                header()
+            self.new_line(row_height)
+            row(cells, "regular")
+
+    def line_chart(self, title, x, series, height=220, x_label="", value_format="${:,.0f}"):
+        """
+        Draw a line chart at the cursor, across the page width
+
+        Parameters:
+        title (str): Chart title
+        x (numpy.ndarray): Shared x values
+        series (list): (name, y values, "#rrggbb" color) per line
+        height (int): Height of the chart including its title and legend
+        x_label (str): Label of the x axis
+        value_format (str): Format of the y axis labels
+        """
+        self.ensure_space(height)
+        top = self.y
+        self.text(MARGIN, top - 12, title, size=11, font="bold")
+
+        left, right = MARGIN + 60, PAGE_WIDTH - MARGIN
+        bottom, plot_top = top - height + 36, top - 24
+        values = [value for _, ys, _ in series for value in ys]
+        low, high = min(min(values), 0.0), max(max(values), 0.0)
+        if high == low:
+            high = low + 1.0
+        x_low, x_high = float(min(x)), float(max(x))
+        x_span = (x_high - x_low) or 1.0
+
+        def to_x(value):
+            return left + (value - x_low) / x_span * (right - left)
+
+        def to_y(value):
+            return bottom + (value - low) / (high - low) * (plot_top - bottom)
+
+        for value in _ticks(low, high):
+            self.line([left, right], [to_y(value)] * 2, color="#dddddd", width=0.5)
+            self.text(left - 4, to_y(value) - 3, value_format.format(value), size=7, align="right")
+        if low < 0 < high:
+            self.line([left, right], [to_y(0.0)] * 2, color="#888888", width=0.75)
+        for value in _ticks(x_low, x_low + x_span):
+            self.text(to_x(value), bottom - 10, f"{value:,.0f}", size=7, align="center")
+        self.text((left + right) / 2, bottom - 20, x_label, size=8, align="center")
+
+        for name, ys, color in series:
+            self.line([to_x(value) for value in x], [to_y(value) for value in ys], color=color, width=1.25)
+        legend_x = left
+        for name, _, color in series:
+            self.rect(legend_x, top - height + 4, 10, 3, color)
+            self.text(legend_x + 14, top - height + 3, name, size=8)
+            legend_x += text_width(name, 8) + 30
+
+        self.y = top - height
+
+    def to_bytes(self):
+        """Serialize the document"""
+        objects = []
+
+        def add(body):
+            objects.append(body)
+            return len(objects)
+
+        catalog = add(None)
+        pages = add(None)
+        fonts = {name: add(f"<< /Type /Font /Subtype /Type1 /BaseFont /{base} /Encoding /WinAnsiEncoding >>".encode())
+                 for name, base in FONTS.items()}
+        font_resources = " ".join(f"/{name} {number} 0 R" for name, number in fonts.items())
+
+        page_numbers = []
+        for page in self.pages:
+            content = zlib.compress("\n".join(page).encode("latin-1"))
+            stream = add(b"<< /Length %d /Filter /FlateDecode >>\nstream\n" % len(content) + content + b"\nendstream")
+            page_numbers.append(add(
+                f"<< /Type /Page /Parent {pages} 0 R /MediaBox [0 0 {PAGE_WIDTH} {PAGE_HEIGHT}] "
+                f"/Resources << /Font << {font_resources} >> >> /Contents {stream} 0 R >>".encode()
+            ))
+        objects[pages - 1] = (
+            f"<< /Type /Pages /Kids [{' '.join(f'{number} 0 R' for number in page_numbers)}] "
+            f"/Count {len(page_numbers)} >>".encode()
+        )
+        objects[catalog - 1] = f"<< /Type /Catalog /Pages {pages} 0 R >>".encode()
+        info = add(f"<< /Title ({_escape(self.title)}) /Producer (HomeDecide) >>".encode("latin-1"))
+
+        output = bytearray(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        offsets = []
+        for number, body in enumerate(objects, start=1):
+            offsets.append(len(output))
+            output += b"%d 0 obj\n" % number + body + b"\nendobj\n"
+        xref = len(output)
+        output += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+        output += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+        output += (
+            f"trailer\n<< /Size {len(objects) + 1} /Root {catalog} 0 R /Info {info} 0 R >>\n"
+            f"startxref\n{xref}\n%%EOF\n"
+        ).encode()
+        return bytes(output)
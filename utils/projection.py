@@ -0,0 +1,627 @@
+from functools import cached_property
+
+import numpy as np
+
+from utils.calculations import RatePath, calculate_mortgage_payment, growth_factors
+from utils.tax import HBP_REPAYMENT_YEARS, TaxProfile, capital_gains_tax
+from utils.timing import timed
+
+# Appreciation above this rate is capped for realism, unless another cap (or None) is given
+APPRECIATION_CAP = 4.0
+
+# Unless a maintenance inflation rate is given, maintenance grows with
+# (capped) appreciation, but never faster than this
+MAINTENANCE_GROWTH_CAP = 2.0
+
+# With a path of interest rates the mortgage renews every this many years
+# (the usual Canadian term), at the rate of the year it renews
+RENEWAL_TERM_YEARS = 5
+
+# Projections longer than LONG_TERM_YEARS get a modest discount on the final home value
+LONG_TERM_YEARS = 20
+LONG_TERM_DISCOUNT = 0.95
+
+# Version of the projection model, part of every persisted result's key;
+# bump it whenever a change alters results so stale ones are not reused
+MODEL_VERSION = 7
+
+def loan_balance(loan_amount, interest_rate, monthly_payment, months):
+    """
+    Calculate the outstanding loan balance after a number of monthly payments
+
+    Uses the closed form L * (1 + r)^k - P * ((1 + r)^k - 1) / r, clamped at
+    zero, which is what paying P every month produces. All parameters
+    broadcast.
+
+    Parameters:
+    loan_amount (float or numpy.ndarray): The total loan amount
+    interest_rate (float or numpy.ndarray): Annual interest rate (in percentage)
+    monthly_payment (float or numpy.ndarray): Monthly mortgage payment
+    months (numpy.ndarray): Number of payments made
+
+    Returns:
+    numpy.ndarray: Balance after each number of payments
+    """
+    monthly_rate = np.asarray(interest_rate) / 100 / 12
+    interest_free = monthly_rate == 0
+    monthly_rate = np.where(interest_free, 1.0, monthly_rate)
+
+    compounded = (1 + monthly_rate) ** months
+    balance = np.where(
+        interest_free,
+        loan_amount - monthly_payment * months,
+        loan_amount * compounded - (compounded - 1) * (monthly_payment / monthly_rate)
+    )
+
+    return np.maximum(balance, 0.0)
+
+def renewed_loan_balance(term_balance, term_rate, term_payment, months):
+    """
+    Calculate the outstanding balance of a loan renewed every RENEWAL_TERM_YEARS
+
+    Each renewal term k starts from its own balance, rate and monthly
+    payment, entry k along the last axis of the term arrays; a fixed-rate
+    loan is a single term lasting the whole loan.
+
+    Parameters:
+    term_balance (numpy.ndarray): Balance at the start of each term
+    term_rate (numpy.ndarray): Annual interest rate of each term (in percentage)
+    term_payment (numpy.ndarray): Monthly payment during each term
+    months (numpy.ndarray): Number of payments made, either shared by all
+        scenarios or with the scenarios' batch axes in front
+
+    Returns:
+    numpy.ndarray: Balance after each number of payments
+    """
+    months = np.asarray(months)
+    term = np.minimum(months // (12 * RENEWAL_TERM_YEARS), term_balance.shape[-1] - 1)
+
+    def pick(values):
+        if months.ndim <= 1:
+            return values[..., term]
+        return np.take_along_axis(values, term, axis=-1)
+
+    return loan_balance(
+        pick(term_balance), pick(term_rate), pick(term_payment), months - term * 12 * RENEWAL_TERM_YEARS
+    )
+
+def amortization_schedule(loan_amount, interest_rate, loan_term_years, monthly_payment):
+    """
+    Build the monthly amortization schedule
+
+    Parameters:
+    loan_amount (float or numpy.ndarray): The total loan amount
+    interest_rate (float or numpy.ndarray): Annual interest rate (in percentage)
+    loan_term_years (int or numpy.ndarray): Loan term in years
+    monthly_payment (float or numpy.ndarray): Monthly mortgage payment
+
+    Returns:
+    tuple: (balance, interest, principal) arrays, one entry per month along the last axis
+    """
+    loan_amount = np.asarray(loan_amount, dtype=float)[..., None]
+    interest_rate = np.asarray(interest_rate)[..., None]
+    monthly_payment = np.asarray(monthly_payment)[..., None]
+
+    months = np.arange(1, int(np.max(loan_term_years)) * 12 + 1)
+    balance = loan_balance(loan_amount, interest_rate, monthly_payment, months)
+
+    opening_balance = np.empty_like(balance)
+    opening_balance[..., 0] = loan_amount[..., 0]
+    opening_balance[..., 1:] = balance[..., :-1]
+    interest = opening_balance * (interest_rate / 100 / 12)
+    principal = opening_balance - balance
+
+    return balance, interest, principal
+
+def _batch_shape(value):
+    """Shape of the scenarios a projection input spans"""
+    if isinstance(value, RatePath):
+        return value.rates.shape[:-1]
+    if isinstance(value, TaxProfile):
+        return value.shape
+    return np.shape(value)
+
+def _broadcast(shape, *values):
+    """Convert values to float arrays of the batch shape"""
+    values = [np.asarray(value, dtype=float) for value in values]
+    if shape == ():
+        return values
+    return [np.broadcast_to(value, shape) for value in values]
+
+def _yearly_rates(rate, horizon, shape):
+    """Expand a scalar rate or a RatePath to one rate per year of the horizon"""
+    if isinstance(rate, RatePath):
+        rate = rate.years(horizon)
+    else:
+        rate = np.asarray(rate, dtype=float)[..., None]
+    return np.broadcast_to(rate, shape + (horizon,))
+
+def _at_term(values, loan_term_years):
+    """Pick each scenario's value in its last year along the last axis"""
+    if loan_term_years.ndim == 0:
+        return values[..., loan_term_years - 1]
+    return np.take_along_axis(values, (loan_term_years - 1)[..., None], axis=-1)[..., 0]
+
+class Projection:
+    """
+    Monthly and yearly schedules of a rent-vs-buy comparison
+
+    Yearly arrays (entry y is year y + 1 along the last axis): home_value,
+    investment_value and loan_balance at the end of the year; mortgage,
+    property_tax, maintenance and rent paid during the year;
+    buying_out_of_pocket and renting_out_of_pocket cumulative to the end of
+    the year; buying_position and renting_position, the net cost of each
+    option if the home were sold at the end of the year.
+
+    Monthly arrays (entry k is month k + 1): balance, interest and principal.
+    They are only needed for detailed breakdowns, so they are built on first
+    access. balance_after gives the balance after any number of payments,
+    through the renewal terms (term_balance, term_rate and term_payment).
+
+    For a batch of scenarios every figure gains the batch shape in front,
+    the time axis runs to the longest term, and flows past a scenario's own
+    term are zero. Summary figures are then arrays, and break_even_year is 0
+    for scenarios that never break even (None for a single scenario).
+
+    With a tax profile, buying_out_of_pocket includes the tax paid when
+    buying and investment_value is net of the capital gains tax due on
+    cashing it out; buying_tax and capital_gains_tax give their totals.
+    """
+
+    def __init__(self, **values):
+        self.__dict__.update(values)
+
+    def balance_after(self, months):
+        """Loan balance after a number of payments, see renewed_loan_balance"""
+        return renewed_loan_balance(self.term_balance, self.term_rate, self.term_payment, months)
+
+    @cached_property
+    def _amortization(self):
+        months = np.arange(1, int(np.max(self.loan_term_years)) * 12 + 1)
+        balance = self.balance_after(months)
+        opening_balance = self.balance_after(months - 1)
+        term = np.minimum((months - 1) // (12 * RENEWAL_TERM_YEARS), self.term_rate.shape[-1] - 1)
+        interest = opening_balance * (self.term_rate[..., term] / 100 / 12)
+        return balance, interest, opening_balance - balance
+
+    @property
+    def balance(self):
+        return self._amortization[0]
+
+    @property
+    def interest(self):
+        return self._amortization[1]
+
+    @property
+    def principal(self):
+        return self._amortization[2]
+
+def _growth(rate, horizon, yearly):
+    """Growth factors for years 0..horizon from one rate per scenario, or from yearly rates"""
+    return growth_factors(RatePath(rate) if yearly else rate, horizon)
+
+def _in_term(loan_term_years, horizon):
+    """Mask of the years 1..horizon that fall within each scenario's term"""
+    return np.arange(1, horizon + 1) <= loan_term_years[..., None]
+
+# The projection is built in stages, each depending only on its own inputs
+# (and on earlier stages), so callers can cache them separately: a change to
+# the rent only reruns the rent stage and the aggregation. Stage inputs are
+# float arrays of the batch shape, loan_term_years an int array, horizon the
+# number of years projected, and yearly tells whether rates carry a trailing
+# year axis (see RatePath). Stages return dicts of arrays.
+#
+# Paths cost what single rates do: growth rates are compounded into growth
+# factors with one cumulative product, and the mortgage is solved once per
+# renewal term, with the balance carried from term to term by another.
+
+@timed
+def mortgage_stage(home_price, down_payment, interest_rate, loan_term_years, horizon, yearly=False):
+    """
+    Mortgage stage: loan, monthly payment, yearly payments and balances
+
+    With yearly rates the mortgage renews every RENEWAL_TERM_YEARS at the
+    rate of its renewal year, and the payment is reset to repay the balance
+    over the rest of the amortization.
+
+    Returns:
+    dict: loan_amount, monthly_mortgage (in the first term), mortgage (paid
+        during each year), mortgage_paid (cumulative to the end of each
+        year), loan_balance (at the end of each year), and term_balance,
+        term_rate and term_payment of each renewal term
+    """
+    years = np.arange(1, horizon + 1)
+    loan_amount = home_price - down_payment
+    in_term = _in_term(loan_term_years, horizon)
+
+    if not yearly:
+        monthly_mortgage = np.asarray(calculate_mortgage_payment(loan_amount, interest_rate, loan_term_years))
+        annual_mortgage = monthly_mortgage * 12
+        return {
+            "loan_amount": loan_amount,
+            "monthly_mortgage": monthly_mortgage,
+            "mortgage": annual_mortgage[..., None] * in_term,
+            "mortgage_paid": annual_mortgage[..., None] * np.minimum(years, loan_term_years[..., None]),
+            "loan_balance": loan_balance(
+                loan_amount[..., None], interest_rate[..., None], monthly_mortgage[..., None], 12 * years
+            ),
+            "term_balance": loan_amount[..., None],
+            "term_rate": interest_rate[..., None],
+            "term_payment": monthly_mortgage[..., None],
+        }
+
+    term_starts = np.arange(0, horizon, RENEWAL_TERM_YEARS)
+    term_rate = interest_rate[..., term_starts]
+    remaining_years = loan_term_years[..., None] - term_starts
+    # Payment per dollar owed at each renewal, and the share of it still owed at the end of the term
+    payment_per_dollar = np.where(
+        remaining_years > 0, calculate_mortgage_payment(1.0, term_rate, np.maximum(remaining_years, 1)), 0.0
+    )
+    carried = loan_balance(1.0, term_rate, payment_per_dollar, 12 * RENEWAL_TERM_YEARS)
+    carried_before = np.ones_like(carried)
+    np.cumprod(carried[..., :-1], axis=-1, out=carried_before[..., 1:])
+    term_balance = loan_amount[..., None] * carried_before
+    term_payment = term_balance * payment_per_dollar
+
+    mortgage = 12 * term_payment[..., (years - 1) // RENEWAL_TERM_YEARS] * in_term
+    return {
+        "loan_amount": loan_amount,
+        "monthly_mortgage": term_payment[..., 0],
+        "mortgage": mortgage,
+        "mortgage_paid": mortgage.cumsum(axis=-1),
+        "loan_balance": renewed_loan_balance(term_balance, term_rate, term_payment, 12 * years),
+        "term_balance": term_balance,
+        "term_rate": term_rate,
+        "term_payment": term_payment,
+    }
+
+@timed
+def appreciation_stage(home_price, appreciation_rate, horizon, yearly=False, appreciation_cap=APPRECIATION_CAP):
+    """
+    Appreciation stage: the home value path
+
+    Returns:
+    dict: capped_appreciation_rate (capped at appreciation_cap unless it is
+        None), appreciation_factors (years 0..horizon) and home_value (at the
+        end of each year)
+    """
+    capped_appreciation_rate = (
+        appreciation_rate if appreciation_cap is None else np.minimum(appreciation_rate, appreciation_cap)
+    )
+    factors = _growth(capped_appreciation_rate, horizon, yearly)
+
+    return {
+        "capped_appreciation_rate": capped_appreciation_rate,
+        "appreciation_factors": factors,
+        "home_value": factors[..., 1:] * home_price[..., None],
+    }
+
+@timed
+def carrying_cost_stage(home_price, property_tax_rate, maintenance_cost, capped_appreciation_rate,
+                        appreciation_factors, loan_term_years, horizon, yearly=False,
+                        maintenance_inflation_rate=None):
+    """
+    Carrying cost stage: property tax and maintenance paid while owning
+
+    Property tax is each year's rate of the home value at the start of the
+    year. Maintenance grows at maintenance_inflation_rate, or when that is
+    None with capped appreciation, at most MAINTENANCE_GROWTH_CAP.
+
+    Returns:
+    dict: monthly_property_tax, monthly_maintenance (both in the first
+        year), property_tax and maintenance (paid during each year) and
+        their cumulative sums
+    """
+    in_term = _in_term(loan_term_years, horizon)
+    if maintenance_inflation_rate is None:
+        maintenance_inflation_rate = np.minimum(capped_appreciation_rate, MAINTENANCE_GROWTH_CAP)
+    maintenance_factors = _growth(maintenance_inflation_rate, horizon, yearly)
+    tax_rate = property_tax_rate if yearly else property_tax_rate[..., None]
+    property_tax = appreciation_factors[..., :-1] * (home_price[..., None] * tax_rate / 100) * in_term
+    maintenance = maintenance_factors[..., :-1] * maintenance_cost[..., None] * in_term
+
+    return {
+        "monthly_property_tax": home_price * tax_rate[..., 0] / 100 / 12,
+        "monthly_maintenance": maintenance_cost / 12,
+        "property_tax": property_tax,
+        "maintenance": maintenance,
+        "cumulative_property_tax": property_tax.cumsum(axis=-1),
+        "cumulative_maintenance": maintenance.cumsum(axis=-1),
+    }
+
+@timed
+def rent_stage(monthly_rent, rent_increase_rate, loan_term_years, horizon, yearly=False):
+    """
+    Rent stage: rent paid while renting
+
+    Returns:
+    dict: rent (paid during each year) and renting_out_of_pocket (cumulative)
+    """
+    rent = (
+        _growth(rent_increase_rate, horizon, yearly)[..., :-1] * (monthly_rent * 12)[..., None]
+        * _in_term(loan_term_years, horizon)
+    )
+    return {"rent": rent, "renting_out_of_pocket": rent.cumsum(axis=-1)}
+
+@timed
+def investment_stage(down_payment, investment_return_rate, horizon, yearly=False):
+    """
+    Investment stage: the down payment invested instead of spent
+
+    Returns:
+    dict: investment_value (at the end of each year)
+    """
+    factors = _growth(investment_return_rate, horizon, yearly)
+    return {"investment_value": factors[..., 1:] * down_payment[..., None]}
+
+@timed
+def tax_stage(tax_profile, down_payment, investment_value, loan_term_years, horizon):
+    """
+    Tax stage: income tax that differs between the options (see utils.tax)
+
+    Returns:
+    dict: capital_gains_tax (due on the investment gain if cashed out at
+        the end of each year) and buying_tax (cumulative to the end of each
+        year: HBP repayments added to income, less the FHSA refund)
+    """
+    schedule = tax_profile.schedule[..., None]
+    income = tax_profile.annual_income[..., None]
+    gain = investment_value - down_payment[..., None]
+
+    fhsa, hbp = tax_profile.registered_amounts(down_payment)
+    years = np.arange(1, horizon + 1)
+    # Repayments stop at the end of each scenario's own term, however long the batch runs
+    repayment_years = (years >= 2) & (years <= HBP_REPAYMENT_YEARS + 1) & (years <= loan_term_years[..., None])
+    hbp_tax = tax_profile.hbp_yearly_tax(hbp)[..., None] * repayment_years
+    taxed = tax_profile.taxed[..., None]
+
+    return {
+        "capital_gains_tax": np.where(taxed, capital_gains_tax(gain, income, schedule), 0.0),
+        "buying_tax": np.where(taxed, hbp_tax.cumsum(axis=-1) - tax_profile.fhsa_refund(fhsa)[..., None], 0.0),
+    }
+
+@timed
+def aggregate_projection(home_price, down_payment, interest_rate, loan_term_years, selling_cost_percent,
+                         mortgage, appreciation, carrying_costs, rent, investment, tax=None):
+    """
+    Final stage: combine the stages into net positions, break-even and totals
+
+    Parameters:
+    home_price, down_payment, interest_rate, selling_cost_percent (numpy.ndarray): Scenario inputs
+    loan_term_years (numpy.ndarray): Loan term in years
+    mortgage ... investment (dict): Outputs of the earlier stages
+    tax (dict): Output of tax_stage, None to leave tax out
+
+    Returns:
+    Projection: Schedules and summary figures
+    """
+    single = loan_term_years.ndim == 0
+    years = np.arange(1, mortgage["loan_balance"].shape[-1] + 1)
+    in_term = years <= loan_term_years[..., None]
+    home_value = appreciation["home_value"]
+    investment_value = investment["investment_value"]
+    year_end_balance = mortgage["loan_balance"]
+    renting_out_of_pocket = rent["renting_out_of_pocket"]
+    cumulative_property_tax = carrying_costs["cumulative_property_tax"]
+    cumulative_maintenance = carrying_costs["cumulative_maintenance"]
+
+    buying_out_of_pocket = (
+        cumulative_property_tax + cumulative_maintenance
+        + (down_payment[..., None] + mortgage["mortgage_paid"])
+    )
+    # Tax is paid out of pocket when buying, and on the investment when cashing it out
+    if tax is not None:
+        buying_out_of_pocket = buying_out_of_pocket + tax["buying_tax"]
+        investment_value = investment_value - tax["capital_gains_tax"]
+
+    # Net economic positions if selling at the end of each year
+    buying_position = (
+        buying_out_of_pocket - home_value * (1 - selling_cost_percent[..., None] / 100) + year_end_balance
+    )
+    renting_position = renting_out_of_pocket - investment_value + down_payment[..., None]
+
+    # A lower position is better (less net cost)
+    buying_wins = (buying_position < renting_position) & in_term
+    first_win = buying_wins.argmax(axis=-1)
+    break_even_year = np.where(buying_wins.any(axis=-1), first_win + 1, 0)
+
+    # Final figures over the whole term; flows are zero past each scenario's
+    # term, so the cumulative series hold their final values in the last column
+    total_buying_cost = buying_out_of_pocket[..., -1]
+    final_home_value = _at_term(home_value, loan_term_years)
+    final_home_value = final_home_value * np.where(loan_term_years > LONG_TERM_YEARS, LONG_TERM_DISCOUNT, 1.0)
+    selling_costs = final_home_value * selling_cost_percent / 100
+    net_home_sale_proceeds = final_home_value - selling_costs
+
+    total_renting_cost = renting_out_of_pocket[..., -1]
+    final_investment_value = _at_term(investment_value, loan_term_years)
+    investment_gain = final_investment_value - down_payment
+
+    monthly_mortgage = mortgage["monthly_mortgage"]
+    monthly_property_tax = carrying_costs["monthly_property_tax"]
+    capped_appreciation_rate = appreciation["capped_appreciation_rate"]
+    if capped_appreciation_rate.ndim > loan_term_years.ndim:
+        # A path is summed up by its average over the term
+        capped_appreciation_rate = (capped_appreciation_rate * in_term).sum(axis=-1) / loan_term_years
+    monthly_maintenance = carrying_costs["monthly_maintenance"]
+
+    summary = dict(
+        loan_amount=mortgage["loan_amount"],
+        monthly_mortgage=monthly_mortgage,
+        monthly_property_tax=monthly_property_tax,
+        monthly_maintenance=monthly_maintenance,
+        total_monthly_buying=monthly_mortgage + monthly_property_tax + monthly_maintenance,
+        cumulative_mortgage=mortgage["mortgage_paid"][..., -1],
+        cumulative_property_tax=cumulative_property_tax[..., -1],
+        cumulative_maintenance=cumulative_maintenance[..., -1],
+        total_buying_cost=total_buying_cost,
+        final_home_value=final_home_value,
+        selling_costs=selling_costs,
+        net_home_sale_proceeds=net_home_sale_proceeds,
+        net_buying_cost=total_buying_cost - net_home_sale_proceeds,
+        total_renting_cost=total_renting_cost,
+        final_investment_value=final_investment_value,
+        investment_gain=investment_gain,
+        adjusted_renting_cost=total_renting_cost - investment_gain,
+        buying_tax=np.zeros_like(total_buying_cost) if tax is None else tax["buying_tax"][..., -1],
+        capital_gains_tax=(
+            np.zeros_like(total_buying_cost) if tax is None else _at_term(tax["capital_gains_tax"], loan_term_years)
+        ),
+    )
+    if single:
+        summary = {name: float(value) for name, value in summary.items()}
+        break_even_year = int(break_even_year) or None
+        loan_term_years = int(loan_term_years)
+        if capped_appreciation_rate.ndim == 0:
+            capped_appreciation_rate = float(capped_appreciation_rate)
+
+    return Projection(
+        interest_rate=interest_rate,
+        capped_appreciation_rate=capped_appreciation_rate,
+        loan_term_years=loan_term_years,
+        home_value=home_value,
+        loan_balance=year_end_balance,
+        term_balance=mortgage["term_balance"],
+        term_rate=mortgage["term_rate"],
+        term_payment=mortgage["term_payment"],
+        mortgage=mortgage["mortgage"],
+        property_tax=carrying_costs["property_tax"],
+        maintenance=carrying_costs["maintenance"],
+        rent=rent["rent"],
+        investment_value=investment_value,
+        buying_out_of_pocket=buying_out_of_pocket,
+        renting_out_of_pocket=renting_out_of_pocket,
+        buying_position=buying_position,
+        renting_position=renting_position,
+        break_even_year=break_even_year,
+        **summary
+    )
+
+@timed
+def build_projection(home_price, down_payment, interest_rate, loan_term_years,
+                     property_tax_rate, maintenance_cost, appreciation_rate,
+                     monthly_rent, rent_increase_rate, investment_return_rate,
+                     selling_cost_percent=0.0, maintenance_inflation_rate=None,
+                     appreciation_cap=APPRECIATION_CAP, tax_profile=None):
+    """
+    Build the full rent-vs-buy projection in one pass
+
+    Every yearly series is a starting amount times a row of compounded growth
+    factors, so the whole horizon is computed with a handful of array
+    operations instead of year-by-year loops. All parameters broadcast, so a
+    batch of scenarios is projected in the same pass.
+
+    Rates may also be given per year as a RatePath (a custom inflation
+    scenario). A path of interest rates is applied at each renewal, every
+    RENEWAL_TERM_YEARS, and a path of property tax rates year by year.
+
+    Parameters:
+    home_price (float or numpy.ndarray): Home price
+    down_payment (float or numpy.ndarray): Down payment amount
+    interest_rate (float, numpy.ndarray or RatePath): Annual interest rate (percentage)
+    loan_term_years (int or numpy.ndarray): Loan term in years, also the comparison horizon
+    property_tax_rate (float, numpy.ndarray or RatePath): Annual property tax rate (percentage)
+    maintenance_cost (float or numpy.ndarray): First-year maintenance cost
+    appreciation_rate (float, numpy.ndarray or RatePath): Annual home appreciation rate (percentage)
+    monthly_rent (float or numpy.ndarray): Initial monthly rent
+    rent_increase_rate (float, numpy.ndarray or RatePath): Annual rent increase rate (percentage)
+    investment_return_rate (float, numpy.ndarray or RatePath): Annual return on the invested
+        down payment (percentage)
+    selling_cost_percent (float or numpy.ndarray): Selling costs as a percentage of the sale price, 0 to ignore
+    maintenance_inflation_rate (float, numpy.ndarray or RatePath): Annual growth of maintenance
+        (percentage), None to grow it with capped appreciation up to MAINTENANCE_GROWTH_CAP
+    appreciation_cap (float): Highest appreciation rate used (percentage), None for no cap
+    tax_profile (TaxProfile): Income and province to apply Canadian income tax with, None to leave tax out
+
+    Returns:
+    Projection: Schedules and summary figures
+    """
+    rates = (interest_rate, property_tax_rate, appreciation_rate, rent_increase_rate,
+             investment_return_rate, maintenance_inflation_rate)
+    yearly = any(isinstance(rate, RatePath) for rate in rates)
+
+    inputs = (home_price, down_payment, maintenance_cost, monthly_rent, selling_cost_percent, loan_term_years)
+    shape = np.broadcast_shapes(*(_batch_shape(value) for value in inputs + rates + (tax_profile,)))
+    home_price, down_payment, maintenance_cost, monthly_rent, selling_cost_percent = _broadcast(shape, *inputs[:-1])
+    loan_term_years = np.broadcast_to(np.asarray(loan_term_years, dtype=int), shape)
+
+    # Time axis runs to the longest term; later years are masked per scenario.
+    # With any path, every rate is spread over the years
+    horizon = int(loan_term_years.max())
+    rates = [
+        None if rate is None else _yearly_rates(rate, horizon, shape) if yearly else _broadcast(shape, rate)[0]
+        for rate in rates
+    ]
+    (interest_rate, property_tax_rate, appreciation_rate, rent_increase_rate,
+     investment_return_rate, maintenance_inflation_rate) = rates
+
+    appreciation = appreciation_stage(home_price, appreciation_rate, horizon, yearly, appreciation_cap)
+    investment = investment_stage(down_payment, investment_return_rate, horizon, yearly)
+    return aggregate_projection(
+        home_price, down_payment, interest_rate, loan_term_years, selling_cost_percent,
+        mortgage=mortgage_stage(home_price, down_payment, interest_rate, loan_term_years, horizon, yearly),
+        appreciation=appreciation,
+        carrying_costs=carrying_cost_stage(
+            home_price, property_tax_rate, maintenance_cost, appreciation["capped_appreciation_rate"],
+            appreciation["appreciation_factors"], loan_term_years, horizon, yearly, maintenance_inflation_rate
+        ),
+        rent=rent_stage(monthly_rent, rent_increase_rate, loan_term_years, horizon, yearly),
+        investment=investment,
+        tax=None if tax_profile is None else tax_stage(
+            tax_profile, down_payment, investment["investment_value"], loan_term_years, horizon
+        ),
+    )
+
+def _monthly(values, initial, geometric):
+    """Spread end-of-year values over months 0..12 * years, starting from initial"""
+    starts = np.concatenate((np.broadcast_to(initial, values.shape[:-1])[..., None], values[..., :-1]), axis=-1)
+    starts, ends = starts[..., None], values[..., None]
+    months_into_year = np.arange(1, 13) / 12
+    if geometric:
+        ratio = np.divide(ends, starts, out=np.ones_like(ends), where=starts != 0)
+        monthly = starts * ratio ** months_into_year
+    else:
+        monthly = starts + (ends - starts) * months_into_year
+    monthly = monthly.reshape(values.shape[:-1] + (-1,))
+    return np.concatenate((starts[..., :1, 0], monthly), axis=-1)
+
+def monthly_positions(projection, home_price, down_payment, selling_cost_percent=0.0):
+    """
+    Spread a projection's yearly figures over every month of the term
+
+    Interpolates within each year as find_break_even does: payments accrue
+    monthly, the loan follows its amortization, and home and investment
+    values grow geometrically, so month 12 * y matches the end of year y.
+    Batch projections keep their batch axes in front.
+
+    Parameters:
+    projection (Projection): Projection to spread
+    home_price, down_payment, selling_cost_percent (float or numpy.ndarray): Scenario inputs
+        the projection was built from
+
+    Returns:
+    dict: months (0 to 12 * years), and per month home_value, loan_balance,
+        equity (home value minus balance), buying_position and
+        renting_position (net cost of each option if sold that month)
+    """
+    home_price, down_payment, selling_cost_percent = (
+        np.asarray(value, dtype=float) for value in (home_price, down_payment, selling_cost_percent)
+    )
+    months = np.arange(projection.home_value.shape[-1] * 12 + 1)
+
+    home_value = _monthly(projection.home_value, home_price, geometric=True)
+    investment_value = _monthly(projection.investment_value, down_payment, geometric=True)
+    buying_out_of_pocket = _monthly(projection.buying_out_of_pocket, down_payment, geometric=False)
+    renting_out_of_pocket = _monthly(projection.renting_out_of_pocket, 0.0, geometric=False)
+    balance = projection.balance_after(months)
+
+    return {
+        "months": months,
+        "home_value": home_value,
+        "loan_balance": balance,
+        "equity": home_value - balance,
+        "buying_position": (
+            buying_out_of_pocket - home_value * (1 - selling_cost_percent[..., None] / 100) + balance
+        ),
+        "renting_position": renting_out_of_pocket - investment_value + down_payment[..., None],
+    }
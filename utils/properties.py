@@ -0,0 +1,109 @@
+"""
+Side-by-side comparison of candidate properties
+
+Each candidate is a row with its own price and location, and optionally its
+own bedrooms, rent, taxes and any other comparison input; the buyer's
+inputs (income, down payment, rates, term, tax) are shared by all of them.
+Blank rents are looked up for every candidate at once, and all candidates
+are compared in one vectorized run_comparison call, so a ranking of a few
+hundred properties takes milliseconds.
+"""
+import numpy as np
+import pandas as pd
+
+from utils.batch import fill_missing_rents
+from utils.calculations import RatePath
+from utils.comparison import run_comparison
+from utils.timing import timed
+
+# Most candidates compared at once
+MAX_PROPERTIES = 500
+
+# Comparison inputs a candidate may set for itself; blanks take the shared value
+PROPERTY_INPUTS = [
+    "home_price", "monthly_rent", "property_tax_rate", "maintenance_cost", "appreciation_rate",
+    "selling_cost_percent", "rent_increase_rate", "investment_return_rate", "maintenance_inflation_rate",
+    "down_payment_percent", "interest_rate", "loan_term_years", "monthly_income",
+]
+
+# Columns describing a candidate, copied to the ranking when given
+LABEL_COLUMNS = ["name", "city", "neighbourhood", "postal_code", "bedrooms"]
+
+# Columns of the ranking after its rank and the labels
+RANKING_COLUMNS = [
+    "home_price", "monthly_rent", "monthly_mortgage", "mortgage_affordability", "total_monthly_buying",
+    "net_buying_cost", "adjusted_renting_cost", "buying_advantage", "break_even_year", "cheaper_option",
+]
+
+def _input(properties, name, shared):
+    """A candidate column with blanks taking the shared value, or the shared value for all"""
+    if name not in properties:
+        return shared
+    values = properties[name].astype(float).to_numpy()
+    blank = np.isnan(values)
+    if not blank.any():
+        return values
+    if shared is None:
+        raise ValueError(f"Some properties are missing {name}")
+    if isinstance(shared, RatePath):
+        # Candidates with their own rate keep it every year, the others follow the shared path
+        return RatePath(np.where(blank[:, None], shared.rates, values[:, None]))
+    return np.where(blank, shared, values)
+
+@timed
+def compare_properties(properties, **shared):
+    """
+    Rank candidate properties by how much buying beats renting
+
+    Parameters:
+    properties (pandas.DataFrame): One candidate per row, with home_price and
+        either monthly_rent or an area (city, optionally neighbourhood or
+        postal_code) and bedrooms to look it up; optionally a name and any of
+        PROPERTY_INPUTS
+    **shared: Keyword arguments of utils.comparison.run_comparison for the
+        inputs the candidates do not set, rates optionally as RatePath
+
+    Returns:
+    pandas.DataFrame: A rank, the candidates' labels and RANKING_COLUMNS, sorted by
+        buying_advantage (adjusted renting cost minus net buying cost), from
+        rank 1 down; candidates whose rent could not be found come last, with
+        missing figures and no rank
+    """
+    if len(properties) > MAX_PROPERTIES:
+        raise ValueError(f"At most {MAX_PROPERTIES} properties can be compared at once")
+    if "home_price" not in properties:
+        raise ValueError("Properties need a home_price")
+
+    properties = fill_missing_rents(properties.reset_index(drop=True))
+    labels = [name for name in LABEL_COLUMNS if name in properties]
+    monthly_rent = properties["monthly_rent"].astype(float).to_numpy()
+    priced = ~np.isnan(monthly_rent)
+
+    figures = {name: np.full(len(properties), np.nan) for name in RANKING_COLUMNS[2:]}
+    figures["cheaper_option"] = np.full(len(properties), None, dtype=object)
+    if priced.any():
+        candidates = properties[priced]
+        inputs = {name: _input(candidates, name, shared.get(name)) for name in PROPERTY_INPUTS}
+        inputs["loan_term_years"] = np.asarray(inputs["loan_term_years"]).astype(int)
+        comparison = run_comparison(**{**shared, **inputs})
+        comparison["buying_advantage"] = comparison["adjusted_renting_cost"] - comparison["net_buying_cost"]
+        for name, values in figures.items():
+            values[priced] = np.broadcast_to(comparison[name], priced.sum())
+
+    # Best for buying first; candidates without a rent last, keeping their order
+    order = np.argsort(-np.nan_to_num(figures["buying_advantage"], nan=-np.inf), kind="stable")
+    rank = pd.array(np.arange(1, len(order) + 1), dtype="Int64")
+    rank[~priced[order]] = pd.NA
+    # Candidates that never break even have no break-even year
+    break_even_year = pd.array(figures.pop("break_even_year")[order], dtype="Int64")
+    break_even_year[break_even_year == 0] = pd.NA
+
+    ranking = pd.DataFrame({
+        "rank": rank,
+        **{name: properties[name].to_numpy()[order] for name in labels},
+        "home_price": properties["home_price"].astype(float).to_numpy()[order],
+        "monthly_rent": monthly_rent[order],
+        **{name: values[order] for name, values in figures.items()},
+    })
+    ranking.insert(len(ranking.columns) - 1, "break_even_year", break_even_year)
+    return ranking
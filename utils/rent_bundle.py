@@ -0,0 +1,255 @@
+"""
+Binary rent table: one .npy file per column, memory-mapped on load
+
+Usage:
+    python -m utils.rent_bundle data/rent_data.csv
+    python -m utils.rent_bundle --benchmark 1000000
+
+The bundle is a directory next to the CSV (data/rent_data.bundle for
+data/rent_data.csv). The area columns (province, city, neighbourhood,
+postal prefix) are dictionary-encoded: a sorted array of distinct names plus
+an integer code per row. utils.data_handler builds its index straight from
+the memory-mapped arrays, without parsing or copying them; loading a bundle
+needs only NumPy, so pandas is imported by the functions that write one.
+
+manifest.json records the size and mtime of the CSV the bundle was
+converted from. When the CSV has changed since, the bundle is stale and the
+CSV is read instead. Column files carry a token that changes on every
+write, and the manifest is replaced last, so a reader never mixes columns
+from two versions.
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+import uuid
+
+import numpy as np
+
+from utils.rent_index import LEVELS
+
+BUNDLE_FORMAT = 1
+MANIFEST_NAME = "manifest.json"
+
+def bundle_path(csv_path):
+    """Get the bundle directory that goes with a rent CSV"""
+    return os.path.splitext(csv_path)[0] + ".bundle"
+
+def _source_stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+def encode_rent_table(rent_data):
+    """
+    Dictionary-encode the area columns and sort the rows
+
+    Each area column present (see utils.rent_index.LEVELS) becomes a sorted
+    array of distinct names, <column>_names, and a code per row,
+    <column>_codes, with -1 where the row leaves it blank. Postal prefixes
+    are normalized to uppercase without spaces. Rows are sorted by area and
+    bedrooms, keeping the first of duplicated rows. Rows without any area or
+    without a bedroom count are dropped.
+
+    Parameters:
+    rent_data (pandas.DataFrame): Rent table with bedrooms, at least one area
+        column and numeric columns such as average_rent
+
+    Returns:
+    dict: The name and code arrays of each area column, and one array per other column
+    """
+    import pandas as pd
+
+    levels = [level for level in LEVELS if level in rent_data.columns]
+    areas = rent_data[levels].astype("string")
+    if "postal_prefix" in levels:
+        areas["postal_prefix"] = areas["postal_prefix"].str.replace(r"\s+", "", regex=True).str.upper()
+    areas = areas.apply(lambda column: column.str.strip()).replace("", pd.NA)
+
+    keep = (areas.notna().any(axis=1) & rent_data["bedrooms"].notna()).to_numpy()
+    areas = areas[keep]
+    rent_data = rent_data[keep]
+    bedrooms = rent_data["bedrooms"].to_numpy().astype(np.int64)
+
+    columns = {}
+    for level in levels:
+        codes, level_names = pd.factorize(areas[level], sort=True)
+        columns[f"{level}_names"] = np.asarray(level_names, dtype=str)
+        columns[f"{level}_codes"] = codes
+
+    # Sort by area from the coarsest level, then bedrooms; np.lexsort sorts by its last key first
+    order = np.lexsort([bedrooms] + [columns[f"{level}_codes"] for level in reversed(levels)])
+    keys = [columns[f"{level}_codes"][order] for level in levels] + [bedrooms[order]]
+    first = np.ones(len(order), dtype=bool)
+    if len(order):
+        first[1:] = np.any([key[1:] != key[:-1] for key in keys], axis=0)
+    rows = order[first]
+
+    for level in levels:
+        columns[f"{level}_codes"] = columns[f"{level}_codes"][rows].astype(np.int32)
+    columns["bedrooms"] = bedrooms[rows]
+    for name in rent_data.columns:
+        if name not in levels and name != "bedrooms":
+            columns[name] = rent_data[name].to_numpy()[rows]
+    return columns
+
+def write_rent_bundle(rent_data, directory, source_path=None):
+    """
+    Write a rent table as a bundle
+
+    Parameters:
+    rent_data (pandas.DataFrame): Rent table with city, bedrooms and numeric columns
+    directory (str): Bundle directory, created if needed
+    source_path (str): CSV the table was read from; the bundle is stale once it changes
+    """
+    columns = encode_rent_table(rent_data)
+    os.makedirs(directory, exist_ok=True)
+    token = uuid.uuid4().hex[:12]
+
+    files = {}
+    for name, values in columns.items():
+        files[name] = f"{name}.{token}.npy"
+        np.save(os.path.join(directory, files[name]), values, allow_pickle=False)
+
+    manifest = {
+        "format": BUNDLE_FORMAT,
+        "rows": len(columns["bedrooms"]),
+        "columns": files,
+        "source": _source_stat(source_path) if source_path else None,
+    }
+    temporary = os.path.join(directory, f"{MANIFEST_NAME}.{token}.tmp")
+    with open(temporary, "w") as manifest_file:
+        json.dump(manifest, manifest_file, indent=2)
+    os.replace(temporary, os.path.join(directory, MANIFEST_NAME))
+
+    # Readers that mapped the old columns keep them until they let go
+    current = set(files.values()) | {MANIFEST_NAME}
+    for name in os.listdir(directory):
+        if name not in current and (name.endswith(".npy") or name.endswith(".tmp")):
+            try:
+                os.remove(os.path.join(directory, name))
+            except OSError:
+                pass
+
+def load_rent_bundle(directory, source_path=None):
+    """
+    Memory-map a rent bundle
+
+    Parameters:
+    directory (str): Bundle directory
+    source_path (str): CSV the bundle must be up to date with, if it exists
+
+    Returns:
+    dict: Read-only column arrays as from encode_rent_table, or None when the
+        bundle is missing, unreadable or older than the CSV
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as manifest_file:
+            manifest = json.load(manifest_file)
+        if manifest.get("format") != BUNDLE_FORMAT:
+            return None
+
+        source = _source_stat(source_path) if source_path else None
+        if source is not None and manifest.get("source") != source:
+            return None
+
+        # Plain ndarray views of the maps, as slicing a numpy.memmap is several times slower
+        columns = {
+            name: np.asarray(np.load(os.path.join(directory, file_name), mmap_mode="r", allow_pickle=False))
+            for name, file_name in manifest["columns"].items()
+        }
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
+
+    if any(len(values) != manifest["rows"] for name, values in columns.items() if not name.endswith("_names")):
+        return None
+    return columns
+
+def convert_rent_csv(csv_path, directory=None):
+    """
+    Convert a rent CSV to a bundle
+
+    Parameters:
+    csv_path (str): Rent table CSV
+    directory (str): Bundle directory, by default from bundle_path
+
+    Returns:
+    str: The bundle directory
+    """
+    import pandas as pd
+
+    directory = directory or bundle_path(csv_path)
+    write_rent_bundle(pd.read_csv(csv_path), directory, source_path=csv_path)
+    return directory
+
+def benchmark(rows, repeat=5):
+    """
+    Time loading a synthetic rent table from CSV and from a bundle
+
+    Parameters:
+    rows (int): Rows in the table
+    repeat (int): Loads timed per format; the best time is reported
+
+    Returns:
+    dict: Best load times in seconds for csv, bundle and bundle_index
+        (bundle load plus building the RentStore index)
+    """
+    import pandas as pd
+
+    from utils.data_handler import RentStore
+
+    rng = np.random.default_rng(0)
+    areas = max(rows // 5, 1)
+    rent_data = pd.DataFrame({
+        "city": np.char.add("Area ", np.arange(areas).astype(str))[rng.integers(0, areas, rows)],
+        "bedrooms": rng.integers(0, 6, rows),
+        "average_rent": rng.integers(800, 5000, rows),
+        "p25_rent": rng.integers(600, 4000, rows),
+        "p75_rent": rng.integers(1000, 6000, rows),
+        "listings": rng.integers(5, 500, rows),
+    })
+
+    def best(load):
+        times = []
+        for _ in range(repeat):
+            start = time.perf_counter()
+            load()
+            times.append(time.perf_counter() - start)
+        return min(times)
+
+    with tempfile.TemporaryDirectory() as directory:
+        csv_path = os.path.join(directory, "rent_data.csv")
+        rent_data.to_csv(csv_path, index=False)
+        convert_rent_csv(csv_path)
+        return {
+            "rows": rows,
+            "csv": best(lambda: pd.read_csv(csv_path)),
+            "bundle": best(lambda: load_rent_bundle(bundle_path(csv_path), csv_path)),
+            "bundle_index": best(lambda: RentStore(csv_path).refresh(force=True)),
+        }
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert the rent table CSV to a memory-mappable bundle")
+    parser.add_argument("csv", nargs="?", default="data/rent_data.csv", help="Rent table CSV")
+    parser.add_argument("-o", "--output", help="Bundle directory (default: next to the CSV)")
+    parser.add_argument("--benchmark", type=int, metavar="ROWS",
+                        help="Instead of converting, time CSV and bundle loads of a synthetic table")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        report = benchmark(args.benchmark)
+        print(f"{report['rows']:,} rows: CSV {report['csv'] * 1000:.1f} ms, "
+              f"bundle {report['bundle'] * 1000:.2f} ms, "
+              f"bundle with index {report['bundle_index'] * 1000:.1f} ms")
+        return 0
+
+    directory = convert_rent_csv(args.csv, args.output)
+    print(f"Wrote {directory}", file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,287 @@
+"""
+Hierarchical rent index: province -> city -> neighbourhood -> postal prefix
+
+Every row of the rent table belongs to the most specific area it names, and
+the coarser columns of the row say which areas contain it. A lookup starts
+at the most specific area it is given and answers with, in order:
+
+1. the rent for the exact bedroom count in that area or, failing that, in
+   the closest enclosing area that has it;
+2. otherwise the rent for the nearest bedroom count (ties going to the
+   smaller unit) in the most specific of those areas that has any rent.
+
+Both fallbacks are resolved for every area and bedroom count when the index
+is built, into dense area x bedroom arrays, so a lookup is a few dictionary
+gets and one array read; answers are then remembered per area and bedrooms.
+"""
+import numpy as np
+
+# Area levels from the coarsest to the most specific, named as the table columns
+LEVELS = ["province", "city", "neighbourhood", "postal_prefix"]
+
+# Rows with more bedrooms are left out, to bound the size of the resolved arrays
+MAX_BEDROOMS = 10
+
+# Answered lookups remembered per index
+RESULT_MEMO_SIZE = 100000
+
+def normalize_postal_code(postal_code):
+    """Uppercase a postal code or prefix and drop its spaces, e.g. "m5v 2t6" -> "M5V2T6" """
+    return str(postal_code).replace(" ", "").upper()
+
+def _first_valid(*candidates):
+    """Per row, the first candidate array entry that is not -1"""
+    result = np.full(len(candidates[0]), -1, dtype=np.int64)
+    for candidate in reversed(candidates):
+        result = np.where(candidate >= 0, candidate, result)
+    return result
+
+def _nearest_columns(has_rent):
+    """
+    For each area and bedroom column, the nearest column holding a rent
+
+    Ties go to the smaller bedroom count; -1 where the area has no rent at all.
+    """
+    areas, width = has_rent.shape
+    columns = np.arange(width)
+    # Closest filled column at or below / at or above each column
+    below = np.maximum.accumulate(np.where(has_rent, columns, -1), axis=1)
+    above = np.minimum.accumulate(np.where(has_rent, columns, width)[:, ::-1], axis=1)[:, ::-1]
+
+    use_below = (below >= 0) & ((above == width) | (columns - below <= above - columns))
+    nearest = np.where(use_below, below, above)
+    return np.where(nearest == width, -1, nearest)
+
+class RentIndex:
+    """
+    Rent estimates by area and bedroom count, with hierarchical fallback
+
+    Built once from the rent table columns (see utils.rent_bundle); lookups
+    never touch the table again.
+    """
+
+    def __init__(self, columns):
+        rows = len(columns["bedrooms"])
+        bedrooms = np.asarray(columns["bedrooms"], dtype=np.int64)
+        rents = np.asarray(columns["average_rent"])
+        self.integer_rents = np.issubdtype(rents.dtype, np.integer)
+
+        names = {level: columns.get(f"{level}_names", np.array([], dtype=str)) for level in LEVELS}
+        codes = {
+            level: np.asarray(columns[f"{level}_codes"], dtype=np.int64)
+            if f"{level}_codes" in columns else np.full(rows, -1, dtype=np.int64)
+            for level in LEVELS
+        }
+
+        # Areas of each level as codes from 0; neighbourhoods are only unique
+        # within their city, so they are coded by (city, neighbourhood) pair
+        neighbourhoods = np.full(rows, -1, dtype=np.int64)
+        named = np.flatnonzero(codes["neighbourhood"] >= 0)
+        pairs = (codes["city"][named] + 1) * max(len(names["neighbourhood"]), 1) + codes["neighbourhood"][named]
+        pair_keys, neighbourhoods[named] = np.unique(pairs, return_inverse=True)
+        keys = {
+            "province": (codes["province"], len(names["province"])),
+            "city": (codes["city"], len(names["city"])),
+            "neighbourhood": (neighbourhoods, len(pair_keys)),
+            "postal_prefix": (codes["postal_prefix"], len(names["postal_prefix"])),
+        }
+
+        offset = 0
+        row_areas = {}
+        first_rows = {}
+        self._bounds = []
+        for level in LEVELS:
+            level_keys, size = keys[level]
+            present = np.flatnonzero(level_keys >= 0)
+            # First row of each code; written in reverse so the first row wins
+            first = np.full(size, -1, dtype=np.int64)
+            first[level_keys[present][::-1]] = present[::-1]
+            used = first >= 0
+            local = np.cumsum(used) - 1
+
+            row_area = np.full(rows, -1, dtype=np.int64)
+            row_area[present] = offset + local[level_keys[present]]
+            row_areas[level] = row_area
+            first_rows[level] = first[used]
+            self._bounds.append((offset, offset + int(used.sum())))
+            offset = self._bounds[-1][1]
+        area_count = offset
+
+        # Each area's parent is the closest coarser area named on its first row
+        parents = np.full(area_count, -1, dtype=np.int64)
+        for depth, level in enumerate(LEVELS[1:], start=1):
+            start, end = self._bounds[depth]
+            coarser = _first_valid(*(row_areas[name] for name in reversed(LEVELS[:depth])))
+            parents[start:end] = coarser[first_rows[level]]
+
+        area_levels = np.zeros(area_count, dtype=np.int8)
+        for depth, (start, end) in enumerate(self._bounds):
+            area_levels[start:end] = depth
+
+        # Rents per area and bedroom count; the last column stands for any
+        # count above the largest in the table
+        own_areas = _first_valid(*(row_areas[level] for level in reversed(LEVELS)))
+        usable = (own_areas >= 0) & (bedrooms >= 0) & (bedrooms <= MAX_BEDROOMS)
+        width = int(bedrooms[usable].max()) + 2 if usable.any() else 1
+        exact = np.full((area_count, width), np.nan)
+        # Reversed so that the first of duplicated rows is written last and wins
+        exact[own_areas[usable][::-1], bedrooms[usable][::-1]] = rents[usable][::-1]
+        has_rent = ~np.isnan(exact)
+
+        nearest_column = _nearest_columns(has_rent)
+        has_any = nearest_column[:, 0] >= 0
+        area_ids = np.arange(area_count)[:, None]
+        bedroom_columns = np.broadcast_to(np.arange(width), (area_count, width))
+
+        # Walk the levels from the coarsest, so parents are resolved before their children
+        exact_rent = np.full((area_count, width), np.nan)
+        exact_area = np.full((area_count, width), -1, dtype=np.int64)
+        nearest_rent = np.full((area_count, width), np.nan)
+        nearest_area = np.full((area_count, width), -1, dtype=np.int64)
+        nearest_bedrooms = np.full((area_count, width), -1, dtype=np.int64)
+        for start, end in self._bounds:
+            own = slice(start, end)
+            parent = parents[own]
+            has_parent = (parent >= 0)[:, None]
+            parent = np.maximum(parent, 0)
+
+            exact_rent[own] = np.where(has_rent[own], exact[own], np.where(has_parent, exact_rent[parent], np.nan))
+            exact_area[own] = np.where(has_rent[own], area_ids[own], np.where(has_parent, exact_area[parent], -1))
+
+            column = np.maximum(nearest_column[own], 0)
+            own_nearest = np.take_along_axis(exact[own], column, axis=1)
+            any_own = has_any[own][:, None]
+            nearest_rent[own] = np.where(any_own, own_nearest, np.where(has_parent, nearest_rent[parent], np.nan))
+            nearest_area[own] = np.where(any_own, area_ids[own], np.where(has_parent, nearest_area[parent], -1))
+            nearest_bedrooms[own] = np.where(any_own, column, np.where(has_parent, nearest_bedrooms[parent], -1))
+
+        found_exact = exact_area >= 0
+        self._width = width
+        self._rents = np.where(found_exact, exact_rent, nearest_rent)
+        self._areas = np.where(found_exact, exact_area, nearest_area).astype(np.int32)
+        self._bedrooms = np.where(found_exact, bedroom_columns, nearest_bedrooms).astype(np.int16)
+        self._area_levels = area_levels
+
+        # Lookup keys and display names of the areas, in area id order
+        level_names = {level: names[level][codes[level][first_rows[level]]].tolist() for level in LEVELS}
+        city_codes = codes["city"][first_rows["neighbourhood"]]
+        if len(names["city"]):
+            neighbourhood_cities = names["city"][np.maximum(city_codes, 0)].tolist()
+        else:
+            neighbourhood_cities = [None] * len(city_codes)
+        for position in np.flatnonzero(city_codes < 0).tolist():
+            neighbourhood_cities[position] = None
+
+        self._province_areas = dict(zip(level_names["province"], range(*self._bounds[0])))
+        self._city_areas = dict(zip(level_names["city"], range(*self._bounds[1])))
+        self._neighbourhood_areas = dict(zip(
+            zip(neighbourhood_cities, level_names["neighbourhood"]), range(*self._bounds[2])
+        ))
+        self._postal_areas = dict(zip(level_names["postal_prefix"], range(*self._bounds[3])))
+        self._area_names = sum((level_names[level] for level in LEVELS), [])
+        self._neighbourhood_cities = neighbourhood_cities
+        self._postal_lengths = np.unique(np.char.str_len(names["postal_prefix"]))[::-1].tolist()
+
+        # City areas are in name order; list those with an estimate
+        start, end = self._bounds[1]
+        has_estimate = ~np.isnan(self._rents[start:end, 0])
+        self._cities = [name for name, known in zip(level_names["city"], has_estimate.tolist()) if known]
+        # Answered lookups by area and bedroom column
+        self._results = {}
+
+    def find_area(self, city=None, neighbourhood=None, postal_code=None, province=None):
+        """
+        Find the most specific known area among the ones given
+
+        Parameters:
+        city (str): City name
+        neighbourhood (str): Neighbourhood name, looked up within the city
+        postal_code (str): Postal code or prefix; its longest known prefix is used
+        province (str): Province name or code
+
+        Returns:
+        int: Area id, or None when no given area is in the index
+        """
+        if postal_code:
+            postal_code = normalize_postal_code(postal_code)
+            for length in self._postal_lengths:
+                area = self._postal_areas.get(postal_code[:length])
+                if area is not None:
+                    return area
+        if neighbourhood is not None:
+            area = self._neighbourhood_areas.get((city, neighbourhood))
+            if area is not None:
+                return area
+        if city is not None:
+            area = self._city_areas.get(city)
+            if area is not None:
+                return area
+        if province is not None:
+            return self._province_areas.get(province)
+        return None
+
+    def _resolve(self, bedrooms, city, neighbourhood, postal_code, province):
+        """Look up an estimate, sharing the remembered result dict"""
+        area = self.find_area(city, neighbourhood, postal_code, province)
+        if area is None:
+            return None
+
+        if bedrooms.__class__ is not int:
+            bedrooms = int(bedrooms)
+        width = self._width
+        index = area * width + (bedrooms if 0 <= bedrooms < width else (0 if bedrooms < 0 else width - 1))
+        result = self._results.get(index)
+        if result is None:
+            rent = self._rents.item(index)
+            if rent != rent:
+                return None
+            source = self._areas.item(index)
+            level = LEVELS[self._area_levels.item(source)]
+            name = self._area_names[source]
+            if level == "neighbourhood":
+                city = self._neighbourhood_cities[source - self._bounds[2][0]]
+                name = name if city is None else f"{name}, {city}"
+            result = {
+                "rent": int(rent) if self.integer_rents else rent,
+                "bedrooms": self._bedrooms.item(index),
+                "level": level,
+                "area": name,
+            }
+            if len(self._results) >= RESULT_MEMO_SIZE:
+                self._results.clear()
+            self._results[index] = result
+        return result
+
+    def estimate(self, bedrooms, city=None, neighbourhood=None, postal_code=None, province=None):
+        """
+        Get the most specific rent estimate for an area and bedroom count
+
+        Parameters:
+        bedrooms (int): Number of bedrooms
+        city, neighbourhood, postal_code, province: Area, as for find_area
+
+        Returns:
+        dict: rent, the bedrooms and the level ("province", "city",
+            "neighbourhood" or "postal_prefix") and name of the area it is for;
+            None when no rent is available
+        """
+        result = self._resolve(bedrooms, city, neighbourhood, postal_code, province)
+        return None if result is None else dict(result)
+
+    def rent(self, bedrooms, city=None, neighbourhood=None, postal_code=None, province=None):
+        """
+        Get only the rent of the estimate
+
+        Parameters:
+        bedrooms (int): Number of bedrooms
+        city, neighbourhood, postal_code, province: Area, as for find_area
+
+        Returns:
+        float or None: Rent, or None when no rent is available
+        """
+        result = self._resolve(bedrooms, city, neighbourhood, postal_code, province)
+        return None if result is None else result["rent"]
+
+    def get_cities(self):
+        """Get the sorted list of cities with a rent estimate"""
+        return list(self._cities)
@@ -0,0 +1,372 @@
+"""
+Build the rent table from raw listing exports
+
+Usage:
+    python -m utils.rent_ingest listings/*.csv -o data/rent_data.csv --workers 4
+
+Listing files are CSV or Parquet with one row per listing and columns for
+the city, the bedroom count and the monthly rent (names set with --city-column,
+--bedrooms-column and --rent-column). Each file is read in chunks, and every
+(city, bedrooms) group keeps a fixed-width histogram of its rents instead of
+the rents themselves. Memory therefore follows the number of groups, not the
+number of listings, and the median and quartiles are exact to within half a
+bin (RENT_BIN_WIDTH dollars).
+
+Files are aggregated in parallel, one per worker, and each file's histograms
+are saved to a state directory when it completes. A rerun merges the saved
+files and only reads the files that are new or have changed since, so an
+interrupted run resumes where it stopped. Split very large dumps into several
+files to get both parallelism and finer-grained resumption.
+
+The output has the columns utils.data_handler reads, with the median as
+average_rent, plus the quartiles and the number of listings behind each row.
+It is written both as CSV and as the binary bundle of utils.rent_bundle.
+"""
+import argparse
+import hashlib
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from utils.batch import read_chunks
+from utils.rent_bundle import bundle_path, write_rent_bundle
+
+DEFAULT_CHUNK_SIZE = 500000
+
+# Rents are counted in bins of this many dollars, from 0 up to MAX_RENT
+RENT_BIN_WIDTH = 5
+MAX_RENT = 20000
+
+# Rents outside these bounds are treated as data-entry errors and dropped
+DEFAULT_MIN_RENT = 100
+DEFAULT_MAX_RENT = MAX_RENT
+
+# Tukey fences: rents further than this many interquartile ranges outside the
+# quartiles of their group are outliers
+DEFAULT_OUTLIER_IQR = 1.5
+
+# Groups with fewer listings are left out of the table
+DEFAULT_MIN_LISTINGS = 5
+
+OUTPUT_COLUMNS = ["city", "bedrooms", "average_rent", "p25_rent", "p75_rent", "listings"]
+
+class RentHistograms:
+    """
+    Rent histograms per (city, bedrooms) group
+
+    Groups are added as they are first seen; `counts` has one row of
+    RENT_BIN_WIDTH-dollar bins per group.
+    """
+
+    def __init__(self, bins=MAX_RENT // RENT_BIN_WIDTH):
+        self.bins = bins
+        self.groups = {}
+        self.counts = np.zeros((0, bins), dtype=np.int64)
+
+    def _group_indices(self, keys):
+        indices = np.empty(len(keys), dtype=np.intp)
+        new = []
+        for position, key in enumerate(keys):
+            index = self.groups.get(key)
+            if index is None:
+                index = self.groups[key] = len(self.groups)
+                new.append(index)
+            indices[position] = index
+        if new:
+            self.counts = np.vstack([self.counts, np.zeros((len(new), self.bins), dtype=np.int64)])
+        return indices
+
+    def add(self, cities, bedrooms, rents):
+        """
+        Count a batch of listings
+
+        Parameters:
+        cities (numpy.ndarray): City names
+        bedrooms (numpy.ndarray): Bedroom counts as integers
+        rents (numpy.ndarray): Monthly rents, all within [0, MAX_RENT]
+        """
+        if len(rents) == 0:
+            return
+        codes, pairs = pd.factorize(pd.MultiIndex.from_arrays([cities, bedrooms]))
+        indices = self._group_indices(list(pairs))
+
+        rent_bins = np.minimum((rents // RENT_BIN_WIDTH).astype(np.intp), self.bins - 1)
+        flat = np.bincount(codes * self.bins + rent_bins, minlength=len(pairs) * self.bins)
+        self.counts[indices] += flat.reshape(len(pairs), self.bins)
+
+    def merge(self, other):
+        """Add the counts of another RentHistograms with the same bins"""
+        if other.groups:
+            indices = self._group_indices(list(other.groups))
+            self.counts[indices] += other.counts
+
+    def save(self, path, source=None):
+        """
+        Save the histograms, replacing the file atomically
+
+        Parameters:
+        path (str): .npz file to write
+        source (str): Fingerprint of the input the histograms were built from
+        """
+        keys = list(self.groups)
+        temporary = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez_compressed(
+            temporary,
+            cities=np.array([city for city, _ in keys], dtype=str),
+            bedrooms=np.array([bedroom for _, bedroom in keys], dtype=np.int64),
+            counts=self.counts,
+            bin_width=RENT_BIN_WIDTH,
+            source="" if source is None else source
+        )
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path, source=None):
+        """
+        Load saved histograms
+
+        Parameters:
+        path (str): .npz file written by save
+        source (str): Expected fingerprint of the input, or None to accept any
+
+        Returns:
+        RentHistograms: The histograms, or None when the file is missing,
+            unreadable, built with other bins or from another version of the input
+        """
+        try:
+            with np.load(path) as saved:
+                counts = saved["counts"]
+                if int(saved["bin_width"]) != RENT_BIN_WIDTH:
+                    return None
+                if source is not None and str(saved["source"]) != source:
+                    return None
+                keys = zip(saved["cities"].tolist(), saved["bedrooms"].tolist())
+        except (OSError, KeyError, ValueError):
+            return None
+
+        histograms = cls(bins=counts.shape[1])
+        histograms.groups = {key: index for index, key in enumerate(keys)}
+        histograms.counts = counts
+        return histograms
+
+def _quantiles(counts, quantiles):
+    """Interpolate quantiles per row of a histogram matrix, NaN for empty rows"""
+    cumulative = counts.cumsum(axis=1)
+    totals = cumulative[:, -1]
+    results = []
+    for quantile in quantiles:
+        target = quantile * totals
+        # First bin whose cumulative count reaches the target
+        index = np.minimum((cumulative < target[:, None]).sum(axis=1), counts.shape[1] - 1)
+        rows = np.arange(len(counts))
+        in_bin = counts[rows, index]
+        before = cumulative[rows, index] - in_bin
+        fraction = np.divide(target - before, in_bin, out=np.full(len(counts), 0.5), where=in_bin > 0)
+        value = (index + fraction) * RENT_BIN_WIDTH
+        results.append(np.where(totals > 0, value, np.nan))
+    return results
+
+def summarize(histograms, outlier_iqr=DEFAULT_OUTLIER_IQR, min_listings=DEFAULT_MIN_LISTINGS):
+    """
+    Turn rent histograms into the rent table
+
+    Parameters:
+    histograms (RentHistograms): Counts per group
+    outlier_iqr (float): Drop rents beyond this many interquartile ranges
+        outside their group's quartiles; None keeps every rent
+    min_listings (int): Leave out groups with fewer listings, after outliers are dropped
+
+    Returns:
+    pandas.DataFrame: OUTPUT_COLUMNS sorted by city and bedrooms, with rents
+        rounded to whole dollars
+    """
+    counts = histograms.counts
+    if outlier_iqr is not None and len(counts):
+        p25, p75 = _quantiles(counts, [0.25, 0.75])
+        fence = outlier_iqr * (p75 - p25)
+        centers = (np.arange(histograms.bins) + 0.5) * RENT_BIN_WIDTH
+        inside = (centers >= (p25 - fence)[:, None]) & (centers <= (p75 + fence)[:, None])
+        counts = np.where(inside, counts, 0)
+
+    p25, median, p75 = _quantiles(counts, [0.25, 0.5, 0.75])
+    keys = list(histograms.groups)
+    table = pd.DataFrame({
+        "city": [city for city, _ in keys],
+        "bedrooms": np.array([bedroom for _, bedroom in keys], dtype=np.int64),
+        "average_rent": median,
+        "p25_rent": p25,
+        "p75_rent": p75,
+        "listings": counts.sum(axis=1),
+    }, columns=OUTPUT_COLUMNS)
+
+    table = table[table["listings"] >= max(min_listings, 1)]
+    for column in ["average_rent", "p25_rent", "p75_rent"]:
+        table[column] = table[column].round().astype(np.int64)
+    return table.sort_values(["city", "bedrooms"]).reset_index(drop=True)
+
+def _clean_chunk(chunk, city_column, bedrooms_column, rent_column, min_rent, max_rent):
+    """Normalize one chunk of listings, dropping rows that cannot be used"""
+    cities = chunk[city_column].astype("string").str.strip()
+    bedrooms = pd.to_numeric(chunk[bedrooms_column], errors="coerce")
+    rents = pd.to_numeric(chunk[rent_column], errors="coerce")
+
+    usable = (
+        cities.notna() & (cities != "") & bedrooms.notna() & (bedrooms >= 0)
+        & (bedrooms == bedrooms.round()) & rents.between(min_rent, min(max_rent, MAX_RENT))
+    ).to_numpy(dtype=bool)
+    return (
+        cities[usable].to_numpy(dtype=object),
+        bedrooms[usable].to_numpy(dtype=np.int64),
+        rents[usable].to_numpy(dtype=float),
+    )
+
+def aggregate_file(path, chunk_size=DEFAULT_CHUNK_SIZE, city_column="city", bedrooms_column="bedrooms",
+                   rent_column="rent", min_rent=DEFAULT_MIN_RENT, max_rent=DEFAULT_MAX_RENT):
+    """
+    Build the rent histograms of one listing file, chunk by chunk
+
+    Parameters:
+    path (str): CSV or Parquet listing file
+    chunk_size (int): Rows per chunk
+    city_column, bedrooms_column, rent_column (str): Column names in the file
+    min_rent, max_rent (float): Rents outside these bounds are dropped
+
+    Returns:
+    tuple: (RentHistograms, rows read, rows counted)
+    """
+    histograms = RentHistograms()
+    rows = 0
+    counted = 0
+    for chunk in read_chunks(path, chunk_size):
+        cities, bedrooms, rents = _clean_chunk(chunk, city_column, bedrooms_column, rent_column,
+                                               min_rent, max_rent)
+        histograms.add(cities, bedrooms, rents)
+        rows += len(chunk)
+        counted += len(rents)
+    return histograms, rows, counted
+
+def _fingerprint(path, options):
+    """Identify a version of an input file and the options it is read with"""
+    stat = os.stat(path)
+    return f"{os.path.abspath(path)}|{stat.st_size}|{stat.st_mtime_ns}|{options!r}"
+
+def _part_path(state_dir, path):
+    digest = hashlib.sha256(os.path.abspath(path).encode()).hexdigest()[:16]
+    return os.path.join(state_dir, f"{os.path.basename(path)}.{digest}.npz")
+
+def _ingest_file(path, part_path, fingerprint, options):
+    histograms, rows, counted = aggregate_file(path, **options)
+    histograms.save(part_path, source=fingerprint)
+    return rows, counted
+
+def ingest(input_paths, output_path, state_dir=None, workers=1, chunk_size=DEFAULT_CHUNK_SIZE,
+           city_column="city", bedrooms_column="bedrooms", rent_column="rent",
+           min_rent=DEFAULT_MIN_RENT, max_rent=DEFAULT_MAX_RENT,
+           outlier_iqr=DEFAULT_OUTLIER_IQR, min_listings=DEFAULT_MIN_LISTINGS, progress=None):
+    """
+    Aggregate listing files into the rent table
+
+    Parameters:
+    input_paths (list): CSV or Parquet listing files
+    output_path (str): Rent table CSV to write, replaced atomically, with its
+        binary bundle next to it
+    state_dir (str): Directory for per-file histograms; defaults to the
+        output path with a .parts suffix
+    workers (int): Files aggregated in parallel, 1 works in this process
+    chunk_size (int): Rows read per chunk
+    city_column, bedrooms_column, rent_column (str): Column names in the listing files
+    min_rent, max_rent (float): Rents outside these bounds are dropped
+    outlier_iqr (float): Tukey fence for outliers per group, None to keep all rents
+    min_listings (int): Leave out groups with fewer listings
+    progress (callable): Called with each input path and its (rows read, rows
+        counted), or None when its saved histograms were reused
+
+    Returns:
+    pandas.DataFrame: The rent table that was written
+    """
+    state_dir = state_dir or f"{output_path}.parts"
+    os.makedirs(state_dir, exist_ok=True)
+    options = {
+        "chunk_size": chunk_size, "city_column": city_column, "bedrooms_column": bedrooms_column,
+        "rent_column": rent_column, "min_rent": min_rent, "max_rent": max_rent,
+    }
+    # The chunk size does not change the result, so it is left out of the fingerprint
+    counted_options = {name: value for name, value in options.items() if name != "chunk_size"}
+
+    parts = {}
+    pending = []
+    for path in dict.fromkeys(input_paths):
+        fingerprint = _fingerprint(path, counted_options)
+        parts[path] = (_part_path(state_dir, path), fingerprint)
+        if RentHistograms.load(parts[path][0], source=fingerprint) is None:
+            pending.append(path)
+        elif progress:
+            progress(path, None)
+
+    if workers <= 1:
+        for path in pending:
+            counts = _ingest_file(path, *parts[path], options)
+            if progress:
+                progress(path, counts)
+    elif pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_ingest_file, path, *parts[path], options): path for path in pending}
+            for future in as_completed(futures):
+                counts = future.result()
+                if progress:
+                    progress(futures[future], counts)
+
+    histograms = RentHistograms()
+    for part_path, fingerprint in parts.values():
+        part = RentHistograms.load(part_path, source=fingerprint)
+        if part is None:
+            raise RuntimeError(f"Histograms in {part_path} are missing or out of date")
+        histograms.merge(part)
+
+    table = summarize(histograms, outlier_iqr, min_listings)
+    # Write then rename, so the app never reloads a half-written table
+    temporary = f"{output_path}.{os.getpid()}.tmp"
+    table.to_csv(temporary, index=False)
+    os.replace(temporary, output_path)
+    write_rent_bundle(table, bundle_path(output_path), source_path=output_path)
+    return table
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the rent table from raw listing files")
+    parser.add_argument("inputs", nargs="+", help="Listing files (.csv or .parquet)")
+    parser.add_argument("-o", "--output", default="data/rent_data.csv", help="Rent table to write")
+    parser.add_argument("--state-dir", help="Directory for per-file histograms (default: OUTPUT.parts)")
+    parser.add_argument("--workers", type=int, default=1, help="Files aggregated in parallel")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="Rows per chunk")
+    parser.add_argument("--city-column", default="city", help="Column with the city")
+    parser.add_argument("--bedrooms-column", default="bedrooms", help="Column with the bedroom count")
+    parser.add_argument("--rent-column", default="rent", help="Column with the monthly rent")
+    parser.add_argument("--min-rent", type=float, default=DEFAULT_MIN_RENT, help="Drop lower rents")
+    parser.add_argument("--max-rent", type=float, default=DEFAULT_MAX_RENT, help="Drop higher rents")
+    parser.add_argument("--outlier-iqr", type=float, default=DEFAULT_OUTLIER_IQR,
+                        help="Tukey fence for outliers per group")
+    parser.add_argument("--keep-outliers", action="store_true", help="Do not filter outliers")
+    parser.add_argument("--min-listings", type=int, default=DEFAULT_MIN_LISTINGS,
+                        help="Leave out groups with fewer listings")
+    args = parser.parse_args(argv)
+
+    def progress(path, counts):
+        if counts is None:
+            print(f"{path}: unchanged, reusing saved histograms", file=sys.stderr)
+        else:
+            print(f"{path}: {counts[1]:,} of {counts[0]:,} rows counted", file=sys.stderr)
+
+    table = ingest(
+        args.inputs, args.output, args.state_dir, args.workers, args.chunk_size,
+        args.city_column, args.bedrooms_column, args.rent_column, args.min_rent, args.max_rent,
+        None if args.keep_outliers else args.outlier_iqr, args.min_listings, progress
+    )
+    print(f"Wrote {len(table):,} rows from {int(table['listings'].sum()):,} listings to {args.output}",
+          file=sys.stderr)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,629 @@
+"""
+Downloadable and emailed reports, rendered in the background
+
+Usage:
+    python -m utils.reports scenario.json -o report.pdf
+    python -m utils.reports scenario.json --email you@example.com
+
+A report covers one comparison: the inputs, the results and detailed
+breakdown shown by the app, the trajectory charts, and the year-by-year and
+monthly amortization schedules. It comes as a PDF (written by utils.pdf) or
+as a CSV of the monthly schedule.
+
+The app does not render inline, which would hold up the session's rerun
+and repeat the work for every session asking for the same report: it
+submits a job to the process-wide ReportQueue, a small thread pool, and polls
+the job until the file is ready. Jobs are identified by a hash of their
+inputs, format and the model version, so submitting the same report twice
+(a double click, another session, a rerun) returns the job already queued or
+the finished file. Finished files are kept on disk in HOMEDECIDE_REPORT_DIR
+and the least recently used are evicted beyond HOMEDECIDE_REPORT_CACHE_MB.
+
+Reports are emailed through the SMTP server set by HOMEDECIDE_SMTP_HOST
+(and HOMEDECIDE_SMTP_PORT, _USER, _PASSWORD, _SENDER and _STARTTLS); any
+local stand-in accepting plain SMTP works for testing.
+"""
+import argparse
+import json
+import logging
+import os
+import smtplib
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait
+from email.message import EmailMessage
+from email.utils import parseaddr
+
+import numpy as np
+import pandas as pd
+
+from utils.charts import BUYING_COLOR, EQUITY_COLOR, RENTING_COLOR, downsample
+from utils.comparison import cached_comparison, comparison_key, tax_profile
+from utils.pdf import PdfDocument
+from utils.projection import APPRECIATION_CAP, monthly_positions
+from utils.result_store import result_key
+from utils.scenarios import SCENARIO_DEFAULTS
+from utils.stages import staged_projection
+from utils.tax import PROVINCE_NAMES
+from utils.timing import timed
+
+REPORT_DIR_ENV = "HOMEDECIDE_REPORT_DIR"
+REPORT_CACHE_MB_ENV = "HOMEDECIDE_REPORT_CACHE_MB"
+REPORT_WORKERS_ENV = "HOMEDECIDE_REPORT_WORKERS"
+SMTP_HOST_ENV = "HOMEDECIDE_SMTP_HOST"
+SMTP_PORT_ENV = "HOMEDECIDE_SMTP_PORT"
+SMTP_USER_ENV = "HOMEDECIDE_SMTP_USER"
+SMTP_PASSWORD_ENV = "HOMEDECIDE_SMTP_PASSWORD"
+SMTP_SENDER_ENV = "HOMEDECIDE_SMTP_SENDER"
+SMTP_STARTTLS_ENV = "HOMEDECIDE_SMTP_STARTTLS"
+
+DEFAULT_REPORT_DIR = os.path.join(tempfile.gettempdir(), "homedecide-reports")
+DEFAULT_CACHE_MB = 256
+DEFAULT_WORKERS = 2
+DEFAULT_SMTP_PORT = 25
+DEFAULT_SENDER = "HomeDecide <reports@homedecide.local>"
+SMTP_TIMEOUT = 30.0
+
+# Bump whenever the content or layout of the reports changes, so cached files are not reused
+REPORT_VERSION = 1
+
+# File name and content type of each report format
+REPORT_FORMATS = {
+    "pdf": ("homedecide-report.pdf", "application/pdf"),
+    "csv": ("homedecide-schedule.csv", "text/csv"),
+}
+
+# Seconds between the app's polls of a pending job
+POLL_INTERVAL = 0.5
+
+# Finished or failed jobs remembered for status polls; the files themselves stay on disk
+MAX_TRACKED_JOBS = 1024
+
+# Comparison inputs a report may leave out, with the defaults of cached_comparison
+OPTIONAL_INPUTS = {
+    "city": None,
+    "bedrooms": None,
+    "maintenance_inflation_rate": None,
+    "appreciation_cap": APPRECIATION_CAP,
+    "province": None,
+    "fhsa_amount": 0.0,
+    "hbp_amount": 0.0,
+    "hbp_repaid": True,
+}
+
+logger = logging.getLogger("homedecide.reports")
+
+def _inputs(inputs):
+    return dict(OPTIONAL_INPUTS, **inputs)
+
+def report_id(inputs, report_format):
+    """
+    Identify a report by its inputs
+
+    Parameters:
+    inputs (dict): Keyword arguments of utils.comparison.cached_comparison
+    report_format (str): A key of REPORT_FORMATS
+
+    Returns:
+    str: Hex digest, equal for equal inputs
+    """
+    return result_key("report", {
+        "format": report_format,
+        "report_version": REPORT_VERSION,
+        "inputs": comparison_key(**_inputs(inputs)),
+    })
+
+@timed
+def build_report(inputs):
+    """
+    Gather the figures of a report
+
+    Parameters:
+    inputs (dict): Keyword arguments of utils.comparison.cached_comparison
+
+    Returns:
+    dict: inputs, comparison (as from run_comparison), positions (as from
+        monthly_positions), yearly (pandas.DataFrame, one row per year) and
+        monthly (pandas.DataFrame, the amortization schedule and net costs)
+    """
+    inputs = _inputs(inputs)
+    comparison = cached_comparison(**inputs)
+    projection = staged_projection(
+        inputs["home_price"], inputs["down_payment_percent"], inputs["interest_rate"], inputs["loan_term_years"],
+        inputs["property_tax_rate"], inputs["maintenance_cost"], inputs["appreciation_rate"],
+        inputs["monthly_rent"], inputs["rent_increase_rate"], inputs["investment_return_rate"],
+        inputs["selling_cost_percent"], inputs["maintenance_inflation_rate"], inputs["appreciation_cap"],
+        tax_profile(inputs["monthly_income"], inputs["province"], inputs["fhsa_amount"], inputs["hbp_amount"],
+                    inputs["hbp_repaid"])
+    )
+    positions = monthly_positions(
+        projection, inputs["home_price"], comparison["down_payment"], inputs["selling_cost_percent"]
+    )
+
+    yearly = pd.DataFrame({
+        "Year": np.arange(1, projection.loan_term_years + 1),
+        "Mortgage": projection.mortgage,
+        "Property Tax": projection.property_tax,
+        "Maintenance": projection.maintenance,
+        "Rent": projection.rent,
+        "Home Value": projection.home_value,
+        "Loan Balance": projection.loan_balance,
+        "Investment Value": projection.investment_value,
+    }).round(2)
+
+    months = positions["months"][1:]
+    monthly = pd.DataFrame({
+        "Month": months,
+        "Year": (months - 1) // 12 + 1,
+        "Payment": projection.interest + projection.principal,
+        "Interest": projection.interest,
+        "Principal": projection.principal,
+        "Loan Balance": projection.balance,
+        "Home Value": positions["home_value"][1:],
+        "Home Equity": positions["equity"][1:],
+        "Net Cost of Buying": positions["buying_position"][1:],
+        "Net Cost of Renting": positions["renting_position"][1:],
+    }).round(2)
+
+    return {"inputs": inputs, "comparison": comparison, "positions": positions, "yearly": yearly,
+            "monthly": monthly}
+
+def _money(value):
+    return f"${value:,.2f}"
+
+def _rate(value):
+    """A rate, or the range of a yearly path"""
+    if np.ndim(value) == 0:
+        return f"{value:.2f}%"
+    low, high = min(value), max(value)
+    if low == high:
+        return f"{low:.2f}%"
+    return f"{low:.2f}% to {high:.2f}% (set year by year)"
+
+def _input_rows(inputs, comparison):
+    maintenance_inflation = inputs["maintenance_inflation_rate"]
+    rows = [
+        ("Monthly Income", _money(inputs["monthly_income"])),
+        ("City", f"{inputs['city'] or '-'}" + (f", {inputs['bedrooms']} bedroom(s)" if inputs["bedrooms"] else "")),
+        ("Home Price", _money(inputs["home_price"])),
+        ("Down Payment", f"{_money(comparison['down_payment'])} ({inputs['down_payment_percent']}%)"),
+        ("Interest Rate", _rate(inputs["interest_rate"])),
+        ("Loan Term", f"{inputs['loan_term_years']} years"),
+        ("Property Tax Rate", _rate(inputs["property_tax_rate"])),
+        ("Annual Maintenance Cost", _money(inputs["maintenance_cost"])),
+        ("Maintenance Inflation", "With appreciation" if maintenance_inflation is None else _rate(maintenance_inflation)),
+        ("Home Appreciation", _rate(inputs["appreciation_rate"])
+         + ("" if inputs["appreciation_cap"] is None else f", capped at {inputs['appreciation_cap']:.0f}%")),
+        ("Selling Costs", f"{inputs['selling_cost_percent']}%"),
+        ("Monthly Rent", _money(inputs["monthly_rent"])),
+        ("Rent Increase", _rate(inputs["rent_increase_rate"])),
+        ("Investment Return", _rate(inputs["investment_return_rate"])),
+    ]
+    if inputs["province"] is not None:
+        rows += [
+            ("Income Tax Province", PROVINCE_NAMES.get(inputs["province"], inputs["province"])),
+            ("Down Payment from an FHSA", _money(inputs["fhsa_amount"])),
+            ("Down Payment from the HBP", _money(inputs["hbp_amount"])
+             + ("" if inputs["hbp_repaid"] else ", not repaid")),
+        ]
+    return rows
+
+def _breakdown_rows(inputs, comparison):
+    term = inputs["loan_term_years"]
+    taxed = inputs["province"] is not None
+    buying = [
+        ("Down Payment", comparison["down_payment"]),
+        (f"Mortgage Payments (over {term} years)", comparison["cumulative_mortgage"]),
+        ("Property Taxes", comparison["cumulative_property_tax"]),
+        ("Maintenance", comparison["cumulative_maintenance"]),
+    ]
+    if taxed:
+        buying.append(("Income Tax (HBP income less the FHSA refund)", comparison["buying_tax"]))
+    buying += [
+        ("Total Buying Costs", comparison["total_buying_cost"]),
+        (f"Home Value After {term} Years", comparison["final_home_value"]),
+        ("Selling Costs", comparison["selling_costs"]),
+        ("Net Proceeds from Home Sale", comparison["net_home_sale_proceeds"]),
+        ("Net Buying Cost", comparison["net_buying_cost"]),
+    ]
+    renting = [
+        (f"Total Rent Payments (over {term} years)", comparison["total_renting_cost"]),
+        (f"Investment Value of Down Payment After {term} Years", comparison["final_investment_value"]),
+    ]
+    if taxed:
+        renting.append(("Capital Gains Tax (deducted from the investment)", comparison["capital_gains_tax"]))
+    renting += [
+        ("Investment Gain", comparison["investment_gain"]),
+        ("Net Renting Cost (after investment returns)", comparison["adjusted_renting_cost"]),
+    ]
+    return [(label, _money(value)) for label, value in buying], [(label, _money(value)) for label, value in renting]
+
+@timed
+def render_pdf(report):
+    """
+    Render a report as a PDF
+
+    Parameters:
+    report (dict): Output of build_report
+
+    Returns:
+    bytes: The PDF file
+    """
+    inputs, comparison = report["inputs"], report["comparison"]
+    term = inputs["loan_term_years"]
+    document = PdfDocument(title="HomeDecide Rent vs. Buy Report")
+    document.heading("HomeDecide - Rent vs. Buy Report", size=18)
+    document.paragraph("Not financial advice: this report is for educational purposes only. Please consult a "
+                       "qualified financial advisor before making any important financial decisions.", size=8)
+
+    document.heading("Your Information")
+    document.table(["Input", "Value"], _input_rows(inputs, comparison), [250, 254])
+
+    cheaper = comparison["cheaper_option"]
+    break_even_year = comparison["break_even_year"]
+    document.heading("Results")
+    document.table(["Figure", "Value"], [
+        ("Monthly Mortgage Payment", f"{_money(comparison['monthly_mortgage'])} "
+         f"({comparison['mortgage_affordability']:.1f}% of income, {comparison['mortgage_status']})"),
+        ("Total Monthly Cost of Buying", _money(comparison["total_monthly_buying"])),
+        ("Monthly Rent", f"{_money(inputs['monthly_rent'])} "
+         f"({comparison['rent_affordability']:.1f}% of income, {comparison['rent_status']})"),
+        (f"Savings from {cheaper.title()}", f"{_money(comparison['savings'])} "
+         f"({comparison['percentage_saved']:.1f}% saved)"),
+        ("Break-even", f"Year {break_even_year} (month {comparison['break_even_month']})" if break_even_year
+         else f"Never within {term} years"),
+    ], [250, 254])
+    document.paragraph(f"{cheaper.title()} appears to be more economical over {term} years, after accounting for "
+                       "home appreciation and the opportunity cost of the down payment.")
+
+    buying, renting = _breakdown_rows(inputs, comparison)
+    document.heading("Detailed Breakdown")
+    document.table(["Buying Costs", "Amount"], buying, [350, 154])
+    document.table(["Renting Costs", "Amount"], renting, [350, 154])
+
+    document.add_page()
+    positions = report["positions"]
+    years = positions["months"] / 12
+    buying_position, renting_position = positions["buying_position"], positions["renting_position"]
+    keep = downsample(positions["months"], [buying_position, renting_position])
+    document.line_chart("Net Cost if You Left That Month (Lower Is Better)", years[keep], [
+        ("Buying", buying_position[keep], BUYING_COLOR),
+        ("Renting", renting_position[keep], RENTING_COLOR),
+    ], height=300, x_label="Year")
+    document.y -= 24
+    equity, balance = positions["equity"], positions["loan_balance"]
+    keep = downsample(positions["months"], [equity, balance])
+    document.line_chart("Home Equity vs. Loan Balance", years[keep], [
+        ("Home Equity", equity[keep], EQUITY_COLOR),
+        ("Loan Balance", balance[keep], BUYING_COLOR),
+    ], height=300, x_label="Year")
+
+    document.add_page()
+    document.heading("Year by Year")
+    yearly = report["yearly"]
+    document.table(
+        list(yearly.columns),
+        [[str(row[0])] + [f"{value:,.0f}" for value in row[1:]] for row in yearly.itertuples(index=False)],
+        [32, 68, 68, 68, 68, 68, 66, 66], size=8
+    )
+
+    document.add_page()
+    document.heading("Amortization Schedule")
+    monthly = report["monthly"]
+    document.table(
+        ["Month", "Year", "Payment", "Interest", "Principal", "Loan Balance"],
+        [[str(row.Month), str(row.Year)] + [_money(value) for value in row[2:6]]
+         for row in monthly.itertuples(index=False)],
+        [60, 60, 96, 96, 96, 96], size=8
+    )
+    return document.to_bytes()
+
+@timed
+def render_csv(report):
+    """
+    Render a report's monthly schedule as CSV
+
+    Parameters:
+    report (dict): Output of build_report
+
+    Returns:
+    bytes: The CSV file
+    """
+    return report["monthly"].to_csv(index=False).encode()
+
+RENDERERS = {"pdf": render_pdf, "csv": render_csv}
+
+class ArtifactCache:
+    """
+    Finished report files on disk, evicting the least recently used
+
+    Files are written to a temporary name and renamed into place, so readers,
+    including other processes sharing the directory, never see a partial
+    file. Reads refresh a file's modification time, the order of eviction.
+    """
+
+    def __init__(self, directory, max_bytes):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, key):
+        return os.path.join(self.directory, key)
+
+    def read(self, key):
+        """The file's contents, or None when it is not cached"""
+        try:
+            with open(self.path(key), "rb") as file:
+                content = file.read()
+            os.utime(self.path(key))
+            return content
+        except OSError:
+            return None
+
+    def contains(self, key):
+        return os.path.exists(self.path(key))
+
+    def write(self, key, content):
+        handle, temporary = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        try:
+            with os.fdopen(handle, "wb") as file:
+                file.write(content)
+            os.replace(temporary, self.path(key))
+        except BaseException:
+            os.unlink(temporary)
+            raise
+        self.evict()
+
+    def evict(self):
+        """Delete the least recently used files beyond max_bytes"""
+        files = []
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.is_file() and not entry.name.startswith(".tmp-"):
+                    stat = entry.stat()
+                    files.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in files)
+        for _, size, path in sorted(files):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+            except OSError:
+                pass
+            total -= size
+
+def smtp_settings():
+    """
+    Get the SMTP settings from the environment
+
+    Returns:
+    dict: host, port, user, password, sender and starttls, or None when
+        HOMEDECIDE_SMTP_HOST is not set
+    """
+    host = os.environ.get(SMTP_HOST_ENV)
+    if not host:
+        return None
+    return {
+        "host": host,
+        "port": int(os.environ.get(SMTP_PORT_ENV, DEFAULT_SMTP_PORT)),
+        "user": os.environ.get(SMTP_USER_ENV),
+        "password": os.environ.get(SMTP_PASSWORD_ENV),
+        "sender": os.environ.get(SMTP_SENDER_ENV, DEFAULT_SENDER),
+        "starttls": os.environ.get(SMTP_STARTTLS_ENV, "").strip() not in ("", "0"),
+    }
+
+def valid_email(address):
+    """Whether an address looks deliverable: one @ with text on both sides and a dot in the domain"""
+    _, address = parseaddr(address or "")
+    local, _, domain = address.partition("@")
+    return bool(local) and "." in domain and "@" not in domain
+
+def send_report_email(recipient, attachments, settings):
+    """
+    Email report files
+
+    Parameters:
+    recipient (str): Email address
+    attachments (list): (file name, content type, bytes) per file
+    settings (dict): Output of smtp_settings
+    """
+    message = EmailMessage()
+    message["Subject"] = "Your HomeDecide rent vs. buy report"
+    message["From"] = settings["sender"]
+    message["To"] = recipient
+    message.set_content(
+        "Attached are your HomeDecide rent vs. buy report and its monthly schedule.\n\n"
+        "Not financial advice: the report is for educational purposes only.\n"
+    )
+    for name, content_type, content in attachments:
+        maintype, subtype = content_type.split("/")
+        message.add_attachment(content, maintype=maintype, subtype=subtype, filename=name)
+
+    with smtplib.SMTP(settings["host"], settings["port"], timeout=SMTP_TIMEOUT) as smtp:
+        if settings["starttls"]:
+            smtp.starttls()
+        if settings["user"]:
+            smtp.login(settings["user"], settings["password"] or "")
+        smtp.send_message(message)
+
+class ReportQueue:
+    """
+    Background rendering and emailing of reports
+
+    Jobs run on a thread pool and are keyed by report_id, so identical
+    reports are rendered once: submitting one that is queued or running
+    returns the same job, and one already on disk is done straight away.
+    Failed jobs are retried when submitted again. Status is polled with
+    status(); jobs are forgotten once MAX_TRACKED_JOBS newer ones finish,
+    while their files stay in the cache.
+    """
+
+    def __init__(self, directory, max_bytes=DEFAULT_CACHE_MB * 1024 * 1024, workers=DEFAULT_WORKERS):
+        self.cache = ArtifactCache(directory, max_bytes)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _track(self, job_id, future):
+        self._jobs[job_id] = future
+        self._jobs.move_to_end(job_id)
+        finished = [key for key, job in self._jobs.items() if job.done()]
+        for key in finished[:max(len(self._jobs) - MAX_TRACKED_JOBS, 0)]:
+            del self._jobs[key]
+
+    def _render(self, job_id, inputs, report_format):
+        started = time.perf_counter()
+        content = RENDERERS[report_format](build_report(inputs))
+        self.cache.write(job_id, content)
+        logger.info("Rendered %s report %s in %.2fs", report_format, job_id[:12], time.perf_counter() - started)
+
+    def submit(self, inputs, report_format):
+        """
+        Queue a report unless it is queued, running or finished already
+
+        Parameters:
+        inputs (dict): Keyword arguments of utils.comparison.cached_comparison
+        report_format (str): A key of REPORT_FORMATS
+
+        Returns:
+        str: Job id, to poll with status()
+        """
+        job_id = report_id(inputs, report_format)
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if (job is not None and not job.done()) or self.cache.contains(job_id):
+                return job_id
+            self._track(job_id, self._executor.submit(self._render, job_id, dict(inputs), report_format))
+        return job_id
+
+    def status(self, job_id):
+        """
+        Get the state of a job
+
+        Parameters:
+        job_id (str): Id from submit() or email()
+
+        Returns:
+        dict: status ("queued", "running", "done", "failed" or "unknown"),
+            with error for failed jobs
+        """
+        job = self._jobs.get(job_id)
+        if job is not None and not job.done():
+            return {"status": "running" if job.running() else "queued"}
+        if job is not None and job.exception() is not None:
+            return {"status": "failed", "error": str(job.exception()) or type(job.exception()).__name__}
+        if job is not None or self.cache.contains(job_id):
+            return {"status": "done"}
+        return {"status": "unknown"}
+
+    def read(self, job_id):
+        """A finished report's file contents, None when not finished"""
+        return self.cache.read(job_id)
+
+    def _send(self, report_ids, recipient, settings):
+        # The reports were queued before this job, so waiting here cannot
+        # hold up a worker their rendering needs
+        wait([self._jobs[job_id] for job_id in report_ids.values() if job_id in self._jobs])
+        attachments = []
+        for report_format, job_id in report_ids.items():
+            content = self.read(job_id)
+            if content is None:
+                raise RuntimeError(f"The {report_format.upper()} report could not be rendered")
+            attachments.append(REPORT_FORMATS[report_format] + (content,))
+        send_report_email(recipient, attachments, settings)
+        logger.info("Emailed report to %s", recipient)
+
+    def email(self, inputs, recipient, formats=tuple(REPORT_FORMATS)):
+        """
+        Render reports if needed and email them
+
+        Sending the same reports to the same recipient while an earlier send
+        is pending returns that job; once it finished, emailing again sends
+        again.
+
+        Parameters:
+        inputs (dict): Keyword arguments of utils.comparison.cached_comparison
+        recipient (str): Email address
+        formats (tuple): Report formats to attach
+
+        Returns:
+        str: Job id, to poll with status()
+        """
+        settings = smtp_settings()
+        if settings is None:
+            raise ValueError(f"Email is not configured; set {SMTP_HOST_ENV}")
+        if not valid_email(recipient):
+            raise ValueError(f"Invalid email address: {recipient}")
+
+        report_ids = {report_format: self.submit(inputs, report_format) for report_format in formats}
+        job_id = result_key("report_email", {"reports": report_ids, "recipient": recipient})
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job.done():
+                self._track(job_id, self._executor.submit(self._send, report_ids, recipient, settings))
+        return job_id
+
+_queue = None
+_queue_lock = threading.Lock()
+
+def get_report_queue():
+    """
+    Get the process-wide report queue configured by the environment
+
+    Returns:
+    ReportQueue: The queue, started on first use
+    """
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                _queue = ReportQueue(
+                    os.environ.get(REPORT_DIR_ENV, DEFAULT_REPORT_DIR),
+                    max_bytes=int(float(os.environ.get(REPORT_CACHE_MB_ENV, DEFAULT_CACHE_MB)) * 1024 * 1024),
+                    workers=int(os.environ.get(REPORT_WORKERS_ENV, DEFAULT_WORKERS))
+                )
+    return _queue
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Render or email a rent-vs-buy report")
+    parser.add_argument("scenario", help="JSON file of comparison inputs (see utils.comparison.cached_comparison); "
+                                         "advanced options left out take the app's defaults")
+    parser.add_argument("-o", "--output", help="Report file to write, .pdf or .csv")
+    parser.add_argument("--email", help="Email the PDF and CSV reports to this address")
+    args = parser.parse_args(argv)
+    if not args.output and not args.email:
+        parser.error("give --output, --email or both")
+
+    with open(args.scenario) as file:
+        inputs = dict(SCENARIO_DEFAULTS, **json.load(file))
+    queue = get_report_queue()
+    jobs = []
+    if args.output:
+        report_format = os.path.splitext(args.output)[1].lstrip(".").lower()
+        if report_format not in REPORT_FORMATS:
+            parser.error(f"--output must end in one of: {', '.join('.' + name for name in REPORT_FORMATS)}")
+        jobs.append(queue.submit(inputs, report_format))
+    if args.email:
+        try:
+            jobs.append(queue.email(inputs, args.email))
+        except ValueError as error:
+            parser.error(str(error))
+
+    while any(queue.status(job_id)["status"] in ("queued", "running") for job_id in jobs):
+        time.sleep(0.1)
+    failed = [queue.status(job_id) for job_id in jobs if queue.status(job_id)["status"] == "failed"]
+    for status in failed:
+        print(f"Failed: {status['error']}", file=sys.stderr)
+    if args.output and not failed:
+        with open(args.output, "wb") as file:
+            file.write(queue.read(jobs[0]))
+        print(f"Wrote {args.output}", file=sys.stderr)
+    if args.email and not failed:
+        print(f"Emailed the report to {args.email}", file=sys.stderr)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
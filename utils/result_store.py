@@ -0,0 +1,215 @@
+import hashlib
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from utils.projection import MODEL_VERSION
+
+# The store is enabled by pointing this environment variable at a SQLite
+# file, typically on a volume shared by all replicas
+RESULT_STORE_PATH_ENV = "HOMEDECIDE_RESULT_STORE"
+RESULT_STORE_TTL_ENV = "HOMEDECIDE_RESULT_STORE_TTL"
+RESULT_STORE_MAX_ENTRIES_ENV = "HOMEDECIDE_RESULT_STORE_MAX_ENTRIES"
+
+DEFAULT_TTL = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 200000
+
+# Seconds a writer waits for another replica's write lock
+BUSY_TIMEOUT = 5.0
+
+# Expired and excess entries are pruned after this many writes per process
+PRUNE_INTERVAL = 256
+
+# Last-access times are refreshed at most this often, to keep reads mostly read-only
+TOUCH_INTERVAL = 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS results (
+    key TEXT PRIMARY KEY,
+    kind TEXT NOT NULL,
+    value BLOB NOT NULL,
+    created REAL NOT NULL,
+    accessed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_accessed ON results (accessed);
+"""
+
+def result_key(kind, inputs):
+    """
+    Hash the inputs of a computation together with the model version
+
+    Parameters:
+    kind (str): Kind of result, e.g. "comparison" or "sensitivity"
+    inputs: JSON-serializable inputs; NumPy numbers are converted
+
+    Returns:
+    str: Hex SHA-256 digest
+    """
+    document = json.dumps(
+        {"kind": kind, "model_version": MODEL_VERSION, "inputs": inputs},
+        sort_keys=True, separators=(",", ":"), default=float
+    )
+    return hashlib.sha256(document.encode()).hexdigest()
+
+class ResultStore:
+    """
+    SQLite-backed cache of computed results, shared between processes
+
+    The database runs in WAL mode so readers never wait for writers, and
+    writers wait up to BUSY_TIMEOUT for each other. Every thread gets its own
+    connection. Entries expire after `ttl` seconds, and beyond `max_entries`
+    the least recently used ones are evicted. Storage errors never reach
+    callers: a failed read is a miss and a failed write is skipped.
+
+    WAL needs shared memory between the processes, so the file must be on a
+    local disk or a Docker volume, not on a network file system.
+    """
+
+    def __init__(self, path, ttl=DEFAULT_TTL, max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        self._writes_lock = threading.Lock()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            connection.executescript(_SCHEMA)
+            self._local.connection = connection
+        return connection
+
+    def get(self, kind, inputs):
+        """
+        Look up a result
+
+        Parameters:
+        kind (str): Kind of result
+        inputs: Inputs the result was computed from
+
+        Returns:
+        The stored result, or None when missing, expired or unreadable
+        """
+        key = result_key(kind, inputs)
+        now = time.time()
+        try:
+            connection = self._connection()
+            row = connection.execute(
+                "SELECT value, accessed FROM results WHERE key = ? AND created > ?",
+                (key, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            if now - row[1] > TOUCH_INTERVAL:
+                connection.execute("UPDATE results SET accessed = ? WHERE key = ?", (now, key))
+            return pickle.loads(row[0])
+        except (sqlite3.Error, OSError, pickle.UnpicklingError, EOFError):
+            return None
+
+    def put(self, kind, inputs, value):
+        """
+        Store a result, replacing any older one for the same inputs
+
+        Parameters:
+        kind (str): Kind of result
+        inputs: Inputs the result was computed from
+        value: Picklable result
+        """
+        key = result_key(kind, inputs)
+        now = time.time()
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO results (key, kind, value, created, accessed) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now, now)
+            )
+        except (sqlite3.Error, OSError):
+            return
+
+        with self._writes_lock:
+            self._writes += 1
+            prune = self._writes % PRUNE_INTERVAL == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        """Delete expired entries and the least recently used ones beyond max_entries"""
+        try:
+            connection = self._connection()
+            connection.execute("DELETE FROM results WHERE created <= ?", (time.time() - self.ttl,))
+            (count,) = connection.execute("SELECT COUNT(*) FROM results").fetchone()
+            if count > self.max_entries:
+                connection.execute(
+                    "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY accessed LIMIT ?)",
+                    (count - self.max_entries,)
+                )
+        except (sqlite3.Error, OSError):
+            pass
+
+    def cached(self, kind, inputs, compute):
+        """
+        Get a stored result, computing and storing it when missing
+
+        Parameters:
+        kind (str): Kind of result
+        inputs: Inputs the result is computed from
+        compute (callable): Computes the result, called without arguments
+
+        Returns:
+        The stored or freshly computed result
+        """
+        value = self.get(kind, inputs)
+        if value is None:
+            value = compute()
+            self.put(kind, inputs, value)
+        return value
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_result_store():
+    """
+    Get the process-wide result store configured by the environment
+
+    Returns:
+    ResultStore: The store, or None when HOMEDECIDE_RESULT_STORE is not set
+    """
+    global _store
+    path = os.environ.get(RESULT_STORE_PATH_ENV)
+    if not path:
+        return None
+    if _store is None or _store.path != path:
+        with _store_lock:
+            if _store is None or _store.path != path:
+                _store = ResultStore(
+                    path,
+                    ttl=float(os.environ.get(RESULT_STORE_TTL_ENV, DEFAULT_TTL)),
+                    max_entries=int(os.environ.get(RESULT_STORE_MAX_ENTRIES_ENV, DEFAULT_MAX_ENTRIES))
+                )
+    return _store
+
+def cached_result(kind, inputs, compute):
+    """
+    Compute a result through the shared result store when it is enabled
+
+    Parameters:
+    kind (str): Kind of result
+    inputs: JSON-serializable inputs the result is computed from
+    compute (callable): Computes the result, called without arguments
+
+    Returns:
+    The stored or freshly computed result
+    """
+    store = get_result_store()
+    if store is None:
+        return compute()
+    return store.cached(kind, inputs, compute)
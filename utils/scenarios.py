@@ -0,0 +1,146 @@
+import numpy as np
+import pandas as pd
+
+from utils.calculations import calculate_affordability
+from utils.projection import build_projection
+from utils.tax import TaxProfile, province_index
+from utils.timing import timed
+
+# Columns every scenario must provide
+REQUIRED_COLUMNS = ["home_price", "down_payment_percent", "interest_rate", "loan_term_years", "monthly_rent"]
+
+# Optional columns and the values used when they are missing or blank,
+# matching the defaults of the Streamlit inputs
+SCENARIO_DEFAULTS = {
+    "property_tax_rate": 0.7,
+    "maintenance_cost": 5000.0,
+    "appreciation_rate": 3.0,
+    "selling_cost_percent": 5.0,
+    "rent_increase_rate": 3.0,
+    "investment_return_rate": 5.0,
+}
+
+# Optional columns of taxed scenarios (those with tax_province and monthly_income), with their defaults
+TAX_DEFAULTS = {
+    "fhsa_amount": 0.0,
+    "hbp_amount": 0.0,
+    "hbp_repaid": True,
+}
+
+# Columns of the evaluated results
+RESULT_COLUMNS = ["monthly_payment", "net_buying_cost", "adjusted_renting_cost", "break_even_year"]
+
+# Scenarios projected per pass, to bound the size of the yearly arrays
+CHUNK_SIZE = 50000
+
+def _column(scenarios, name):
+    """Get a scenario column as a float array, filling blanks with its default"""
+    if name not in scenarios:
+        return np.full(len(scenarios), SCENARIO_DEFAULTS[name])
+    values = scenarios[name].astype(float)
+    if name in SCENARIO_DEFAULTS:
+        values = values.fillna(SCENARIO_DEFAULTS[name])
+    return values.to_numpy()
+
+def _tax_profile(scenarios):
+    """
+    Tax profile of a chunk, None unless it has tax_province and monthly_income columns
+
+    Rows with a blank tax_province are left untaxed.
+    """
+    if "tax_province" not in scenarios or "monthly_income" not in scenarios:
+        return None
+    def optional(name, dtype):
+        if name not in scenarios:
+            return TAX_DEFAULTS[name]
+        return scenarios[name].fillna(TAX_DEFAULTS[name]).to_numpy().astype(dtype)
+
+    province = scenarios["tax_province"]
+    taxed = (province.notna() & (province.astype(str).str.strip() != "")).to_numpy()
+    # Untaxed rows get any schedule and income; the taxed mask zeroes their tax
+    schedule = np.zeros(len(scenarios), dtype=int)
+    schedule[taxed] = province_index(province[taxed].to_numpy())
+    monthly_income = np.where(taxed, scenarios["monthly_income"].astype(float).to_numpy(), 0.0)
+
+    return TaxProfile(
+        monthly_income * 12,
+        schedule,
+        optional("fhsa_amount", float),
+        optional("hbp_amount", float),
+        optional("hbp_repaid", bool),
+        taxed,
+    )
+
+def _evaluate_chunk(scenarios):
+    home_price = _column(scenarios, "home_price")
+    down_payment = home_price * _column(scenarios, "down_payment_percent") / 100
+    tax_profile = _tax_profile(scenarios)
+
+    projection = build_projection(
+        home_price,
+        down_payment,
+        _column(scenarios, "interest_rate"),
+        _column(scenarios, "loan_term_years").astype(int),
+        _column(scenarios, "property_tax_rate"),
+        _column(scenarios, "maintenance_cost"),
+        _column(scenarios, "appreciation_rate"),
+        _column(scenarios, "monthly_rent"),
+        _column(scenarios, "rent_increase_rate"),
+        _column(scenarios, "investment_return_rate"),
+        _column(scenarios, "selling_cost_percent"),
+        tax_profile=tax_profile,
+    )
+
+    # Scenarios that never break even have no break-even year
+    break_even_year = pd.array(projection.break_even_year, dtype="Int64")
+    break_even_year[projection.break_even_year == 0] = pd.NA
+
+    results = pd.DataFrame({
+        "monthly_payment": projection.monthly_mortgage,
+        "net_buying_cost": projection.net_buying_cost,
+        "adjusted_renting_cost": projection.adjusted_renting_cost,
+        "break_even_year": break_even_year,
+    }, index=scenarios.index)
+
+    if tax_profile is not None:
+        results["buying_tax"] = projection.buying_tax
+        results["capital_gains_tax"] = projection.capital_gains_tax
+
+    if "monthly_income" in scenarios:
+        results["mortgage_affordability"] = calculate_affordability(
+            projection.monthly_mortgage, scenarios["monthly_income"].astype(float).to_numpy()
+        )
+
+    return results
+
+@timed
+def evaluate_scenarios(scenarios, chunk_size=CHUNK_SIZE):
+    """
+    Evaluate a table of rent-vs-buy scenarios in vectorized passes
+
+    Parameters:
+    scenarios (pandas.DataFrame): One scenario per row, with the REQUIRED_COLUMNS
+        and optionally any of SCENARIO_DEFAULTS and monthly_income. With both
+        monthly_income and a tax_province column (province codes or cities,
+        see utils.tax), income tax is applied to the rows with a province,
+        with any of TAX_DEFAULTS
+    chunk_size (int): Maximum number of scenarios projected per pass
+
+    Returns:
+    pandas.DataFrame: monthly_payment, net_buying_cost, adjusted_renting_cost and
+        break_even_year (missing if buying never wins) per scenario, plus
+        buying_tax and capital_gains_tax when taxed and mortgage_affordability
+        when monthly_income is given
+    """
+    missing = [name for name in REQUIRED_COLUMNS if name not in scenarios]
+    if missing:
+        raise ValueError(f"Scenarios are missing required columns: {', '.join(missing)}")
+
+    if scenarios.empty:
+        return pd.DataFrame(columns=RESULT_COLUMNS, index=scenarios.index)
+
+    chunks = [
+        _evaluate_chunk(scenarios.iloc[start:start + chunk_size])
+        for start in range(0, len(scenarios), chunk_size)
+    ]
+    return pd.concat(chunks) if len(chunks) > 1 else chunks[0]
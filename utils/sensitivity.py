@@ -0,0 +1,94 @@
+import numpy as np
+
+from utils.projection import APPRECIATION_CAP, build_projection
+from utils.timing import timed
+
+# Parameters that can be swept, with their label, how far the sweep reaches
+# on either side of the current value, and the bounds it is clipped to.
+# Relative spans are fractions of the current value, absolute ones are in
+# the parameter's own units.
+SENSITIVITY_PARAMETERS = {
+    "interest_rate": {"label": "Interest Rate (%)", "span": 3.0, "bounds": (0.0, 15.0)},
+    "appreciation_rate": {"label": "Home Appreciation (%/year)", "span": 3.0, "bounds": (-2.0, 10.0)},
+    "down_payment_percent": {"label": "Down Payment (%)", "span": 15.0, "bounds": (5.0, 95.0)},
+    "rent_increase_rate": {"label": "Rent Increase (%/year)", "span": 3.0, "bounds": (0.0, 12.0)},
+    "investment_return_rate": {"label": "Investment Return (%/year)", "span": 4.0, "bounds": (0.0, 15.0)},
+    "property_tax_rate": {"label": "Property Tax Rate (%/year)", "span": 0.5, "bounds": (0.0, 5.0)},
+    "selling_cost_percent": {"label": "Selling Costs (%)", "span": 3.0, "bounds": (0.0, 10.0)},
+    "home_price": {"label": "Home Price ($)", "span": 0.5, "relative": True, "bounds": (50000.0, 5000000.0)},
+    "monthly_rent": {"label": "Monthly Rent ($)", "span": 0.5, "relative": True, "bounds": (0.0, 10000.0)},
+}
+
+def sensitivity_axis(name, current, size):
+    """
+    Get the values swept for a parameter around its current value
+
+    Parameters:
+    name (str): Parameter name, a key of SENSITIVITY_PARAMETERS
+    current (float): Current value of the parameter
+    size (int): Number of values
+
+    Returns:
+    numpy.ndarray: Evenly spaced values
+    """
+    spec = SENSITIVITY_PARAMETERS[name]
+    span = spec["span"] * current if spec.get("relative") else spec["span"]
+    low, high = spec["bounds"]
+    return np.linspace(max(current - span, low), min(current + span, high), size)
+
+@timed
+def build_sensitivity_grid(inputs, x_parameter, y_parameter, size=100, tax_profile=None):
+    """
+    Evaluate the comparison over a grid of two parameters in one batched pass
+
+    Parameters:
+    inputs (dict): Current scenario inputs: home_price, down_payment_percent,
+        interest_rate, loan_term_years, property_tax_rate, maintenance_cost,
+        appreciation_rate, selling_cost_percent, monthly_rent,
+        rent_increase_rate and investment_return_rate, optionally
+        maintenance_inflation_rate and appreciation_cap as for
+        utils.projection.build_projection
+    x_parameter (str): Parameter along the columns
+    y_parameter (str): Parameter along the rows
+    size (int): Number of values per axis
+    tax_profile (TaxProfile): The buyer's income tax, as for
+        utils.projection.build_projection; None leaves tax out
+
+    Returns:
+    dict: x and y axis values, buying_advantage (adjusted renting cost minus
+        net buying cost, positive when buying wins) and break_even_year
+        (0 when buying never wins), both of shape (size, size)
+    """
+    if x_parameter == y_parameter:
+        raise ValueError("Sensitivity axes must be two different parameters")
+
+    x = sensitivity_axis(x_parameter, inputs[x_parameter], size)
+    y = sensitivity_axis(y_parameter, inputs[y_parameter], size)
+
+    grid = dict(inputs)
+    grid[x_parameter] = x[None, :]
+    grid[y_parameter] = y[:, None]
+
+    projection = build_projection(
+        grid["home_price"],
+        grid["home_price"] * grid["down_payment_percent"] / 100,
+        grid["interest_rate"],
+        grid["loan_term_years"],
+        grid["property_tax_rate"],
+        grid["maintenance_cost"],
+        grid["appreciation_rate"],
+        grid["monthly_rent"],
+        grid["rent_increase_rate"],
+        grid["investment_return_rate"],
+        grid["selling_cost_percent"],
+        grid.get("maintenance_inflation_rate"),
+        grid.get("appreciation_cap", APPRECIATION_CAP),
+        tax_profile,
+    )
+
+    return {
+        "x": x,
+        "y": y,
+        "buying_advantage": projection.adjusted_renting_cost - projection.net_buying_cost,
+        "break_even_year": projection.break_even_year,
+    }
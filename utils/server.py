@@ -0,0 +1,575 @@
+"""
+JSON HTTP API for rent-vs-buy comparisons
+
+Usage:
+    python -m utils.server --host 0.0.0.0 --port 8000 --workers 4
+
+Endpoints:
+    GET  /health        {"status": "ok"}
+    GET  /metrics       Timings and cache counters in the Prometheus text
+                        format (utils.timing); timings need HOMEDECIDE_TIMING
+    POST /compare       One scenario object, answered with the full comparison
+                        shown by the Streamlit app (utils.comparison)
+    POST /compare/bulk  {"scenarios": [...]}, answered with {"results": [...]},
+                        the per-scenario figures of utils.scenarios
+    POST /solve         One scenario object with a "target" of utils.solver
+                        (max_price, min_down_payment, max_interest_rate) and
+                        that target's inputs, answered with {"target": ...,
+                        "value": ..., "inputs": {...}}; value is null when the
+                        target cannot be met
+    POST /solve/bulk    {"target": ..., "scenarios": [...]}, answered with
+                        {"results": [...]}, the solved value per scenario
+    POST /compare/properties
+                        {"properties": [...], ...buyer fields}, answered with
+                        {"results": [...]}, the candidates ranked as by
+                        utils.properties; the buyer fields (monthly_income,
+                        down_payment_percent, interest_rate, loan_term_years,
+                        optional scenario and tax fields) apply to every
+                        candidate that does not set its own
+
+Scenarios use the column names of utils.scenarios. /compare also needs
+monthly_income, and applies income tax when given a tax_province (with
+optional fhsa_amount, hbp_amount and hbp_repaid, see utils.tax). Wherever
+monthly_rent is needed it may be left out when bedrooms and an area are
+given with either latitude and longitude, in which case the median rent of
+nearby listings is used (utils.listings), or an area (city, optionally
+narrowed down by neighbourhood or postal_code, or province), in which case
+the most specific rent available is used.
+
+Connections are kept alive between requests (HTTP/1.1). Single comparisons
+are answered on the event loop, from the comparison cache when the same
+inputs were seen before, then from the shared result store if one is
+configured. Otherwise those arriving in the same pass of the loop are
+compared together in one vectorized call, which costs little more than
+comparing one. Bulk requests and solves run on a process pool so the loop
+keeps serving. With --processes N, N server processes share the port
+(SO_REUSEPORT) to use more cores.
+"""
+import argparse
+import asyncio
+import importlib
+import json
+import math
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from multiprocessing import get_context
+
+import numpy as np
+import pandas as pd
+
+from utils.comparison import comparison_key, get_comparison_cache, run_comparison
+from utils.data_handler import get_nearby_rent, get_rent_estimate
+from utils.result_store import get_result_store
+from utils.scenarios import REQUIRED_COLUMNS, SCENARIO_DEFAULTS, TAX_DEFAULTS, evaluate_scenarios
+from utils.solver import SOLVERS, solve, solve_scenarios
+from utils.tax import province_index
+from utils.timing import prometheus_text
+
+DEFAULT_PORT = 8000
+
+# Limits on what a client may send
+MAX_BODY_SIZE = 32 * 1024 * 1024
+MAX_BULK_SCENARIOS = 100000
+MAX_BULK_PROPERTIES = 500
+
+# Buyer fields every /compare/properties request gives
+BUYER_FIELDS = ["monthly_income", "down_payment_percent", "interest_rate", "loan_term_years"]
+
+# Content type of the Prometheus text format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Idle keep-alive connections are closed after this many seconds
+KEEP_ALIVE_TIMEOUT = 75.0
+
+# Scenario fields locating the home, used to look up the rent when it is left out
+AREA_FIELDS = ["city", "neighbourhood", "postal_code", "province"]
+
+class RequestError(Exception):
+    """A request that cannot be answered, with the HTTP status to report"""
+
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def _number(scenario, name):
+    value = scenario[name]
+    if isinstance(value, bool) or not isinstance(value, (int, float)) or not math.isfinite(value):
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be a number")
+    return value
+
+def parse_scenario(scenario, required=None, defaults=SCENARIO_DEFAULTS):
+    """
+    Validate one scenario of a /compare or /solve request and fill in its defaults
+
+    Parameters:
+    scenario (dict): Decoded JSON scenario
+    required (list): Fields that must be given (or, for monthly_rent, looked up),
+        defaults to those of a comparison
+    defaults (dict): Optional fields and their values when left out
+
+    Returns:
+    dict: The required and optional fields as numbers, e.g. keyword arguments for run_comparison
+    """
+    if not isinstance(scenario, dict):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Scenario must be a JSON object")
+    required = REQUIRED_COLUMNS + ["monthly_income"] if required is None else required
+
+    scenario = {**defaults, **{name: value for name, value in scenario.items() if value is not None}}
+    located = "latitude" in scenario and "longitude" in scenario
+    needs_rent = "monthly_rent" in required and scenario.get("monthly_rent") is None
+    if needs_rent and located and "bedrooms" in scenario:
+        latitude, longitude = _number(scenario, "latitude"), _number(scenario, "longitude")
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise RequestError(HTTPStatus.BAD_REQUEST, "latitude or longitude out of range")
+        comparables = get_nearby_rent(latitude, longitude, _number(scenario, "bedrooms"))
+        if comparables is not None:
+            scenario["monthly_rent"] = comparables["median_rent"]
+
+    areas = {name: scenario[name] for name in AREA_FIELDS if name in scenario}
+    needs_rent = "monthly_rent" in required and scenario.get("monthly_rent") is None
+    if needs_rent and areas and "bedrooms" in scenario:
+        for name, value in areas.items():
+            if not isinstance(value, str):
+                raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be a string")
+        estimate = get_rent_estimate(_number(scenario, "bedrooms"), **areas)
+        if estimate is None:
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"No rent data for {', '.join(areas.values())}")
+        scenario["monthly_rent"] = estimate["rent"]
+
+    missing = [name for name in required if scenario.get(name) is None]
+    if missing:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"Scenario is missing: {', '.join(missing)}")
+
+    parsed = {name: _number(scenario, name) for name in required + list(defaults)}
+    for name in ("loan_term_years", "target_year"):
+        if name in parsed and (parsed[name] < 1 or parsed[name] != int(parsed[name])):
+            raise RequestError(HTTPStatus.BAD_REQUEST, f"{name} must be a whole number of years")
+    return parsed
+
+def parse_tax(scenario):
+    """
+    Validate the tax fields of a /compare request
+
+    Parameters:
+    scenario (dict): Decoded JSON scenario
+
+    Returns:
+    dict: province, fhsa_amount, hbp_amount and hbp_repaid for run_comparison,
+        empty when the scenario has no tax_province
+    """
+    province = scenario.get("tax_province")
+    if province is None:
+        return {}
+    if not isinstance(province, str):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "tax_province must be a string")
+    try:
+        province_index(province)
+    except ValueError as error:
+        raise RequestError(HTTPStatus.BAD_REQUEST, str(error))
+
+    tax = {**TAX_DEFAULTS, **{name: scenario[name] for name in TAX_DEFAULTS if scenario.get(name) is not None}}
+    if not isinstance(tax["hbp_repaid"], bool):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "hbp_repaid must be true or false")
+    return {
+        "province": province,
+        "fhsa_amount": _number(tax, "fhsa_amount"),
+        "hbp_amount": _number(tax, "hbp_amount"),
+        "hbp_repaid": tax["hbp_repaid"],
+    }
+
+def _rent_area(payload):
+    """Validate the city and bedrooms of a /compare request, which its cache key includes"""
+    city = payload.get("city")
+    if city is not None and not isinstance(city, str):
+        raise RequestError(HTTPStatus.BAD_REQUEST, "city must be a string")
+    bedrooms = None if payload.get("bedrooms") is None else _number(payload, "bedrooms")
+    return city, bedrooms
+
+def _target(payload):
+    """Get the solver spec named by a /solve request's target"""
+    target = payload.get("target") if isinstance(payload, dict) else None
+    if target not in SOLVERS:
+        raise RequestError(HTTPStatus.BAD_REQUEST, f"target must be one of: {', '.join(SOLVERS)}")
+    return target, SOLVERS[target]
+
+def _finite(value):
+    """JSON has no infinity or NaN; report them as null"""
+    if isinstance(value, float) and not math.isfinite(value):
+        return None
+    return value
+
+class ComparisonBatcher:
+    """
+    Compare the scenarios submitted during one pass of the event loop together
+
+    The first submission schedules a flush for the next pass; every scenario
+    submitted until then joins one vectorized run_comparison call with the
+    others that have the same fields, so taxed and untaxed scenarios are
+    compared apart.
+    """
+
+    def __init__(self):
+        self._pending = []
+
+    def submit(self, scenario):
+        """
+        Queue a scenario for comparison
+
+        Parameters:
+        scenario (dict): Keyword arguments for run_comparison, as from parse_scenario
+
+        Returns:
+        asyncio.Future: Resolves to the comparison, as from run_comparison
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._pending:
+            loop.call_soon(self._flush)
+        self._pending.append((scenario, future))
+        return future
+
+    def _flush(self):
+        pending, self._pending = self._pending, []
+        # Only scenarios with the same fields stack into columns, e.g. taxed ones apart from untaxed ones
+        groups = {}
+        for scenario, future in pending:
+            groups.setdefault(tuple(sorted(scenario)), []).append((scenario, future))
+        for group in groups.values():
+            self._compare(group)
+
+    def _compare(self, pending):
+        """Compare scenarios with the same fields in one call, resolving their futures"""
+        scenarios = [scenario for scenario, _ in pending]
+        try:
+            columns = {name: np.array([scenario[name] for scenario in scenarios]) for name in scenarios[0]}
+            columns["loan_term_years"] = columns["loan_term_years"].astype(int)
+            comparison = run_comparison(**columns)
+        except Exception:
+            # Compare one by one so a failure only affects its own request
+            for scenario, future in pending:
+                if future.cancelled():
+                    continue
+                try:
+                    result = run_comparison(**scenario)
+                except Exception as error:
+                    future.set_exception(error)
+                else:
+                    future.set_result(result)
+            return
+
+        columns = {name: values.tolist() for name, values in comparison.items()}
+        for name in ("break_even_year", "break_even_month"):
+            # 0 marks scenarios that never break even in a batch
+            columns[name] = [value or None for value in columns[name]]
+        for index, (_, future) in enumerate(pending):
+            if not future.cancelled():
+                future.set_result({name: values[index] for name, values in columns.items()})
+
+def score_bulk(scenarios):
+    """
+    Score the scenarios of a /compare/bulk request; runs in worker processes
+
+    Parameters:
+    scenarios (list): Decoded JSON scenario objects
+
+    Returns:
+    bytes: The JSON response body
+    """
+    # Imported here so the server process does not load the batch helpers
+    from utils.batch import fill_missing_rents
+
+    frame = fill_missing_rents(pd.DataFrame.from_records(scenarios))
+    results = evaluate_scenarios(frame)
+    return b'{"results":' + results.to_json(orient="records", double_precision=15).encode() + b"}"
+
+def solve_bulk(target, scenarios):
+    """
+    Solve the scenarios of a /solve/bulk request; runs in worker processes
+
+    Parameters:
+    target (str): One of utils.solver.SOLVERS
+    scenarios (list): Decoded JSON scenario objects
+
+    Returns:
+    bytes: The JSON response body
+    """
+    from utils.batch import fill_missing_rents
+
+    frame = pd.DataFrame.from_records(scenarios)
+    if "monthly_rent" in SOLVERS[target]["inputs"]:
+        frame = fill_missing_rents(frame)
+    values = solve_scenarios(frame, target).to_frame("value")
+    return b'{"results":' + values.to_json(orient="records", double_precision=15).encode() + b"}"
+
+def compare_properties_bulk(properties, shared):
+    """
+    Rank the candidates of a /compare/properties request; runs in worker processes
+
+    Parameters:
+    properties (list): Decoded JSON property objects
+    shared (dict): Buyer inputs for run_comparison, as from parse_scenario and parse_tax
+
+    Returns:
+    bytes: The JSON response body
+    """
+    from utils.properties import compare_properties
+
+    ranking = compare_properties(pd.DataFrame.from_records(properties), **shared)
+    return b'{"results":' + ranking.to_json(orient="records", double_precision=15).encode() + b"}"
+
+def _warm_up():
+    """Load the scoring modules in a worker before the first bulk request"""
+    for module in ("utils.batch", "utils.properties"):
+        importlib.import_module(module)
+
+def _json_body(body):
+    try:
+        return json.loads(body)
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Body is not valid JSON")
+
+async def _compare_uncached(key, scenario, batcher):
+    """Compare a scenario missing from the in-memory cache, via the shared result store if enabled"""
+    store = get_result_store()
+    if store is None:
+        return await batcher.submit(scenario)
+
+    # SQLite calls may wait on other replicas' locks, so they run off the event loop
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, store.get, "comparison", key)
+    if result is None:
+        result = await batcher.submit(scenario)
+        loop.run_in_executor(None, store.put, "comparison", key, result)
+    return result
+
+async def handle_request(method, path, body, executor, batcher):
+    """
+    Answer one request
+
+    Parameters:
+    method (str): HTTP method
+    path (str): Request path, without any query string
+    body (bytes): Request body
+    executor (concurrent.futures.Executor): Pool for solving and bulk scoring
+    batcher (ComparisonBatcher): Batcher for single comparisons
+
+    Returns:
+    tuple: (HTTPStatus, body as bytes), JSON except for /metrics
+    """
+    routes = {
+        "/health": "GET", "/metrics": "GET", "/compare": "POST", "/compare/bulk": "POST",
+        "/solve": "POST", "/solve/bulk": "POST", "/compare/properties": "POST",
+    }
+    if path not in routes:
+        raise RequestError(HTTPStatus.NOT_FOUND, f"No such endpoint: {path}")
+    if method != routes[path]:
+        raise RequestError(HTTPStatus.METHOD_NOT_ALLOWED, f"{path} only accepts {routes[path]}")
+
+    if path == "/health":
+        return HTTPStatus.OK, b'{"status":"ok"}'
+    if path == "/metrics":
+        return HTTPStatus.OK, prometheus_text().encode()
+
+    payload = _json_body(body)
+
+    if path == "/compare":
+        scenario = {**parse_scenario(payload), **parse_tax(payload)}
+        city, bedrooms = _rent_area(payload)
+        key = comparison_key(city=city, bedrooms=bedrooms, **scenario)
+        cache = get_comparison_cache()
+        result = cache.get(key)
+        if result is None:
+            result = await _compare_uncached(key, scenario, batcher)
+            cache.put(key, result)
+        return HTTPStatus.OK, json.dumps({name: _finite(value) for name, value in result.items()}).encode()
+
+    if path == "/solve":
+        target, spec = _target(payload)
+        inputs = parse_scenario(payload, spec["inputs"], spec["defaults"])
+        # A solve takes a few projections; off the loop, it holds up no other request
+        job = partial(solve, target, **inputs)
+        try:
+            value = await asyncio.get_running_loop().run_in_executor(executor, job)
+        except (ValueError, TypeError) as error:
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(error))
+        return HTTPStatus.OK, json.dumps({"target": target, "value": _finite(value), "inputs": inputs}).encode()
+
+    if path == "/compare/properties":
+        properties = payload.get("properties") if isinstance(payload, dict) else None
+        if not isinstance(properties, list) or not all(isinstance(p, dict) for p in properties):
+            raise RequestError(HTTPStatus.BAD_REQUEST, 'Body must be {"properties": [ ... ], ...}')
+        if len(properties) > MAX_BULK_PROPERTIES:
+            raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                               f"At most {MAX_BULK_PROPERTIES} properties per request")
+        shared = {**parse_scenario(payload, BUYER_FIELDS), **parse_tax(payload)}
+        if not properties:
+            return HTTPStatus.OK, b'{"results":[]}'
+        job = partial(compare_properties_bulk, shared=shared)
+        try:
+            body = await asyncio.get_running_loop().run_in_executor(executor, job, properties)
+        except (ValueError, TypeError) as error:
+            raise RequestError(HTTPStatus.BAD_REQUEST, str(error))
+        return HTTPStatus.OK, body
+
+    scenarios = payload.get("scenarios") if isinstance(payload, dict) else None
+    if not isinstance(scenarios, list) or not all(isinstance(s, dict) for s in scenarios):
+        raise RequestError(HTTPStatus.BAD_REQUEST, 'Body must be {"scenarios": [ ... ]}')
+    if not scenarios:
+        return HTTPStatus.OK, b'{"results":[]}'
+    if len(scenarios) > MAX_BULK_SCENARIOS:
+        raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                           f"At most {MAX_BULK_SCENARIOS} scenarios per request")
+
+    if path == "/solve/bulk":
+        target, _ = _target(payload)
+        job = partial(solve_bulk, target)
+    else:
+        job = score_bulk
+
+    try:
+        body = await asyncio.get_running_loop().run_in_executor(executor, job, scenarios)
+    except (ValueError, TypeError) as error:
+        raise RequestError(HTTPStatus.BAD_REQUEST, str(error))
+    return HTTPStatus.OK, body
+
+def _response(status, body, keep_alive, content_type="application/json"):
+    head = (
+        f"HTTP/1.1 {status.value} {status.phrase}\r\n"
+        f"Content-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n"
+        f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n"
+    )
+    return head.encode("latin-1") + body
+
+def _error_body(message):
+    return json.dumps({"error": message}).encode()
+
+async def _read_request(reader):
+    """Read one request; returns None when the client closed the connection"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise RequestError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, "Request headers are too large")
+
+    request_line, *header_lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = request_line.split(" ")
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Malformed request line")
+
+    headers = {}
+    for line in header_lines:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+
+    if "transfer-encoding" in headers:
+        raise RequestError(HTTPStatus.LENGTH_REQUIRED, "Chunked bodies are not supported, send Content-Length")
+    try:
+        length = int(headers.get("content-length", 0))
+    except ValueError:
+        raise RequestError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length")
+    if length > MAX_BODY_SIZE:
+        raise RequestError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, "Request body is too large")
+    body = await reader.readexactly(length) if length else b""
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+    return method, target.split("?", 1)[0], body, keep_alive
+
+async def _handle_connection(reader, writer, executor, batcher):
+    try:
+        while True:
+            try:
+                request = await _read_request(reader)
+            except RequestError as error:
+                # The rest of the stream cannot be trusted after a bad request
+                writer.write(_response(HTTPStatus(error.status), _error_body(str(error)), False))
+                await writer.drain()
+                break
+            if request is None:
+                break
+
+            method, path, body, keep_alive = request
+            try:
+                status, response = await handle_request(method, path, body, executor, batcher)
+            except RequestError as error:
+                status, response = HTTPStatus(error.status), _error_body(str(error))
+            except Exception as error:
+                status, response = HTTPStatus.INTERNAL_SERVER_ERROR, _error_body(f"Internal error: {error}")
+
+            content_type = METRICS_CONTENT_TYPE if path == "/metrics" and status == HTTPStatus.OK else "application/json"
+            writer.write(_response(status, response, keep_alive, content_type))
+            await writer.drain()
+            if not keep_alive:
+                break
+    except (ConnectionError, asyncio.IncompleteReadError):
+        pass
+    finally:
+        writer.close()
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, workers=None, reuse_port=False):
+    """
+    Serve the API until cancelled
+
+    Parameters:
+    host (str): Interface to listen on
+    port (int): Port to listen on
+    workers (int): Processes in the bulk scoring pool, defaults to the number of CPUs
+    reuse_port (bool): Let other server processes listen on the same port
+    """
+    workers = workers or os.cpu_count() or 1
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+    for _ in range(workers):
+        executor.submit(_warm_up)
+    try:
+        server = await asyncio.start_server(
+            partial(_handle_connection, executor=executor, batcher=ComparisonBatcher()),
+            host, port, backlog=1024, reuse_port=reuse_port or None
+        )
+        async with server:
+            await server.serve_forever()
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+def _run(host, port, workers, reuse_port):
+    try:
+        asyncio.run(serve(host, port, workers, reuse_port))
+    except KeyboardInterrupt:
+        pass
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve rent-vs-buy comparisons over HTTP")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument("--workers", type=int, default=None, help="Bulk scoring processes per server process")
+    parser.add_argument("--processes", type=int, default=1, help="Server processes sharing the port")
+    args = parser.parse_args(argv)
+
+    print(f"Serving on http://{args.host}:{args.port}", file=sys.stderr)
+    if args.processes <= 1:
+        _run(args.host, args.port, args.workers, False)
+        return 0
+
+    context = get_context("spawn")
+    processes = [
+        context.Process(target=_run, args=(args.host, args.port, args.workers, True))
+        for _ in range(args.processes)
+    ]
+    for process in processes:
+        process.start()
+    try:
+        for process in processes:
+            process.join()
+    except KeyboardInterrupt:
+        for process in processes:
+            process.join()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
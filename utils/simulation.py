@@ -0,0 +1,212 @@
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+from utils.projection import (
+    APPRECIATION_CAP,
+    MAINTENANCE_GROWTH_CAP,
+    RatePath,
+    build_projection,
+    monthly_positions
+)
+from utils.timing import timed
+
+# Growth inputs drawn per path and year, with their default distributions.
+# Standard deviations are in percentage points around the deterministic rate.
+STOCHASTIC_RATES = ("appreciation_rate", "rent_increase_rate", "investment_return_rate")
+
+DEFAULT_DISTRIBUTIONS = {
+    "appreciation_rate": {"kind": "normal", "std": 4.0},
+    "rent_increase_rate": {"kind": "normal", "std": 1.5},
+    "investment_return_rate": {"kind": "normal", "std": 10.0},
+}
+
+DEFAULT_PERCENTILES = (5, 25, 50, 75, 95)
+
+# Paths per chunk; chunks are the unit of both vectorization and parallelism
+CHUNK_SIZE = 10000
+
+# Paths behind the monthly bands; a few thousand pin the percentiles down
+# well enough to draw, at a fraction of the cost of spreading every path
+MONTHLY_PATHS = 2000
+
+def draw_rates(rng, distribution, mean, size):
+    """
+    Draw yearly rates from a distribution spec
+
+    Parameters:
+    rng (numpy.random.Generator): Random generator
+    distribution (dict): Spec with a "kind" of "normal" (std), "student_t"
+        (std, df), "uniform" (low, high) or "fixed"; normal and student_t are
+        centred on "mean" if given, otherwise on the deterministic rate
+    mean (float or numpy.ndarray): Deterministic rate (percentage), or one per year
+    size (tuple): Shape of the draw, (paths, years)
+
+    Returns:
+    numpy.ndarray: Rates in percentage
+    """
+    kind = distribution.get("kind", "normal")
+    centre = distribution.get("mean", mean)
+
+    if kind == "normal":
+        return rng.normal(centre, distribution["std"], size)
+    if kind == "student_t":
+        # Scale the t draws so their standard deviation matches "std"
+        df = distribution.get("df", 5)
+        scale = distribution["std"] * np.sqrt((df - 2) / df)
+        return centre + scale * rng.standard_t(df, size)
+    if kind == "uniform":
+        return rng.uniform(distribution["low"], distribution["high"], size)
+    if kind == "fixed":
+        return np.full(size, centre, dtype=float)
+    raise ValueError(f"Unknown distribution kind: {kind}")
+
+def _simulate_chunk(scenario, distributions, seed_sequence, paths, monthly=False):
+    """Project one chunk of paths, with their monthly buying advantage if asked; runs in worker processes"""
+    rng = np.random.default_rng(seed_sequence)
+    years = scenario["loan_term_years"]
+
+    # The cap bounds the expected appreciation, not each year's draw: capping the
+    # draws would cut only their upside and bias every path against buying
+    cap = scenario["appreciation_cap"]
+    rates = dict(scenario, appreciation_cap=None)
+    for name in STOCHASTIC_RATES:
+        # A custom inflation scenario's path is the centre of the draws
+        mean = scenario[name].years(years) if isinstance(scenario[name], RatePath) else scenario[name]
+        distribution = distributions[name]
+        if name == "appreciation_rate" and cap is not None:
+            mean = np.minimum(mean, cap)
+            if "mean" in distribution:
+                distribution = dict(distribution, mean=min(distribution["mean"], cap))
+        if name == "appreciation_rate" and scenario["maintenance_inflation_rate"] is None:
+            # Maintenance grows as in the deterministic projection, not with each year's draw
+            maintenance = np.minimum(mean, MAINTENANCE_GROWTH_CAP)
+            rates["maintenance_inflation_rate"] = RatePath(maintenance) if np.ndim(maintenance) else maintenance
+        # Growth below -100% would turn values negative
+        yearly = draw_rates(rng, distribution, mean, (paths, years))
+        rates[name] = RatePath(np.maximum(yearly, -99.0))
+
+    projection = build_projection(**rates)
+
+    monthly_advantage = None
+    if monthly:
+        # The first MONTHLY_PATHS paths again, projected on their own to spread them over months
+        sample = dict(rates, **{name: RatePath(rates[name].rates[:MONTHLY_PATHS]) for name in STOCHASTIC_RATES})
+        positions = monthly_positions(
+            build_projection(**sample),
+            scenario["home_price"], scenario["down_payment"], scenario["selling_cost_percent"]
+        )
+        monthly_advantage = positions["renting_position"] - positions["buying_position"]
+
+    return (
+        projection.net_buying_cost,
+        projection.adjusted_renting_cost,
+        projection.break_even_year,
+        projection.renting_position - projection.buying_position,
+        monthly_advantage,
+    )
+
+_executor = None
+_executor_workers = None
+_executor_lock = threading.Lock()
+
+def _get_executor(workers):
+    """Get the process pool, kept alive between simulations"""
+    global _executor, _executor_workers
+    with _executor_lock:
+        if _executor is None or _executor_workers != workers:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            # Spawned workers are safe to start from the threaded Streamlit server
+            _executor = ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"))
+            _executor_workers = workers
+        return _executor
+
+@timed
+def simulate(home_price, down_payment, interest_rate, loan_term_years,
+             property_tax_rate, maintenance_cost, appreciation_rate,
+             monthly_rent, rent_increase_rate, investment_return_rate,
+             selling_cost_percent=0.0, paths=10000, seed=None, distributions=None,
+             percentiles=DEFAULT_PERCENTILES, workers=None, chunk_size=CHUNK_SIZE,
+             maintenance_inflation_rate=None, appreciation_cap=APPRECIATION_CAP, tax_profile=None):
+    """
+    Run a Monte Carlo simulation of the rent-vs-buy comparison
+
+    Appreciation, rent increase and investment return are drawn per path and
+    per year around the given rates (or rate paths, see RatePath);
+    everything else is fixed, including the paths of the other rates. The
+    appreciation cap applies to the rate the draws are centred on, so single
+    years may appreciate faster, and maintenance without its own inflation
+    rate grows as in the deterministic projection. Paths are
+    projected in vectorized chunks, spread over a process pool when there is
+    more than one chunk. Every chunk gets its own seed spawned from `seed`,
+    so results depend only on the seed and chunk size, not on the number of
+    workers.
+
+    Parameters:
+    home_price ... selling_cost_percent: Scenario inputs, as for build_projection
+    paths (int): Number of simulated paths
+    seed (int): Seed for reproducible results, None for fresh randomness
+    distributions (dict): Per-rate distribution specs overriding DEFAULT_DISTRIBUTIONS
+    percentiles (tuple): Percentiles reported for each band
+    workers (int): Worker processes, defaults to the number of CPUs; 1 runs inline
+    chunk_size (int): Paths per chunk
+    maintenance_inflation_rate (float or RatePath): As for build_projection
+    appreciation_cap (float): As for build_projection
+    tax_profile (TaxProfile): As for build_projection, the same on every path
+
+    Returns:
+    dict: Percentile bands of net_buying_cost, adjusted_renting_cost and the
+        yearly buying_advantage (renting minus buying position), the
+        probability that buying has broken even by each year, and the
+        probability that buying is cheaper over the whole term. The bands of
+        monthly_buying_advantage (months 0 to 12 * term) are estimated from
+        the first monthly_paths paths (at most MONTHLY_PATHS)
+    """
+    scenario = dict(
+        home_price=home_price, down_payment=down_payment, interest_rate=interest_rate,
+        loan_term_years=int(loan_term_years), property_tax_rate=property_tax_rate,
+        maintenance_cost=maintenance_cost, appreciation_rate=appreciation_rate,
+        monthly_rent=monthly_rent, rent_increase_rate=rent_increase_rate,
+        investment_return_rate=investment_return_rate, selling_cost_percent=selling_cost_percent,
+        maintenance_inflation_rate=maintenance_inflation_rate, appreciation_cap=appreciation_cap,
+        tax_profile=tax_profile,
+    )
+    distributions = {**DEFAULT_DISTRIBUTIONS, **(distributions or {})}
+
+    chunk_paths = [min(chunk_size, paths - start) for start in range(0, paths, chunk_size)]
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_paths))
+    jobs = [(scenario, distributions, chunk_seed, size, index == 0)
+            for index, (chunk_seed, size) in enumerate(zip(seeds, chunk_paths))]
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(jobs) == 1:
+        results = [_simulate_chunk(*job) for job in jobs]
+    else:
+        results = list(_get_executor(workers).map(_simulate_chunk, *zip(*jobs)))
+
+    monthly_advantage = results[0][-1]
+    net_buying_cost, adjusted_renting_cost, break_even_year, buying_advantage = (
+        np.concatenate(parts) for parts in list(zip(*results))[:-1]
+    )
+
+    # Share of paths that have broken even by the end of each year
+    # (break_even_year is 0 for paths that never do)
+    break_even_counts = np.bincount(break_even_year, minlength=scenario["loan_term_years"] + 1)
+    break_even_by_year = break_even_counts[1:].cumsum() / paths
+
+    return {
+        "paths": paths,
+        "seed": seed,
+        "percentiles": list(percentiles),
+        "net_buying_cost": np.percentile(net_buying_cost, percentiles),
+        "adjusted_renting_cost": np.percentile(adjusted_renting_cost, percentiles),
+        "buying_advantage": np.percentile(buying_advantage, percentiles, axis=0),
+        "monthly_buying_advantage": np.percentile(monthly_advantage, percentiles, axis=0),
+        "monthly_paths": min(chunk_paths[0], MONTHLY_PATHS),
+        "break_even_probability": break_even_by_year,
+        "buying_cheaper_probability": float(np.mean(net_buying_cost < adjusted_renting_cost)),
+    }
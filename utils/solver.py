@@ -0,0 +1,380 @@
+"""
+Reverse solvers: the input that meets a target, rather than the outcome of given inputs
+
+Targets (SOLVERS):
+    max_price          Highest home price whose mortgage payment stays within a
+                       share of income, by default the 25% limit of the
+                       "Affordable" status
+    min_down_payment   Smallest down payment (% of the price) with which buying
+                       breaks even by a target year
+    max_interest_rate  Highest interest rate at which buying still costs less
+                       than renting over the term
+
+The payment is proportional to the loan, so max_price is exact in closed
+form. The others search the projection: the range is scanned on a grid of
+GRID_POINTS values in one vectorized projection, the first (or last) grid
+value meeting the target brackets the answer, and the bracket is narrowed
+with the Illinois variant of regula falsi. The margins are smooth in the
+solved input (linear in the down payment), so that takes a handful of
+projections. Every solver takes arrays and solves all scenarios together;
+answers are NaN (None for a single scenario) where no value in the range
+meets the target.
+"""
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from utils.calculations import AFFORDABILITY_LIMITS, calculate_mortgage_payment
+from utils.data_handler import get_available_cities, get_average_rents
+from utils.projection import APPRECIATION_CAP, build_projection
+from utils.scenarios import CHUNK_SIZE, SCENARIO_DEFAULTS
+from utils.timing import timed
+
+# Ranges searched, in percent; Canada's minimum down payment is 5%
+DOWN_PAYMENT_RANGE = (5.0, 100.0)
+INTEREST_RATE_RANGE = (0.0, 20.0)
+
+# Values per scan of the range; a feasible stretch narrower than a grid step may be missed
+GRID_POINTS = 17
+
+# Width of the final bracket, in units of the solved input (percentage points)
+TOLERANCE = 1e-4
+MAX_ITERATIONS = 50
+
+def _unwrap(values, shape):
+    """Shape the flat answers like the inputs; a single answer is a float, or None if not found"""
+    values = values.reshape(shape)
+    if values.ndim == 0:
+        return None if np.isnan(values) else float(values)
+    return values
+
+def _flatten(*values):
+    """Broadcast inputs together and flatten them to one scenario per entry"""
+    arrays = np.broadcast_arrays(*(np.asarray(value, dtype=float) for value in values))
+    return arrays[0].shape, [array.reshape(-1) for array in arrays]
+
+@timed
+def max_affordable_price(monthly_income, down_payment_percent, interest_rate, loan_term_years,
+                         max_affordability=AFFORDABILITY_LIMITS[0]):
+    """
+    Find the highest home price whose mortgage payment stays within a share of income
+
+    Parameters:
+    monthly_income (float or numpy.ndarray): Monthly income
+    down_payment_percent (float or numpy.ndarray): Down payment as a percentage of the price
+    interest_rate (float or numpy.ndarray): Annual interest rate (percentage)
+    loan_term_years (int or numpy.ndarray): Loan term in years
+    max_affordability (float or numpy.ndarray): Highest payment as a percentage of income
+
+    Returns:
+    float or numpy.ndarray: Highest home price, inf with a 100% down payment
+    """
+    shape, (monthly_income, down_payment_percent, interest_rate, loan_term_years, max_affordability) = _flatten(
+        monthly_income, down_payment_percent, interest_rate, loan_term_years, max_affordability
+    )
+    payment = monthly_income * max_affordability / 100
+    payment_per_dollar = calculate_mortgage_payment(np.ones_like(payment), interest_rate, loan_term_years)
+    with np.errstate(divide="ignore"):
+        price = payment / payment_per_dollar / (1 - down_payment_percent / 100)
+    return _unwrap(price, shape)
+
+def _refine(margin, inside, outside, f_inside, f_outside, tolerance):
+    """
+    Narrow brackets to where margin crosses zero, with the Illinois method
+
+    inside is the end that meets the target (margin below zero) and outside
+    the end that does not. Each step evaluates the secant point of the
+    bracket and replaces the end with the same sign; when one end is kept
+    twice in a row, the margin at the other is halved, which stops regula
+    falsi from stalling on one side.
+    """
+    kept = np.zeros(len(inside), dtype=int)
+    for _ in range(MAX_ITERATIONS):
+        width = np.abs(outside - inside)
+        active = width > tolerance
+        if not active.any():
+            break
+
+        x = inside - f_inside * (outside - inside) / (f_outside - f_inside)
+        # Keep clear of the ends, so a zero margin at one of them cannot stall the search
+        low, high = np.minimum(inside, outside), np.maximum(inside, outside)
+        x = np.where(active, np.clip(x, low + tolerance / 2, high - tolerance / 2), inside)
+
+        f = margin(x[:, None])[:, 0]
+        meets = active & (f < 0)
+        misses = active & ~meets
+        f_outside = np.where(meets & (kept == 1), f_outside / 2, f_outside)
+        f_inside = np.where(misses & (kept == -1), f_inside / 2, f_inside)
+        inside, f_inside = np.where(meets, x, inside), np.where(meets, f, f_inside)
+        outside, f_outside = np.where(misses, x, outside), np.where(misses, f, f_outside)
+        kept = np.where(meets, 1, np.where(misses, -1, kept))
+    return inside
+
+def _solve(margin, low, high, smallest, tolerance=TOLERANCE):
+    """
+    Find the smallest (or largest) value in [low, high] at which margin is below zero
+
+    Parameters:
+    margin (callable): Margin for values of shape (scenarios, k), below zero
+        where the target is met
+    low, high (float): Range searched
+    smallest (bool): Look for the smallest value meeting the target, else the largest
+    tolerance (float): Precision of the answer
+
+    Returns:
+    numpy.ndarray: One value per scenario, NaN where none in the range meets the target
+    """
+    grid = np.linspace(low, high, GRID_POINTS)
+    f = margin(np.broadcast_to(grid, (margin.scenarios, GRID_POINTS)))
+    meets = f < 0
+    found = meets.any(axis=-1)
+
+    rows = np.arange(margin.scenarios)
+    if smallest:
+        first = meets.argmax(axis=-1)
+        neighbour = np.maximum(first - 1, 0)
+    else:
+        first = GRID_POINTS - 1 - meets[:, ::-1].argmax(axis=-1)
+        neighbour = np.minimum(first + 1, GRID_POINTS - 1)
+    # The answer is on a grid value if its neighbour also meets the target (or it is an end of the range)
+    bracketed = found & ~meets[rows, neighbour]
+
+    answer = np.where(found, grid[first], np.nan)
+    if bracketed.any():
+        margin.select(bracketed)
+        answer[bracketed] = _refine(
+            margin, grid[first][bracketed], grid[neighbour][bracketed],
+            f[rows, first][bracketed], f[rows, neighbour][bracketed], tolerance
+        )
+    return answer
+
+class _Margin:
+    """
+    Projection margin of a batch of scenarios as a function of one input
+
+    Calling it with values of shape (scenarios, k) projects every scenario
+    with each of its k values; select() narrows the batch down to some of
+    the scenarios.
+    """
+
+    def __init__(self, function, **inputs):
+        self.function = function
+        self.inputs = inputs
+        self.scenarios = len(next(iter(inputs.values())))
+
+    def select(self, mask):
+        self.inputs = {name: values[mask] for name, values in self.inputs.items()}
+        self.scenarios = int(mask.sum())
+
+    def __call__(self, candidates):
+        return self.function(candidates, **{name: values[:, None] for name, values in self.inputs.items()})
+
+def _break_even_margin(down_payment_percent, target_year, home_price, interest_rate, loan_term_years,
+                       property_tax_rate, maintenance_cost, appreciation_rate, monthly_rent,
+                       rent_increase_rate, investment_return_rate, selling_cost_percent,
+                       maintenance_inflation_rate=None, appreciation_cap=APPRECIATION_CAP, tax_profile=None):
+    """Lowest gap of buying over renting position up to the target year; below zero once buying breaks even"""
+    loan_term_years = loan_term_years.astype(int)
+    projection = build_projection(
+        home_price, home_price * down_payment_percent / 100, interest_rate, loan_term_years,
+        property_tax_rate, maintenance_cost, appreciation_rate,
+        monthly_rent, rent_increase_rate, investment_return_rate, selling_cost_percent,
+        maintenance_inflation_rate, appreciation_cap, tax_profile
+    )
+    gap = projection.buying_position - projection.renting_position
+    years = np.arange(1, gap.shape[-1] + 1)
+    within = years <= np.minimum(target_year, loan_term_years)[..., None]
+    return np.where(within, gap, np.inf).min(axis=-1)
+
+def _cost_margin(interest_rate, home_price, down_payment_percent, loan_term_years,
+                 property_tax_rate, maintenance_cost, appreciation_rate, monthly_rent,
+                 rent_increase_rate, investment_return_rate, selling_cost_percent,
+                 maintenance_inflation_rate=None, appreciation_cap=APPRECIATION_CAP, tax_profile=None):
+    """Net buying cost over the adjusted renting cost; below zero while buying is cheaper"""
+    projection = build_projection(
+        home_price, home_price * down_payment_percent / 100, interest_rate, loan_term_years.astype(int),
+        property_tax_rate, maintenance_cost, appreciation_rate,
+        monthly_rent, rent_increase_rate, investment_return_rate, selling_cost_percent,
+        maintenance_inflation_rate, appreciation_cap, tax_profile
+    )
+    return projection.net_buying_cost - projection.adjusted_renting_cost
+
+def _solve_chunked(function, low, high, smallest, inputs):
+    """Solve in chunks of scenarios, bounding the grid projections as utils.scenarios does"""
+    shape, flat = _flatten(*inputs.values())
+    inputs = dict(zip(inputs, flat))
+    size = flat[0].size
+    chunk_size = max(CHUNK_SIZE // GRID_POINTS, 1)
+
+    answers = np.empty(size)
+    for start in range(0, size, chunk_size):
+        chunk = {name: values[start:start + chunk_size] for name, values in inputs.items()}
+        answers[start:start + chunk_size] = _solve(_Margin(function, **chunk), low, high, smallest)
+    return _unwrap(answers, shape)
+
+@timed
+def min_down_payment(target_year, home_price, interest_rate, loan_term_years,
+                     property_tax_rate, maintenance_cost, appreciation_rate,
+                     monthly_rent, rent_increase_rate, investment_return_rate,
+                     selling_cost_percent=0.0, down_payment_range=DOWN_PAYMENT_RANGE,
+                     maintenance_inflation_rate=None, appreciation_cap=APPRECIATION_CAP, tax_profile=None):
+    """
+    Find the smallest down payment with which buying breaks even by a target year
+
+    Parameters:
+    target_year (int or numpy.ndarray): Year by which buying should break even, capped at the term
+    home_price ... selling_cost_percent: Scenario inputs, as for utils.projection.build_projection
+    down_payment_range (tuple): Lowest and highest down payment searched (percentage)
+    maintenance_inflation_rate (float): Annual growth of maintenance (percentage),
+        None to grow it with capped appreciation, the same for every scenario
+    appreciation_cap (float): Highest appreciation rate used (percentage), None for no cap
+    tax_profile (TaxProfile): The buyer's income tax, as for utils.projection.build_projection,
+        the same for every scenario; None leaves tax out
+
+    Returns:
+    float or numpy.ndarray: Down payment as a percentage of the price
+    """
+    inputs = dict(
+        target_year=target_year, home_price=home_price, interest_rate=interest_rate,
+        loan_term_years=loan_term_years, property_tax_rate=property_tax_rate,
+        maintenance_cost=maintenance_cost, appreciation_rate=appreciation_rate, monthly_rent=monthly_rent,
+        rent_increase_rate=rent_increase_rate, investment_return_rate=investment_return_rate,
+        selling_cost_percent=selling_cost_percent,
+    )
+    margin = partial(_break_even_margin, maintenance_inflation_rate=maintenance_inflation_rate,
+                     appreciation_cap=appreciation_cap, tax_profile=tax_profile)
+    return _solve_chunked(margin, *down_payment_range, True, inputs)
+
+@timed
+def max_interest_rate(home_price, down_payment_percent, loan_term_years,
+                      property_tax_rate, maintenance_cost, appreciation_rate,
+                      monthly_rent, rent_increase_rate, investment_return_rate,
+                      selling_cost_percent=0.0, interest_rate_range=INTEREST_RATE_RANGE,
+                      maintenance_inflation_rate=None, appreciation_cap=APPRECIATION_CAP, tax_profile=None):
+    """
+    Find the highest interest rate at which buying still costs less than renting over the term
+
+    Parameters:
+    home_price ... selling_cost_percent: Scenario inputs, as for utils.comparison.run_comparison
+    interest_rate_range (tuple): Lowest and highest rate searched (percentage)
+    maintenance_inflation_rate (float): Annual growth of maintenance (percentage),
+        None to grow it with capped appreciation, the same for every scenario
+    appreciation_cap (float): Highest appreciation rate used (percentage), None for no cap
+    tax_profile (TaxProfile): The buyer's income tax, as for utils.projection.build_projection,
+        the same for every scenario; None leaves tax out
+
+    Returns:
+    float or numpy.ndarray: Annual interest rate (percentage)
+    """
+    inputs = dict(
+        home_price=home_price, down_payment_percent=down_payment_percent, loan_term_years=loan_term_years,
+        property_tax_rate=property_tax_rate, maintenance_cost=maintenance_cost,
+        appreciation_rate=appreciation_rate, monthly_rent=monthly_rent,
+        rent_increase_rate=rent_increase_rate, investment_return_rate=investment_return_rate,
+        selling_cost_percent=selling_cost_percent,
+    )
+    margin = partial(_cost_margin, maintenance_inflation_rate=maintenance_inflation_rate,
+                     appreciation_cap=appreciation_cap, tax_profile=tax_profile)
+    return _solve_chunked(margin, *interest_rate_range, False, inputs)
+
+# Optional projection settings, single values shared by every scenario solved
+PROJECTION_OPTIONS = ["maintenance_inflation_rate", "appreciation_cap", "tax_profile"]
+
+# Each target's solver, the inputs it needs, the optional ones with their
+# defaults and the settings it takes alongside them
+SOLVERS = {
+    "max_price": {
+        "function": max_affordable_price,
+        "inputs": ["monthly_income", "down_payment_percent", "interest_rate", "loan_term_years"],
+        "defaults": {"max_affordability": float(AFFORDABILITY_LIMITS[0])},
+        "options": [],
+    },
+    "min_down_payment": {
+        "function": min_down_payment,
+        "inputs": ["target_year", "home_price", "interest_rate", "loan_term_years", "monthly_rent"],
+        "defaults": SCENARIO_DEFAULTS,
+        "options": PROJECTION_OPTIONS,
+    },
+    "max_interest_rate": {
+        "function": max_interest_rate,
+        "inputs": ["home_price", "down_payment_percent", "loan_term_years", "monthly_rent"],
+        "defaults": SCENARIO_DEFAULTS,
+        "options": PROJECTION_OPTIONS,
+    },
+}
+
+def solve(target, **values):
+    """
+    Solve for a target by name
+
+    Parameters:
+    target (str): One of SOLVERS
+    values: The target's inputs, and any of its optional ones and options
+
+    Returns:
+    float or numpy.ndarray: The solved value, as from the target's function
+    """
+    if target not in SOLVERS:
+        raise ValueError(f"Unknown target: {target}; expected one of {', '.join(SOLVERS)}")
+    spec = SOLVERS[target]
+    missing = [name for name in spec["inputs"] if name not in values]
+    if missing:
+        raise ValueError(f"{target} needs: {', '.join(missing)}")
+    names = spec["inputs"] + list(spec["defaults"])
+    options = {name: values[name] for name in spec["options"] if name in values}
+    return spec["function"](**{name: values.get(name, spec["defaults"].get(name)) for name in names}, **options)
+
+@timed
+def solve_scenarios(scenarios, target, **options):
+    """
+    Solve for a target over a table of scenarios
+
+    Parameters:
+    scenarios (pandas.DataFrame): One scenario per row, with the target's inputs
+        and optionally any of its defaults; blanks take the defaults
+    target (str): One of SOLVERS
+    options: Any of the target's options, the same for every scenario
+
+    Returns:
+    pandas.Series: The solved value per scenario, NaN where the target cannot be met
+    """
+    if target not in SOLVERS:
+        raise ValueError(f"Unknown target: {target}; expected one of {', '.join(SOLVERS)}")
+    spec = SOLVERS[target]
+    missing = [name for name in spec["inputs"] if name not in scenarios]
+    if missing:
+        raise ValueError(f"Scenarios are missing required columns: {', '.join(missing)}")
+    if scenarios.empty:
+        return pd.Series(dtype=float, index=scenarios.index, name=target)
+
+    values = {name: scenarios[name].astype(float).to_numpy() for name in spec["inputs"]}
+    for name, default in spec["defaults"].items():
+        values[name] = (
+            scenarios[name].astype(float).fillna(default).to_numpy() if name in scenarios
+            else np.full(len(scenarios), default)
+        )
+    return pd.Series(solve(target, **values, **options), index=scenarios.index, name=target)
+
+def solve_by_city(target, bedrooms, cities=None, **values):
+    """
+    Solve for a target in every city, with each city's average rent
+
+    Parameters:
+    target (str): One of SOLVERS
+    bedrooms (int): Number of bedrooms, for the rents
+    cities (list): Cities to solve for, defaults to all cities in the rent data
+    values: The target's other inputs and options, the same in every city
+
+    Returns:
+    pandas.DataFrame: monthly_rent and the solved value per city; cities
+        without rent data are left out
+    """
+    cities = get_available_cities() if cities is None else list(cities)
+    rents = get_average_rents(np.array(cities, dtype=object), np.full(len(cities), bedrooms))
+    known = ~np.isnan(rents)
+    options = {name: values.pop(name) for name in SOLVERS[target]["options"] if name in values}
+    scenarios = pd.DataFrame({name: value for name, value in values.items()},
+                             index=pd.Index(np.array(cities, dtype=object)[known], name="city"))
+    scenarios["monthly_rent"] = rents[known]
+    return scenarios[["monthly_rent"]].assign(**{target: solve_scenarios(scenarios, target, **options)})
@@ -0,0 +1,165 @@
+"""
+Cached stages of a single-scenario projection
+
+The projection is a small dependency graph:
+
+    mortgage(price, down %, rate, term) ---------------------------+
+    appreciation(price, appreciation, term) --+                    |
+        carrying costs(price, tax, maintenance, appreciation, term) +--> aggregation
+    rent(rent, rent increase, term) -------------------------------+
+    investment(price, down %, return, term) -----------------------+
+
+Each stage is cached on its own inputs, so when one input changes only the
+stages that depend on it are recomputed; e.g. a new selling cost reuses every
+stage and only reruns the aggregation.
+
+Rates are numbers, or tuples of yearly rates for a custom inflation scenario
+(see RatePath). A stage runs per year when its rates are tuples; once any
+rate is a tuple, staged_projection turns every rate into one so the stages
+agree on the time axis.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+from utils.projection import (
+    APPRECIATION_CAP,
+    aggregate_projection,
+    appreciation_stage,
+    carrying_cost_stage,
+    investment_stage,
+    mortgage_stage,
+    rent_stage,
+    tax_stage
+)
+from utils.timing import timed
+
+# Results kept per stage
+STAGE_CACHE_SIZE = 256
+
+def _array(value):
+    return np.asarray(value, dtype=float)
+
+def _yearly(rate):
+    return isinstance(rate, tuple)
+
+def _freeze(stage):
+    """Make a cached stage's arrays read-only, as they are shared between callers"""
+    for value in stage.values():
+        if isinstance(value, np.ndarray):
+            value.flags.writeable = False
+    return stage
+
+@lru_cache(maxsize=STAGE_CACHE_SIZE)
+def _mortgage(home_price, down_payment_percent, interest_rate, loan_term_years):
+    down_payment = home_price * down_payment_percent / 100
+    return _freeze(mortgage_stage(
+        _array(home_price), _array(down_payment), _array(interest_rate),
+        np.asarray(loan_term_years), loan_term_years, _yearly(interest_rate)
+    ))
+
+@lru_cache(maxsize=STAGE_CACHE_SIZE)
+def _appreciation(home_price, appreciation_rate, loan_term_years, appreciation_cap):
+    return _freeze(appreciation_stage(
+        _array(home_price), _array(appreciation_rate), loan_term_years, _yearly(appreciation_rate),
+        appreciation_cap
+    ))
+
+@lru_cache(maxsize=STAGE_CACHE_SIZE)
+def _carrying_costs(home_price, property_tax_rate, maintenance_cost, appreciation_rate, loan_term_years,
+                    appreciation_cap, maintenance_inflation_rate):
+    appreciation = _appreciation(home_price, appreciation_rate, loan_term_years, appreciation_cap)
+    return _freeze(carrying_cost_stage(
+        _array(home_price), _array(property_tax_rate), _array(maintenance_cost),
+        appreciation["capped_appreciation_rate"], appreciation["appreciation_factors"],
+        np.asarray(loan_term_years), loan_term_years, _yearly(property_tax_rate),
+        None if maintenance_inflation_rate is None else _array(maintenance_inflation_rate)
+    ))
+
+@lru_cache(maxsize=STAGE_CACHE_SIZE)
+def _rent(monthly_rent, rent_increase_rate, loan_term_years):
+    return _freeze(rent_stage(
+        _array(monthly_rent), _array(rent_increase_rate), np.asarray(loan_term_years), loan_term_years,
+        _yearly(rent_increase_rate)
+    ))
+
+@lru_cache(maxsize=STAGE_CACHE_SIZE)
+def _investment(home_price, down_payment_percent, investment_return_rate, loan_term_years):
+    down_payment = home_price * down_payment_percent / 100
+    return _freeze(investment_stage(
+        _array(down_payment), _array(investment_return_rate), loan_term_years, _yearly(investment_return_rate)
+    ))
+
+STAGES = {
+    "mortgage": _mortgage,
+    "appreciation": _appreciation,
+    "carrying_costs": _carrying_costs,
+    "rent": _rent,
+    "investment": _investment,
+}
+
+@timed
+def staged_projection(home_price, down_payment_percent, interest_rate, loan_term_years,
+                      property_tax_rate, maintenance_cost, appreciation_rate,
+                      monthly_rent, rent_increase_rate, investment_return_rate,
+                      selling_cost_percent, maintenance_inflation_rate=None,
+                      appreciation_cap=APPRECIATION_CAP, tax_profile=None):
+    """
+    Build a single-scenario projection from cached stages
+
+    Gives the same Projection as build_projection, recomputing only the
+    stages whose inputs changed since they were last seen. The tax stage is
+    cheap for one scenario and is not cached.
+
+    Parameters:
+    home_price ... tax_profile: Scenario inputs as numbers, as for
+        build_projection but with the down payment as a percentage and
+        yearly rates as tuples covering at least the loan term
+
+    Returns:
+    Projection: Schedules and summary figures
+    """
+    loan_term_years = int(loan_term_years)
+    down_payment = home_price * down_payment_percent / 100
+
+    rates = (interest_rate, property_tax_rate, appreciation_rate, rent_increase_rate,
+             investment_return_rate, maintenance_inflation_rate)
+    if any(_yearly(rate) for rate in rates):
+        # Every stage works per year; cut the paths to the term so equal scenarios share stages
+        rates = [
+            None if rate is None
+            else tuple(float(value) for value in rate[:loan_term_years]) if _yearly(rate)
+            else (float(rate),) * loan_term_years
+            for rate in rates
+        ]
+        if any(len(rate) < loan_term_years for rate in rates if rate is not None):
+            raise ValueError(f"Rate paths must cover the {loan_term_years}-year loan term")
+        (interest_rate, property_tax_rate, appreciation_rate, rent_increase_rate,
+         investment_return_rate, maintenance_inflation_rate) = rates
+
+    investment = _investment(home_price, down_payment_percent, investment_return_rate, loan_term_years)
+    return aggregate_projection(
+        _array(home_price), _array(down_payment), _array(interest_rate),
+        np.asarray(loan_term_years), _array(selling_cost_percent),
+        mortgage=_mortgage(home_price, down_payment_percent, interest_rate, loan_term_years),
+        appreciation=_appreciation(home_price, appreciation_rate, loan_term_years, appreciation_cap),
+        carrying_costs=_carrying_costs(
+            home_price, property_tax_rate, maintenance_cost, appreciation_rate, loan_term_years,
+            appreciation_cap, maintenance_inflation_rate
+        ),
+        rent=_rent(monthly_rent, rent_increase_rate, loan_term_years),
+        investment=investment,
+        tax=None if tax_profile is None else tax_stage(
+            tax_profile, _array(down_payment), investment["investment_value"], np.asarray(loan_term_years),
+            loan_term_years
+        ),
+    )
+
+def stage_cache_info():
+    """
+    Get the hit and miss counts of every stage cache
+
+    Returns:
+    dict: Stage name to its hits, misses, maxsize and currsize
+    """
+    return {name: stage.cache_info()._asdict() for name, stage in STAGES.items()}
@@ -0,0 +1,305 @@
+"""
+Canadian income tax on the rent-vs-buy comparison
+
+The tax that differs between renting and buying:
+
+- Renting: the invested down payment is a non-registered account, so the
+  gain is taxed as a capital gain (CAPITAL_GAINS_INCLUSION_RATE of it added
+  to income) when cashed out.
+- Buying: the gain on the home is exempt as a principal residence. Part of
+  the down payment may come from a First Home Savings Account (FHSA), whose
+  contributions were deducted from income, and from the RRSP through the
+  Home Buyers' Plan (HBP), withdrawn tax-free but added to income year by
+  year unless it is repaid.
+
+Tax is the federal plus the provincial tax of TAX_YEAR's brackets, with the
+basic personal amounts as a 0% first bracket and Quebec's federal abatement;
+surtaxes and other credits are left out. Each province's federal and
+provincial brackets are merged into one schedule, and all schedules are held
+in one sorted array with schedule k offset by k * SCHEDULE_SPAN, so the
+brackets of any mix of incomes and provinces are found with a single
+searchsorted.
+"""
+import numpy as np
+import pandas as pd
+
+TAX_YEAR = 2024
+
+# Brackets as (lower bound of taxable income, marginal rate in percentage)
+FEDERAL_BRACKETS = [(0, 0.0), (15705, 15.0), (55867, 20.5), (111733, 26.0), (173205, 29.0), (246752, 33.0)]
+
+PROVINCIAL_BRACKETS = {
+    "AB": [(0, 0.0), (21885, 10.0), (148269, 12.0), (177922, 13.0), (237230, 14.0), (355845, 15.0)],
+    "BC": [(0, 0.0), (12580, 5.06), (47937, 7.7), (95875, 10.5), (110076, 12.29), (133664, 14.7),
+           (181232, 16.8), (252752, 20.5)],
+    "MB": [(0, 0.0), (15780, 10.8), (47000, 12.75), (100000, 17.4)],
+    "NB": [(0, 0.0), (13044, 9.4), (49958, 14.0), (99916, 16.0), (185064, 19.5)],
+    "NL": [(0, 0.0), (10818, 8.7), (43198, 14.5), (86395, 15.8), (154244, 17.8), (215943, 19.8),
+           (275870, 20.8), (551739, 21.3), (1103478, 21.8)],
+    "NS": [(0, 0.0), (8744, 8.79), (29590, 14.95), (59180, 16.67), (93000, 17.5), (150000, 21.0)],
+    "ON": [(0, 0.0), (12399, 5.05), (51446, 9.15), (102894, 11.16), (150000, 12.16), (220000, 13.16)],
+    "PE": [(0, 0.0), (13500, 9.65), (32656, 13.63), (64313, 16.65), (105000, 18.0), (140000, 18.75)],
+    "QC": [(0, 0.0), (18056, 14.0), (51780, 19.0), (103545, 24.0), (126000, 25.75)],
+    "SK": [(0, 0.0), (18491, 10.5), (52057, 12.5), (148734, 14.5)],
+}
+
+PROVINCE_NAMES = {
+    "AB": "Alberta",
+    "BC": "British Columbia",
+    "MB": "Manitoba",
+    "NB": "New Brunswick",
+    "NL": "Newfoundland and Labrador",
+    "NS": "Nova Scotia",
+    "ON": "Ontario",
+    "PE": "Prince Edward Island",
+    "QC": "Quebec",
+    "SK": "Saskatchewan",
+}
+
+# Federal tax reduction for Quebec residents (percentage)
+FEDERAL_ABATEMENT = {"QC": 16.5}
+
+CITY_PROVINCES = {
+    "Calgary": "AB",
+    "Edmonton": "AB",
+    "Hamilton": "ON",
+    "Montreal": "QC",
+    "Ottawa": "ON",
+    "Quebec City": "QC",
+    "Toronto": "ON",
+    "Vancouver": "BC",
+    "Victoria": "BC",
+    "Winnipeg": "MB",
+}
+
+DEFAULT_PROVINCE = "ON"
+
+# Share of a capital gain added to taxable income
+CAPITAL_GAINS_INCLUSION_RATE = 0.5
+
+FHSA_ANNUAL_LIMIT = 8000
+FHSA_LIFETIME_LIMIT = 40000
+
+HBP_WITHDRAWAL_LIMIT = 60000
+# Repaid in equal parts over this many years, from the second year after the withdrawal
+HBP_REPAYMENT_YEARS = 15
+
+# Offset between schedules in the combined lookup array; incomes are capped just below it
+SCHEDULE_SPAN = 1e10
+
+class BracketTable:
+    """
+    Tax schedules held as sorted NumPy arrays for vectorized lookups
+
+    Each schedule is a list of (lower bound, rate in percentage) brackets.
+    Within a bracket tax is linear in income, so each bracket's intercept
+    is precomputed and the tax on an income is its bracket's intercept plus
+    its rate times the income.
+    """
+
+    def __init__(self, schedules):
+        self.names = list(schedules)
+        keys, rates, intercepts = [], [], []
+        for index, name in enumerate(self.names):
+            thresholds, schedule_rates = (np.array(column, dtype=float) for column in zip(*schedules[name]))
+            schedule_rates = schedule_rates / 100
+            # Tax owed at each lower bound
+            base = np.concatenate(([0.0], np.cumsum(np.diff(thresholds) * schedule_rates[:-1])))
+            keys.append(thresholds + index * SCHEDULE_SPAN)
+            rates.append(schedule_rates)
+            intercepts.append(base - thresholds * schedule_rates)
+        self.keys, self.rates, self.intercepts = (np.concatenate(values) for values in (keys, rates, intercepts))
+
+    def _bracket(self, income, schedule):
+        income = np.clip(income, 0.0, SCHEDULE_SPAN - 1)
+        bracket = np.searchsorted(self.keys, income + np.asarray(schedule) * SCHEDULE_SPAN, side="right") - 1
+        return income, bracket
+
+    def tax(self, income, schedule=0):
+        """
+        Tax owed on incomes
+
+        Parameters:
+        income (float or numpy.ndarray): Taxable income
+        schedule (int or numpy.ndarray): Index of each income's schedule in names
+
+        Returns:
+        numpy.ndarray: Tax
+        """
+        income, bracket = self._bracket(income, schedule)
+        return self.intercepts[bracket] + income * self.rates[bracket]
+
+    def marginal_rate(self, income, schedule=0):
+        """
+        Rate on the next dollar of income (as a fraction)
+
+        Parameters:
+        income (float or numpy.ndarray): Taxable income
+        schedule (int or numpy.ndarray): Index of each income's schedule in names
+
+        Returns:
+        numpy.ndarray: Marginal rate
+        """
+        return self.rates[self._bracket(income, schedule)[1]]
+
+def _combined_schedule(province):
+    """Federal and provincial brackets merged into one schedule"""
+    federal = np.array(FEDERAL_BRACKETS, dtype=float)
+    provincial = np.array(PROVINCIAL_BRACKETS[province], dtype=float)
+    federal_share = 1 - FEDERAL_ABATEMENT.get(province, 0.0) / 100
+
+    def rate_at(brackets, thresholds):
+        return brackets[np.searchsorted(brackets[:, 0], thresholds, side="right") - 1, 1]
+
+    thresholds = np.union1d(federal[:, 0], provincial[:, 0])
+    rates = rate_at(federal, thresholds) * federal_share + rate_at(provincial, thresholds)
+    return list(zip(thresholds, rates))
+
+# One schedule per province, in the order of PROVINCES
+PROVINCES = list(PROVINCIAL_BRACKETS)
+TAX_TABLE = BracketTable({province: _combined_schedule(province) for province in PROVINCES})
+
+def province_index(province):
+    """
+    Find the schedules of provinces
+
+    Parameters:
+    province (str or array-like): Province codes (e.g. "ON") or cities of CITY_PROVINCES
+
+    Returns:
+    int or numpy.ndarray: Index of each province in PROVINCES
+    """
+    values = pd.Series(np.ravel(np.asarray(province, dtype=object)))
+    codes = values.map(CITY_PROVINCES).fillna(values)
+    index = pd.Index(PROVINCES).get_indexer(codes)
+    if (index < 0).any():
+        unknown = sorted(set(codes[index < 0].astype(str)))
+        raise ValueError(f"Unknown province: {', '.join(unknown)}")
+    index = index.reshape(np.shape(province))
+    return int(index) if index.ndim == 0 else index
+
+def _schedule(province):
+    if isinstance(province, np.ndarray) and province.dtype.kind in "iu":
+        return province
+    return province_index(province)
+
+def income_tax(income, province=DEFAULT_PROVINCE):
+    """
+    Federal and provincial income tax
+
+    Parameters:
+    income (float or numpy.ndarray): Taxable income
+    province (str, array-like or numpy.ndarray): Provinces as for
+        province_index, or their indices
+
+    Returns:
+    numpy.ndarray: Tax
+    """
+    return TAX_TABLE.tax(income, _schedule(province))
+
+def marginal_tax_rate(income, province=DEFAULT_PROVINCE):
+    """
+    Combined federal and provincial rate on the next dollar (as a fraction)
+
+    Parameters:
+    income (float or numpy.ndarray): Taxable income
+    province (str, array-like or numpy.ndarray): As for income_tax
+
+    Returns:
+    numpy.ndarray: Marginal rate
+    """
+    return TAX_TABLE.marginal_rate(income, _schedule(province))
+
+def capital_gains_tax(gain, income, province=DEFAULT_PROVINCE):
+    """
+    Tax on a capital gain realized on top of an income
+
+    Parameters:
+    gain (float or numpy.ndarray): Capital gain; losses are not taxed
+    income (float or numpy.ndarray): Other taxable income of the year
+    province (str, array-like or numpy.ndarray): As for income_tax
+
+    Returns:
+    numpy.ndarray: Additional tax
+    """
+    schedule = _schedule(province)
+    taxable = CAPITAL_GAINS_INCLUSION_RATE * np.maximum(gain, 0.0)
+    return TAX_TABLE.tax(income + taxable, schedule) - TAX_TABLE.tax(income, schedule)
+
+class TaxProfile:
+    """
+    The buyer's tax situation, applied to a projection
+
+    All values broadcast with the scenarios of the projection.
+
+    Parameters:
+    annual_income (float or numpy.ndarray): Taxable income per year, taken as constant
+    province (str or array-like): Provinces as for province_index
+    fhsa_amount (float or numpy.ndarray): Down payment saved in an FHSA
+    hbp_amount (float or numpy.ndarray): Down payment withdrawn from the RRSP under the HBP
+    hbp_repaid (bool or numpy.ndarray): Whether the HBP is repaid on schedule;
+        otherwise each year's repayment is added to income
+    taxed (bool or numpy.ndarray): Whether tax applies; scenarios where it
+        does not are charged no tax, whatever their other values
+    """
+
+    def __init__(self, annual_income, province=DEFAULT_PROVINCE, fhsa_amount=0.0, hbp_amount=0.0,
+                 hbp_repaid=True, taxed=True):
+        self.annual_income = np.asarray(annual_income, dtype=float)
+        self.schedule = np.asarray(_schedule(province))
+        self.fhsa_amount = np.asarray(fhsa_amount, dtype=float)
+        self.hbp_amount = np.asarray(hbp_amount, dtype=float)
+        self.hbp_repaid = np.asarray(hbp_repaid, dtype=bool)
+        self.taxed = np.asarray(taxed, dtype=bool)
+
+    @property
+    def shape(self):
+        """Shape of the scenarios the profile spans"""
+        return np.broadcast_shapes(*(np.shape(value) for value in (
+            self.annual_income, self.schedule, self.fhsa_amount, self.hbp_amount, self.hbp_repaid, self.taxed
+        )))
+
+    def registered_amounts(self, down_payment):
+        """
+        The parts of the down payment from the FHSA and the HBP, within their limits
+
+        Parameters:
+        down_payment (numpy.ndarray): Down payment
+
+        Returns:
+        tuple: (fhsa, hbp) amounts
+        """
+        fhsa = np.clip(self.fhsa_amount, 0.0, np.minimum(FHSA_LIFETIME_LIMIT, down_payment))
+        hbp = np.clip(self.hbp_amount, 0.0, np.minimum(HBP_WITHDRAWAL_LIMIT, down_payment - fhsa))
+        return fhsa, hbp
+
+    def fhsa_refund(self, fhsa):
+        """
+        Tax saved by deducting FHSA contributions, at most FHSA_ANNUAL_LIMIT a year
+
+        Parameters:
+        fhsa (numpy.ndarray): FHSA amount
+
+        Returns:
+        numpy.ndarray: Tax refunded over the years of contributions
+        """
+        contribution_years = np.ceil(fhsa / FHSA_ANNUAL_LIMIT)
+        yearly = np.divide(fhsa, contribution_years, out=np.zeros_like(fhsa), where=contribution_years > 0)
+        saved = (TAX_TABLE.tax(self.annual_income, self.schedule)
+                 - TAX_TABLE.tax(self.annual_income - yearly, self.schedule))
+        return contribution_years * saved
+
+    def hbp_yearly_tax(self, hbp):
+        """
+        Tax on one year's HBP repayment added to income, zero where it is repaid
+
+        Parameters:
+        hbp (numpy.ndarray): HBP amount
+
+        Returns:
+        numpy.ndarray: Tax for each year of the repayment period
+        """
+        added = hbp / HBP_REPAYMENT_YEARS
+        tax = (TAX_TABLE.tax(self.annual_income + added, self.schedule)
+               - TAX_TABLE.tax(self.annual_income, self.schedule))
+        return np.where(self.hbp_repaid, 0.0, tax)
@@ -0,0 +1,216 @@
+"""
+Lightweight timing of the app's stages and the utils functions
+
+Functions are instrumented with @timed and the sections of the Streamlit
+script with Laps marks. Each measurement adds to an in-memory record per
+name: the count, total and maximum, and the latest SAMPLE_SIZE durations,
+from which the p50/p95/p99 percentiles are computed.
+
+Timing is off unless HOMEDECIDE_TIMING is set (to anything but 0) or
+enable() is called, as the Streamlit debug panel does. While it is off a
+timed function costs one extra call and a flag check, and a Laps mark a
+flag check. When HOMEDECIDE_TIMING_LOG is set, every measurement is also
+written to stderr as a JSON log line. Records are per process.
+"""
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import numpy as np
+
+TIMING_ENV = "HOMEDECIDE_TIMING"
+TIMING_LOG_ENV = "HOMEDECIDE_TIMING_LOG"
+
+# Latest durations kept per name for the percentiles
+SAMPLE_SIZE = 2048
+
+PERCENTILES = [50, 95, 99]
+
+logger = logging.getLogger("homedecide.timing")
+
+def _env_flag(name):
+    return os.environ.get(name, "").strip() not in ("", "0")
+
+_enabled = _env_flag(TIMING_ENV)
+_records = {}
+_lock = threading.Lock()
+
+if _env_flag(TIMING_LOG_ENV):
+    _handler = logging.StreamHandler(sys.stderr)
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+
+class _Record:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = deque(maxlen=SAMPLE_SIZE)
+
+def enable(enabled=True):
+    """Turn timing on or off for the whole process"""
+    global _enabled
+    _enabled = enabled
+
+def is_enabled():
+    """Check whether timing is on"""
+    return _enabled
+
+def record(name, seconds):
+    """
+    Add one measurement
+
+    Parameters:
+    name (str): What was timed, e.g. "projection.build_projection"
+    seconds (float): How long it took
+    """
+    with _lock:
+        entry = _records.get(name)
+        if entry is None:
+            entry = _records[name] = _Record()
+        entry.count += 1
+        entry.total += seconds
+        entry.max = max(entry.max, seconds)
+        entry.samples.append(seconds)
+
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"event": "timing", "name": name, "ms": round(seconds * 1000, 3)}))
+
+def timed(function):
+    """
+    Decorator recording the duration of every call while timing is on
+
+    Calls are recorded as <module>.<function>, without the utils. prefix.
+    """
+    name = f"{function.__module__.replace('utils.', '')}.{function.__qualname__}"
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if not _enabled:
+            return function(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            record(name, time.perf_counter() - start)
+
+    return wrapper
+
+class Laps:
+    """
+    Times consecutive sections of a script
+
+    Each mark(name) records the time since the previous mark (or since the
+    Laps was created) as <prefix>.<name>, and finish() the time since the
+    start as the prefix itself.
+    """
+
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.start = self.last = time.perf_counter()
+
+    def mark(self, name):
+        if not _enabled:
+            return
+        now = time.perf_counter()
+        record(f"{self.prefix}.{name}", now - self.last)
+        self.last = now
+
+    def finish(self):
+        if _enabled:
+            record(self.prefix, time.perf_counter() - self.start)
+
+def reset():
+    """Drop all measurements"""
+    with _lock:
+        _records.clear()
+
+def snapshot():
+    """
+    Summarize the measurements
+
+    Returns:
+    list: One dict per name with count, total_ms, mean_ms, p50_ms, p95_ms,
+        p99_ms (over the latest SAMPLE_SIZE calls) and max_ms, the most total
+        time first
+    """
+    with _lock:
+        entries = [(name, entry.count, entry.total, entry.max, list(entry.samples))
+                   for name, entry in _records.items()]
+
+    rows = []
+    for name, count, total, longest, samples in entries:
+        p50, p95, p99 = np.percentile(samples, PERCENTILES) * 1000
+        rows.append({
+            "name": name,
+            "count": count,
+            "total_ms": total * 1000,
+            "mean_ms": total / count * 1000,
+            "p50_ms": p50,
+            "p95_ms": p95,
+            "p99_ms": p99,
+            "max_ms": longest * 1000,
+        })
+    rows.sort(key=lambda row: row["total_ms"], reverse=True)
+    return rows
+
+def cache_stats():
+    """
+    Get the counters of the in-process caches
+
+    Returns:
+    dict: Cache name to its hits, misses, size and maxsize
+    """
+    # Imported here because the cached modules are themselves instrumented
+    from utils.comparison import get_comparison_cache
+    from utils.stages import stage_cache_info
+
+    caches = {"comparison": get_comparison_cache().stats()}
+    for stage, info in stage_cache_info().items():
+        caches[f"stage_{stage}"] = {
+            "hits": info["hits"], "misses": info["misses"], "size": info["currsize"], "maxsize": info["maxsize"]
+        }
+    return caches
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def prometheus_text():
+    """
+    Render the measurements and cache counters in the Prometheus text format
+
+    Returns:
+    str: A homedecide_duration_seconds summary per name, and
+        homedecide_cache_hits_total, _misses_total and _entries per cache
+    """
+    lines = [
+        "# HELP homedecide_duration_seconds Time spent per instrumented function or app stage",
+        "# TYPE homedecide_duration_seconds summary",
+    ]
+    for row in snapshot():
+        label = f'name="{_label(row["name"])}"'
+        for percentile in PERCENTILES:
+            value = row[f"p{percentile}_ms"] / 1000
+            lines.append(f'homedecide_duration_seconds{{{label},quantile="{percentile / 100}"}} {value:.9g}')
+        lines.append(f"homedecide_duration_seconds_sum{{{label}}} {row['total_ms'] / 1000:.9g}")
+        lines.append(f"homedecide_duration_seconds_count{{{label}}} {row['count']}")
+
+    caches = cache_stats()
+    for metric, field, kind, description in (
+        ("homedecide_cache_hits_total", "hits", "counter", "Cache lookups answered from the cache"),
+        ("homedecide_cache_misses_total", "misses", "counter", "Cache lookups that had to compute"),
+        ("homedecide_cache_entries", "size", "gauge", "Entries held by the cache"),
+    ):
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for cache, stats in caches.items():
+            lines.append(f'{metric}{{cache="{_label(cache)}"}} {stats[field]}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,102 @@
+"""
+Warm a process up before it serves its first user
+
+Usage:
+    python -m utils.warmup
+    python -m utils.warmup --run app.py --server.port=8501 --server.address=0.0.0.0
+
+A fresh process pays for loading the rent store, for Plotly's first figure
+(which loads its trace and validator modules) and for the first comparison
+before anything shows. warm_up() does all of these ahead of time and fills
+the stage and comparison caches with the app's default inputs. With --run,
+the Streamlit server is then started in the same process, so the first
+session finds everything already loaded; the rest of the arguments are
+passed to "streamlit run".
+"""
+import sys
+import time
+
+# The app's default inputs, as set on its widgets; city and rent come from the rent data
+APP_DEFAULTS = {
+    "monthly_income": 5000.0,
+    "home_price": 750000,
+    "down_payment_percent": 20,
+    "interest_rate": 5.5,
+    "loan_term_years": 25,
+    "property_tax_rate": 0.7,
+    "maintenance_cost": 5000,
+    "appreciation_rate": 3.0,
+    "selling_cost_percent": 5.0,
+    "bedrooms": 2,
+    "rent_increase_rate": 3.0,
+    "investment_return_rate": 5.0,
+}
+
+def _load_data():
+    from utils.data_handler import get_available_cities
+    from utils.listings import get_listing_store
+
+    get_listing_store().get_index()
+    return get_available_cities()
+
+def _draw_figures():
+    import plotly.graph_objects as go
+    import plotly.io
+
+    # One figure per trace type the app draws, serialized as st.plotly_chart does
+    figure = go.Figure(data=[
+        go.Bar(x=["a"], y=[1]), go.Scatter(x=[1], y=[1]), go.Scattergl(x=[1], y=[1]), go.Heatmap(z=[[1]])
+    ])
+    figure.update_layout(title="Warm-up", xaxis_title="x", yaxis_title="y", height=100)
+    plotly.io.to_json(figure)
+
+def _compare_defaults(cities):
+    from utils.comparison import cached_comparison
+    from utils.data_handler import get_average_rent
+
+    if not cities:
+        return
+    city = cities[0]
+    monthly_rent = get_average_rent(city, APP_DEFAULTS["bedrooms"])
+    inputs = dict(APP_DEFAULTS, city=city, monthly_rent=1800 if monthly_rent is None else monthly_rent)
+    cached_comparison(**inputs)
+
+def warm_up():
+    """
+    Load the data, Plotly and the comparison code, and compare the app's defaults
+
+    Returns:
+    dict: Seconds taken by each step: data, figures and comparison
+    """
+    timings = {}
+    start = time.perf_counter()
+    cities = _load_data()
+    timings["data"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _draw_figures()
+    timings["figures"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    _compare_defaults(cities)
+    timings["comparison"] = time.perf_counter() - start
+    return timings
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    timings = warm_up()
+    print("Warmed up in " + ", ".join(f"{step} {seconds * 1000:.0f} ms" for step, seconds in timings.items()),
+          file=sys.stderr)
+
+    if argv[:1] == ["--run"]:
+        from streamlit.web import cli
+
+        sys.argv = ["streamlit", "run", *argv[1:]]
+        return cli.main()
+    if argv:
+        print("usage: python -m utils.warmup [--run SCRIPT [streamlit options]]", file=sys.stderr)
+        return 2
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())